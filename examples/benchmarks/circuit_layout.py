@@ -0,0 +1,59 @@
+import numpy as np
+import qaoa
+from timeit import repeat
+import argparse
+
+
+def time_call(f,number):
+    """
+    Best wall-clock time per call out of three repetitions
+    """
+    return min(repeat(f,number=number,repeat=3))/number
+
+def benchmark(nq,p,number):
+    """
+    Time the gradient and Hessian-vector products of a MaxCut QAOA circuit with the
+    stage vectors stored as strided columns and as contiguous aligned rows
+    """
+    C = qaoa.operators.IsingHamiltonian(graph=qaoa.util.graph.load(3,nq))
+    theta = np.random.rand(2*p)
+    dtheta = np.random.rand(2*p)
+    result = dict()
+    for layout in ("strided","contiguous"):
+        obj = qaoa.circuit.QAOACircuit(p,C,layout=layout)
+        # Perturb one control so that the states after it are recomputed on every call
+        def gradient():
+            theta[0] += 1e-3
+            obj.value_and_gradient(theta)
+        def hess_vec():
+            theta[0] += 1e-3
+            obj.hess_vec(theta,dtheta)
+        calls = { "value_and_gradient" : gradient, "hess_vec" : hess_vec }
+        for name, f in calls.items():
+            f() # Compile
+            result[(name,layout)] = time_call(f,number)
+    return result
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Compare the strided and contiguous layouts of the circuit states")
+    parser.add_argument('-q','--qubits',dest='nq',type=int,default=18,help='Number of qubits')
+    parser.add_argument('--layers',dest='layers',type=int,nargs='+',default=[1,2,4,8,16,32],help='Numbers of layers')
+    parser.add_argument('-n','--number',dest='number',type=int,default=3,help='Calls per timing')
+    args = parser.parse_args()
+
+    names = ("value_and_gradient","hess_vec")
+
+    print('\n  Time per call in seconds at {0} qubits (strided / contiguous, speedup)\n'.format(args.nq))
+    print('  +-----+' + '---------------------------------+'*len(names))
+    print('  | p   |' + ''.join(' {0:<32}|'.format(name) for name in names))
+    print('  +-----+' + '---------------------------------+'*len(names))
+    for p in args.layers:
+        t = benchmark(args.nq,p,args.number)
+        row = '  | {0:<4}|'.format(p)
+        for name in names:
+            ts, tc = t[(name,"strided")], t[(name,"contiguous")]
+            row += ' {0:<32}|'.format('{0:.3e} / {1:.3e}, {2:.2f}x'.format(ts,tc,ts/tc))
+        print(row)
+    print('  +-----+' + '---------------------------------+'*len(names))
+    print('\n  Shared scratch vectors: {0} bytes\n'.format(qaoa.util.Workspace.nbytes()))
@@ -0,0 +1,64 @@
+import numpy as np
+import qaoa
+from timeit import repeat
+import argparse
+
+
+def time_call(f,number):
+    """
+    Best wall-clock time per call out of three repetitions
+    """
+    return min(repeat(f,number=number,repeat=3))/number
+
+def benchmark(nq,number):
+    """
+    Time the sum of Pauli X operators and its propagator with both backends, applied to 
+    single vectors. The block methods used by the batch evaluations of the circuits run 
+    the stencil kernels with either backend, so they are not compared.
+    """
+    m = 1 << nq
+    u = np.random.randn(m) + 1j*np.random.randn(m)
+    v = np.random.randn(m) + 1j*np.random.randn(m)
+    w = np.zeros(m,dtype=complex)
+    result = dict()
+    for backend in qaoa.operators.SumSigmaXOperator.backends:
+        X = qaoa.operators.SumSigmaXOperator(nq,backend)
+        U = X.propagator(np.pi/5)
+        calls = { "apply"              : lambda : X.apply(v,w),
+                  "conj_inner_product" : lambda : X.conj_inner_product(u,v),
+                  "propagator"         : lambda : U.apply(v,w) }
+        for name, f in calls.items():
+            f() # Compile
+            result[(name,backend)] = time_call(f,number)
+    return result
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Compare the stencil and Walsh-Hadamard mixer backends")
+    parser.add_argument('--min-qubits',dest='nmin',type=int,default=8,help='Smallest number of qubits')
+    parser.add_argument('--max-qubits',dest='nmax',type=int,default=22,help='Largest number of qubits')
+    parser.add_argument('-n','--number',dest='number',type=int,default=5,help='Calls per timing')
+    args = parser.parse_args()
+
+    names = ("apply","conj_inner_product","propagator")
+    crossover = dict()
+
+    print('\n  Time per call in seconds (stencil / walsh), single-vector methods only. The block')
+    print('  methods used by value_batch, gradient_batch and hessian always use the stencil kernels\n')
+    print('  +-----+' + '-------------------------+'*len(names))
+    print('  | nq  |' + ''.join(' {0:<24}|'.format(name) for name in names))
+    print('  +-----+' + '-------------------------+'*len(names))
+    for nq in range(args.nmin,args.nmax+1):
+        t = benchmark(nq,args.number)
+        row = '  | {0:<4}|'.format(nq)
+        for name in names:
+            ts, tw = t[(name,"stencil")], t[(name,"walsh")]
+            row += ' {0:.3e} / {1:.3e}   |'.format(ts,tw)
+            if tw < ts and name not in crossover:
+                crossover[name] = nq
+        print(row)
+    print('  +-----+' + '-------------------------+'*len(names))
+
+    print('\n  Smallest number of qubits at which the walsh backend is faster:\n')
+    for name in names:
+        print('  {0:<20} {1}'.format(name,crossover.get(name,'not reached')))
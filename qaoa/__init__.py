@@ -2,3 +2,4 @@ from . import util
 from . import operators
 from . import circuit
 from . import sampling
+from .util import warmup
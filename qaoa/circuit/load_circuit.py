@@ -1,11 +1,12 @@
-def load_maxcut(degree=3,nvert=8,graph_num=0,nlayers=1,driver="SumSigmaX",driver_args=None):
+def load_maxcut(degree=3,nvert=8,graph_num=0,nlayers=1,driver="SumSigmaX",driver_args=None,compact=False,dtype=complex):
     import qaoa
+    import numpy as np
     from qaoa.circuit import QAOACircuit
     from qaoa.util.graph import load
     from qaoa.operators import IsingHamiltonian
 
     G = load(degree,nvert,graph_num)
-    C = IsingHamiltonian(graph=G)
+    C = IsingHamiltonian(graph=G,compact=compact,dtype=np.finfo(dtype).dtype)
 
     if driver_args == None:
         driver_args = [nvert]
@@ -22,5 +23,5 @@ def load_maxcut(degree=3,nvert=8,graph_num=0,nlayers=1,driver="SumSigmaX",driver
 #    else:
 #        D = driver(*driver_args)
 
-    obj = QAOACircuit(nlayers,C,D=D)
+    obj = QAOACircuit(nlayers,C,D=D,dtype=dtype)
     return obj
@@ -1,10 +1,12 @@
 import numpy as np
 from qaoa.circuit import QuantumCircuit
+from qaoa.circuit.quantum_circuit import threaded
 
 class QAOACircuit(QuantumCircuit):
 
 
-    def __init__(self,p,C,D=None,psi0=None):
+    def __init__(self,p,C,D=None,psi0=None,dtype=complex,fuse_layers=True,compiled=False,checkpoints=None,
+                 layout="contiguous",threads=None):
         """
         Simulates a Quantum Approximate Optimization Algorithm circuit with p layers
         using a Hamiltonian C and driver Hamiltonian/mixing operator D
@@ -29,6 +31,31 @@ class QAOACircuit(QuantumCircuit):
             D = \sum_{k=1}^n X_j \\
             X_k = I_{2^k} \otimes \sigma_x \otimes I_{2^{n-k-1}} \\
             \sigma_x = \begin{pmatrix} 0 & 1 \\ 1 & 0 \end{pmatrix}
+
+        psi0 - (numpy.ndarray) The initial state. Uniform superposition if not provided
+        dtype - (numpy complex type) Precision of the simulated states, either complex
+                (default) or numpy.complex64
+        fuse_layers - (bool) If C is a DiagonalOperator and D is the default mixer, 
+                      evaluate the objective and its gradient by applying each layer with a 
+                      QAOALayerPropagator, which applies the phase separator within the first 
+                      pass of the mixer. Only the states and adjoints at the ends of the layers 
+                      are computed. Default is True.
+        compiled - (bool) Evaluate the objective, gradient and Hessian-vector products each 
+                   with a single compiled function that propagates through the whole circuit
+                   using preallocated arrays, bypassing the stages. Intended for small qubit 
+                   counts, where the Python overhead of the stages dominates. Requires C to be 
+                   a DiagonalOperator and D to be the default mixer. The controls of the 
+                   stages are not updated in this mode. The Hessian, and hence hess_eig, 
+                   is evaluated by one compiled Hessian-vector product per control. The 
+                   arrays of the compiled functions are built on first use and not pickled, 
+                   so that processes receiving the circuit build them from C, which may be 
+                   shared (see QuantumCircuit.share_operators). Default is False.
+        checkpoints - (None, "sqrt", "uncompute" or unsigned int) Memory mode, see QuantumCircuit. Fused 
+                      layers and the compiled circuit are not used with checkpointing.
+        layout - (str) Storage of the stage vectors, "contiguous" (default) or "strided". 
+                 See QuantumCircuit.
+        threads - (unsigned int) Number of threads of the kernels during the evaluations. 
+                  If None (default), the setting of qaoa.util.kernel_threads is used.
         """
 
         if D is None:
@@ -38,4 +65,165 @@ class QAOACircuit(QuantumCircuit):
             from qaoa.operators import HermitianOperator
             assert( isinstance(D,HermitianOperator) )
 
-        super().__init__([C,D]*p,C,psi0)
+        super().__init__([C,D]*p,C,psi0,dtype,checkpoints,layout,threads)
+
+        from qaoa.operators import QAOALayerPropagator
+        self.fused = fuse_layers and QAOALayerPropagator.is_fusable(C,D) and self.plan is None
+        self.layers = [QAOALayerPropagator(self.stage[2*k+1].U,self.stage[2*k+2].U) \
+                       for k in range(p)] if self.fused else None
+
+        self.compiled = compiled
+        if self.compiled:
+            if not QAOALayerPropagator.is_fusable(C,D):
+                raise ValueError("The compiled circuit requires a DiagonalOperator and the stencil SumSigmaXOperator")
+            if self.plan is not None:
+                raise ValueError("The compiled circuit stores every state and cannot be checkpointed")
+        self.phase_index = self.phase_values = self.compiled_work = self.compiled_vecs = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(phase_index=None,phase_values=None,compiled_work=None,compiled_vecs=None)
+        return state
+
+    def layer_psi(self):
+        """
+        Compute the state at the end of every layer with the fused layer propagators,
+        skipping the states of the phase separator stages. States of the mixer stages 
+        that are still valid are reused. Returns the final state.
+        """
+        psi = self.psi0
+        for k,U in enumerate(self.layers):
+            stage = self.stage[2*k+2]
+            if stage.need_compute_psi:
+                U.apply(psi,stage._psi)
+                stage.need_compute_psi = False
+            psi = stage._psi
+        return psi
+
+    def layer_lam(self):
+        """
+        Compute the adjoint at the end of every layer with the adjoint fused layer 
+        propagators. Returns the adjoint pulled back to the initial state, which is
+        stored in the adjoint vector of the first phase separator stage.
+        """
+        p = len(self.layers)
+        self.stage[-2].lam()
+        for k in reversed(range(p-1)):
+            stage = self.stage[2*k+2]
+            if stage.need_compute_lam:
+                self.layers[k+1].apply_adjoint(self.stage[2*k+4]._lam,stage._lam)
+                stage.prev.notify_compute_lam()
+                stage.need_compute_lam = False
+        lam0 = self.stage[1]._lam
+        self.layers[0].apply_adjoint(self.stage[2]._lam,lam0)
+        self.stage[1].notify_compute_lam()
+        return lam0
+
+    def layer_gradient(self):
+        """
+        Gradient with the fused layer propagators. The derivative with respect to the
+        control of a phase separator stage is evaluated with the state and adjoint at 
+        the end of the previous layer, since C commutes with its propagator.
+        """
+        self.layer_psi()
+        lam0 = self.layer_lam()
+        grad = np.zeros(self.num_stages)
+        for k in range(len(self.layers)):
+            C, D = self.A[2*k], self.A[2*k+1]
+            prev, stage = self.stage[2*k], self.stage[2*k+2]
+            psi, lam = (self.psi0, lam0) if k == 0 else (prev._psi, prev._lam)
+            grad[2*k]   = -2 * C.conj_inner_product(lam,psi).imag
+            grad[2*k+1] = -2 * D.conj_inner_product(stage._lam,stage._psi).imag
+        return grad
+
+    def compiled_args(self):
+        """
+        Arguments describing the circuit that are passed to every compiled function. The
+        phases of C and the workspace of the compiled functions are built on first use.
+        """
+        if self.phase_index is None:
+            from qaoa.util import aligned_zeros
+            C = self.A[-1]
+            levels = C.spectrum_levels()
+            if levels is None:
+                self.phase_index = np.arange(1<<self.num_qubits)
+                self.phase_values = C.data.astype(float)
+            else:
+                self.phase_index = levels[0].astype(np.int64) - levels[2]
+                self.phase_values = levels[1].astype(float)
+            N, L = 1 << self.num_qubits, self.num_stages
+            self.compiled_work = aligned_zeros(2*(L+1),N,self.dtype).reshape(2,L+1,N)
+            self.compiled_vecs = aligned_zeros(3,N,self.dtype)
+        return self.num_qubits, self.phase_index, self.phase_values
+
+    def compiled_gradient(self,theta):
+        """
+        Objective function and gradient computed by the compiled function
+        """
+        from qaoa.util.math import qaoa_gradient
+        grad = np.zeros(self.num_stages)
+        value = qaoa_gradient(*self.compiled_args(),np.asarray(theta,dtype=float),self.psi0,
+                              self.compiled_work[0],self.compiled_vecs[0],grad)
+        return value, grad
+
+    @threaded
+    def value(self,theta):
+        if self.compiled:
+            from qaoa.util.math import qaoa_value
+            self.count["value"] += 1
+            return qaoa_value(*self.compiled_args(),np.asarray(theta,dtype=float),self.psi0,
+                              self.compiled_vecs[0])
+        if not self.fused:
+            return super().value(theta)
+        self.count["value"] += 1
+        self.set_control(theta)
+        return self.A[-1].expectation(self.layer_psi())
+
+    @threaded
+    def gradient(self,theta):
+        if self.compiled:
+            self.count["gradient"] += 1
+            return self.compiled_gradient(theta)[1]
+        if not self.fused:
+            return super().gradient(theta)
+        self.count["gradient"] += 1
+        self.set_control(theta)
+        return self.layer_gradient()
+
+    @threaded
+    def value_and_gradient(self,theta):
+        if self.compiled:
+            self.count["value"] += 1
+            self.count["gradient"] += 1
+            return self.compiled_gradient(theta)
+        if not self.fused:
+            return super().value_and_gradient(theta)
+        from qaoa.util.math import conj_inner_product
+        self.count["value"] += 1
+        self.count["gradient"] += 1
+        self.set_control(theta)
+        grad = self.layer_gradient()
+        value = conj_inner_product(self.num_qubits,self.stage[-2]._psi,self.stage[-2]._lam).real
+        return value, grad
+
+    @threaded
+    def hess_vec(self,theta,dtheta):
+        if not self.compiled:
+            return super().hess_vec(theta,dtheta)
+        from qaoa.util.math import qaoa_hess_vec
+        self.count["hess_vec"] += 1
+        hv = np.zeros(self.num_stages)
+        qaoa_hess_vec(*self.compiled_args(),np.asarray(theta,dtype=float),np.asarray(dtheta,dtype=float),
+                      self.psi0,*self.compiled_work,*self.compiled_vecs,hv)
+        return hv
+
+    @threaded
+    def hessian(self,theta,batch_size=None):
+        """
+        Evaluate the Hessian matrix at a point theta. The compiled circuit evaluates one
+        compiled Hessian-vector product per control. See QuantumCircuit.hessian.
+        """
+        if not self.compiled:
+            return super().hessian(theta,batch_size)
+        self.count["hessian"] += 1
+        return np.array([self.hess_vec(theta,e) for e in np.eye(self.num_stages)])
@@ -1,4 +1,19 @@
 import numpy as np
+from functools import wraps
+
+def threaded(method):
+    """
+    Evaluate a method of a circuit with the kernel threads of the circuit, if set
+    """
+    @wraps(method)
+    def wrapper(self,*args,**kwargs):
+        if self.threads is None:
+            return method(self,*args,**kwargs)
+        from qaoa.util import kernel_threads
+        with kernel_threads(self.threads):
+            return method(self,*args,**kwargs)
+    return wrapper
+
 
 class QuantumCircuit(object):
     """
@@ -16,12 +31,56 @@ class QuantumCircuit(object):
         The number of UnitaryStages 
     num_qubits : unsigned int
         The number of qubits in a stage. Every stage must have the same number of qubits. 
+    batch_size : unsigned int
+        The maximum number of control vectors propagated together as a block by the 
+        batch evaluation methods when no batch size is given. 
+    batch_memory : unsigned int
+        Size in bytes of the batch workspace when no batch size is given. The default 
+        block holds as many vectors as fit, up to batch_size and at least one, so that 
+        the workspace does not grow with the number of qubits. See default_batch_size().
+    dtype : numpy.dtype
+        Complex type of the state vectors, either complex128 (default) or complex64. 
+        Single precision halves the memory and bandwidth of the simulation. Inner 
+        products are accumulated in double precision for either type.
+    checkpoints : None, str or unsigned int
+        Memory mode of the value, gradient and Hessian-vector product evaluations. If None,
+        the state, adjoint and their sensitivities are stored for every stage. Otherwise,
+        only checkpointed states and the states of one segment of stages are stored and the
+        states of the other segments are recomputed from the checkpoints during the adjoint 
+        sweep, which costs at most one additional forward sweep. With "sqrt", about 
+        2*sqrt(num_stages) states are stored. An integer sets the maximum number of stored
+        states. With "uncompute", no stage states are stored and the adjoint sweep recovers
+        them by applying the adjoint of every propagator to the final state, so that three
+        vectors (five for hess_vec) are used for any depth. See memory_usage().
+    drift : float
+        In the "uncompute" mode, the relative error of the initial state recovered at the
+        end of the last adjoint sweep, which measures the round-off accumulated by undoing 
+        the stages. A RuntimeWarning is issued if it exceeds drift_tolerance. 
+    drift_tolerance : float
+        Largest drift before warning. Default is 100*num_stages times the machine epsilon
+        of the state type.
+    layout : str
+        Storage of the stage vectors when every state is stored. With "contiguous" 
+        (default), the psi, lam, dpsi and dlam vectors of every stage are rows of one
+        array, each contiguous and 64-byte aligned. With "strided", they are the columns
+        of one array of shape (2**nq,4*num_stages+1), which is slower for more than a few 
+        stages and kept for comparison. The scratch vectors of the stages are shared by
+        every circuit, see qaoa.util.Workspace.
+    threads : unsigned int or None
+        Number of threads of the kernels during the evaluations of the circuit. One thread
+        selects the serial kernels. If None, the setting of qaoa.util.kernel_threads in 
+        effect is used.
        
     """
-    def __init__(self,ops,H,psi0=None):
+
+    batch_size = 64
+    batch_memory = 1 << 28
+
+    def __init__(self,ops,H,psi0=None,dtype=complex,checkpoints=None,layout="contiguous",threads=None):
 
         from qaoa.operators import HermitianOperator  
         from qaoa.circuit import CircuitStage, InitialStage, UnitaryStage, TargetStage
+        from qaoa.util import aligned_zeros
 
         self.count = { 'value'    : 0, \
                        'gradient' : 0, \
@@ -41,33 +100,362 @@ class QuantumCircuit(object):
  
         assert nqs.count(self.num_qubits) == self.num_stages+1 
 
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.complex64,np.complex128):
+            raise TypeError("Circuit states must have type complex64 or complex128, not {0}".format(self.dtype))
+
+        N = 1 << self.num_qubits
+        self.checkpoints = checkpoints
+        self.plan = self.checkpoint_plan(self.num_stages,checkpoints)
+        self.batch_work = None
+        self.layout = layout
+        self.threads = threads
+        self.drift = 0.0
+        self.drift_tolerance = 100*self.num_stages*np.finfo(self.dtype).eps
+
+        if self.plan is not None:
+            self.allocate_checkpoints(psi0,1)
+            return
+
         # Allocate workspace vectors
         #  
         # 1 vector for psi0
         # 4 vectors per UnitaryStage (psi,lam,dpsi,dlam)
 
-        N = 1 << self.num_qubits
         L = 4*self.num_stages
-        self.work = np.zeros((N,L+1),dtype=complex)
+        if layout == "contiguous":
+            self.work = aligned_zeros(L+1,N,self.dtype)
+            vectors = self.work
+        elif layout == "strided":
+            self.work = np.zeros((N,L+1),dtype=self.dtype)
+            vectors = self.work.T
+        else:
+            raise ValueError("Unknown state layout {0}".format(layout))
 
-        self.psi0 = self.work[:,-1]
+        self.psi0 = vectors[-1]
 
-        self.psi0[:] = np.ones(N,dtype=complex)/np.sqrt(N) if psi0 is None else psi0
+        self.psi0[:] = np.ones(N)/np.sqrt(N) if psi0 is None else psi0
 
-        self.psi  = self.work[:,0:L:4]
-        self.lam  = self.work[:,1:L+1:4]
-        self.dpsi = self.work[:,2:L+2:4]
-        self.dlam = self.work[:,3:L+3:4]
+        self.psi  = vectors[0:L:4]
+        self.lam  = vectors[1:L+1:4]
+        self.dpsi = vectors[2:L+2:4]
+        self.dlam = vectors[3:L+3:4]
 
         self.stage = [InitialStage(psi0=self.psi0)]
 
-        [self.stage.append(UnitaryStage(A,  psi=self.psi[:,k],   lam=self.lam[:,k],   \
-                                           dpsi=self.dpsi[:,k], dlam=self.dlam[:,k])) \
+        [self.stage.append(UnitaryStage(A,  psi=self.psi[k],   lam=self.lam[k],   \
+                                           dpsi=self.dpsi[k], dlam=self.dlam[k],  \
+                                           dtype=self.dtype))                     \
         for k,A in enumerate(self.A[:-1])]
 
         self.stage.append(TargetStage(self.A[-1]))
         CircuitStage.link(*self.stage)
 
+    @staticmethod
+    def checkpoint_plan(L,checkpoints):
+        """
+        Choose the segment length for a checkpointed circuit with L stages
+
+        The states after every segment of stages are stored as checkpoints, except the 
+        last, and the states of one segment are stored at a time. A budget of M states 
+        allows any segment length s with ceil(L/s)-1+s <= M. The longest such segment is
+        chosen, since the states of the last segment are not recomputed.
+
+        Returns
+        -------
+        plan : tuple, str or None
+            Pair (segment_length,num_checkpoints), "uncompute", or None if every state 
+            is stored
+        """
+        if checkpoints is None or checkpoints == "uncompute":
+            return checkpoints
+        if checkpoints == "sqrt":
+            s = int(np.ceil(np.sqrt(L)))
+            return s, -(-L//s)-1
+        M = int(checkpoints)
+        if M >= L:
+            return L, 0
+        feasible = [s for s in range(1,L+1) if -(-L//s)-1+s <= M]
+        if not feasible:
+            raise ValueError("A circuit with {0} stages must store at least {1} states".format(L, \
+                             min(-(-L//s)-1+s for s in range(1,L+1))))
+        s = max(feasible)
+        return s, -(-L//s)-1
+
+    def allocate_checkpoints(self,psi0,m):
+        """
+        Internally-used method that allocates the storage of a checkpointed circuit for
+        m=1 (gradient) or m=2 (Hessian-vector product) vectors per stored state, 2*m 
+        vectors for the adjoint sweep and psi0, or 2*m+2 vectors in the "uncompute" mode.
+        Creates the stages on first use, which only hold the controls and propagators.
+        """
+        from qaoa.circuit import CircuitStage, InitialStage, UnitaryStage, TargetStage
+        from qaoa.util import aligned_zeros
+        N = 1 << self.num_qubits
+        if self.plan == "uncompute":
+            nvec = 2*m + 2
+        else:
+            s, c = self.plan
+            nvec = m*(s+c) + 2*m + 1
+        self.vectors_per_state = m
+        if hasattr(self,'work'):
+            if self.work.shape[0] >= nvec:
+                return
+            psi0 = np.copy(self.psi0)
+        self.work = aligned_zeros(nvec,N,self.dtype)
+        self.psi0 = self.work[-1]
+        self.psi0[:] = np.ones(N)/np.sqrt(N) if psi0 is None else psi0
+        if not hasattr(self,'stage'):
+            self.stage = [InitialStage(psi0=self.psi0)]
+            self.stage.extend([UnitaryStage(A,dtype=self.dtype,storage=False) for A in self.A[:-1]])
+            self.stage.append(TargetStage(self.A[-1]))
+            CircuitStage.link(*self.stage)
+        self.stage[0]._psi = self.psi0
+
+    def checkpoint_views(self):
+        """
+        Views of the storage of a checkpointed circuit
+
+        Returns
+        -------
+        states : numpy.ndarray
+            Array of shape (segment_length,m,2**nq) holding the states of one segment 
+        checkpoints : numpy.ndarray
+            Array of shape (num_checkpoints,m,2**nq) holding the states after every 
+            segment but the last 
+        adjoint : numpy.ndarray
+            Array of shape (2*m,2**nq) of vectors used by the adjoint sweep
+        """
+        s, c = self.plan
+        m = self.vectors_per_state
+        N = 1 << self.num_qubits
+        states = self.work[:m*s].reshape(s,m,N)
+        checkpoints = self.work[m*s:m*(s+c)].reshape(c,m,N)
+        return states, checkpoints, self.work[m*(s+c):m*(s+c+2)]
+
+    def memory_usage(self):
+        """
+        Report the memory used by the state vectors of the circuit and the extra work
+        done to limit it
+
+        Returns
+        -------
+        usage : dict
+            'stored_states'     : number of stage states stored at any time
+            'segment_length'    : number of consecutive stages whose states are stored 
+            'num_checkpoints'   : number of checkpointed states
+            'vectors'           : number of vectors of length 2**nq allocated
+            'bytes'             : size of the allocated vectors
+            'recomputed_stages' : stage propagations per gradient in addition to the 
+                                  forward and adjoint sweeps
+        """
+        L = self.num_stages
+        if self.plan is None:
+            vectors = 4*L + 2 # Including the work vector shared by the stages
+            return { 'stored_states' : L, 'segment_length' : L, 'num_checkpoints' : 0, 
+                     'vectors' : vectors, 'bytes' : vectors*self.psi0.nbytes, 
+                     'recomputed_stages' : 0 }
+        if self.plan == "uncompute":
+            # Every stage is undone once, including the first to measure the drift
+            return { 'stored_states' : 0, 'segment_length' : 0, 'num_checkpoints' : 0,
+                     'vectors' : self.work.shape[0], 'bytes' : self.work.nbytes,
+                     'recomputed_stages' : L }
+        s, c = self.plan
+        return { 'stored_states' : s+c, 'segment_length' : s, 'num_checkpoints' : c,
+                 'vectors' : self.work.shape[0], 'bytes' : self.work.nbytes,
+                 'recomputed_stages' : c*s } 
+
+    def segment(self,j):
+        """
+        Indices of the stages in segment j of a checkpointed circuit
+        """
+        s = self.plan[0]
+        return range(j*s,min((j+1)*s,self.num_stages))
+
+    def segment_states(self,j,dtheta=None,tmp=None):
+        """
+        Propagate the state (and with dtheta, the state sensitivity) from the checkpoint 
+        before segment j through its stages, storing them in the segment states. The 
+        sensitivities require the work vector tmp.
+        """
+        states, checkpoints, adjoint = self.checkpoint_views()
+        x = self.psi0 if j == 0 else checkpoints[j-1,0]
+        dx = None if j == 0 or dtheta is None else checkpoints[j-1,1]
+        for i,k in enumerate(self.segment(j)):
+            U = self.stage[k+1].U
+            U.apply(x,states[i,0])
+            if dtheta is not None:
+                self.A[k].apply(x,tmp)
+                tmp *= 1j*dtheta[k]
+                if dx is not None:
+                    tmp += dx
+                U.apply(tmp,states[i,1])
+                dx = states[i,1]
+            x = states[i,0]
+
+    def checkpoint_forward(self,theta,dtheta=None):
+        """
+        Forward sweep of a checkpointed circuit that stores the checkpoints and leaves 
+        the states of the last segment in the segment states. Returns the final state
+        (and sensitivity).
+        """
+        if self.plan == "uncompute":
+            return self.uncompute_forward(theta,dtheta)
+        states, checkpoints, adjoint = self.checkpoint_views()
+        s, c = self.plan
+        self.set_control(theta)
+        for j in range(c+1):
+            self.segment_states(j,dtheta,adjoint[0])
+            if j < c:
+                checkpoints[j] = states[s-1]
+        return states[self.num_stages-1-c*s]
+
+    def checkpoint_gradient(self,theta):
+        """
+        Objective function and gradient of a checkpointed circuit
+        """
+        from qaoa.util.math import conj_inner_product
+        self.allocate_checkpoints(None,1)
+        if self.plan == "uncompute":
+            return self.uncompute_gradient(theta)
+        states, checkpoints, adjoint = self.checkpoint_views()
+        s, c = self.plan
+        L = self.num_stages
+        psi = self.checkpoint_forward(theta)[0]
+        lam, work = adjoint
+        self.A[-1].apply(psi,lam)
+        value = conj_inner_product(self.num_qubits,psi,lam).real
+        grad = np.zeros(L)
+        for j in reversed(range(c+1)):
+            if j < c:
+                self.segment_states(j)
+            for k in reversed(self.segment(j)):
+                grad[k] = -2 * self.A[k].conj_inner_product(lam,states[k-j*s,0]).imag
+                if k > 0:
+                    self.stage[k+1].U.apply_adjoint(lam,work)
+                    lam, work = work, lam
+        return value, grad
+
+    def checkpoint_hess_vec(self,theta,dtheta):
+        """
+        Hessian-vector product of a checkpointed circuit
+        """
+        self.allocate_checkpoints(None,2)
+        if self.plan == "uncompute":
+            return self.uncompute_hess_vec(theta,dtheta)
+        states, checkpoints, adjoint = self.checkpoint_views()
+        s, c = self.plan
+        L = self.num_stages
+        psi, dpsi = self.checkpoint_forward(theta,dtheta)
+        lam, dlam, work, dwork = adjoint
+        self.A[-1].apply(psi,lam)
+        self.A[-1].apply(dpsi,dlam)
+        hv = np.zeros(L)
+        for j in reversed(range(c+1)):
+            if j < c:
+                self.segment_states(j,dtheta,work)
+            for k in reversed(self.segment(j)):
+                psi, dpsi = states[k-j*s]
+                hv[k] = -2 * ( self.A[k].conj_inner_product(dlam,psi) + \
+                               self.A[k].conj_inner_product(lam,dpsi) ).imag
+                if k > 0:
+                    U = self.stage[k+1].U
+                    U.apply_adjoint(lam,work)
+                    U.apply_adjoint(dlam,dwork)
+                    lam, work, dlam, dwork = work, lam, dwork, dlam
+                    self.A[k].apply(lam,work)
+                    work *= 1j*dtheta[k]
+                    dlam -= work
+        return hv
+
+    def uncompute_forward(self,theta,dtheta=None):
+        """
+        Forward sweep of the "uncompute" mode. The state (and sensitivity) is propagated 
+        through the vectors of the work array, which are returned in the order 
+        (psi,lam,tmp) or (psi,dpsi,lam,dlam,tmp), with the final state first.
+        """
+        vecs = list(self.work[:2*self.vectors_per_state+1])
+        psi, tmp = vecs[0], vecs[-1]
+        psi[:] = self.psi0
+        dpsi = vecs[1] if dtheta is not None else None
+        if dpsi is not None:
+            dpsi[:] = 0
+        self.set_control(theta)
+        for k in range(self.num_stages):
+            U = self.stage[k+1].U
+            if dpsi is not None:
+                self.A[k].apply(psi,tmp)
+                tmp *= 1j*dtheta[k]
+                tmp += dpsi
+                U.apply(tmp,dpsi)
+            U.apply(psi,tmp)
+            psi, tmp = tmp, psi
+        vecs = [v for v in vecs if v is not psi and v is not dpsi]
+        return [psi] + ([dpsi] if dpsi is not None else []) + vecs
+
+    def check_drift(self,psi):
+        """
+        Internally-used method that compares the initial state recovered by the adjoint
+        sweep with psi0 and warns if the round-off exceeds the drift tolerance
+        """
+        self.drift = np.linalg.norm(psi-self.psi0)/np.linalg.norm(self.psi0)
+        if self.drift > self.drift_tolerance:
+            import warnings
+            warnings.warn("Recovered initial state has drifted by {0:.2e} after undoing {1} stages; " \
+                          "use checkpoints for this circuit".format(self.drift,self.num_stages), \
+                          RuntimeWarning)
+
+    def uncompute_gradient(self,theta):
+        """
+        Objective function and gradient in the "uncompute" mode. The states are 
+        recovered during the adjoint sweep by undoing each stage.
+        """
+        from qaoa.util.math import conj_inner_product
+        psi, lam, tmp = self.uncompute_forward(theta)
+        self.A[-1].apply(psi,lam)
+        value = conj_inner_product(self.num_qubits,psi,lam).real
+        grad = np.zeros(self.num_stages)
+        for k in reversed(range(self.num_stages)):
+            U = self.stage[k+1].U
+            grad[k] = -2 * self.A[k].conj_inner_product(lam,psi).imag
+            U.apply_adjoint(psi,tmp)
+            psi, tmp = tmp, psi
+            if k > 0:
+                U.apply_adjoint(lam,tmp)
+                lam, tmp = tmp, lam
+        self.check_drift(psi)
+        return value, grad
+
+    def uncompute_hess_vec(self,theta,dtheta):
+        """
+        Hessian-vector product in the "uncompute" mode. The state sensitivities are
+        recovered from dpsi_{k-1} = U_k^H dpsi_k - i*dtheta_k*A_k psi_{k-1}.
+        """
+        psi, dpsi, lam, dlam, tmp = self.uncompute_forward(theta,dtheta)
+        self.A[-1].apply(psi,lam)
+        self.A[-1].apply(dpsi,dlam)
+        hv = np.zeros(self.num_stages)
+        for k in reversed(range(self.num_stages)):
+            U = self.stage[k+1].U
+            hv[k] = -2 * ( self.A[k].conj_inner_product(dlam,psi) + \
+                           self.A[k].conj_inner_product(lam,dpsi) ).imag
+            U.apply_adjoint(psi,tmp)
+            psi, tmp = tmp, psi
+            U.apply_adjoint(dpsi,tmp)
+            dpsi, tmp = tmp, dpsi
+            self.A[k].apply(psi,tmp)
+            tmp *= 1j*dtheta[k]
+            dpsi -= tmp
+            if k > 0:
+                U.apply_adjoint(lam,tmp)
+                lam, tmp = tmp, lam
+                U.apply_adjoint(dlam,tmp)
+                dlam, tmp = tmp, dlam
+                self.A[k].apply(lam,tmp)
+                tmp *= 1j*dtheta[k]
+                dlam -= tmp
+        self.check_drift(psi)
+        return hv
 
     def __len__(self):
         return self.num_stages
@@ -83,12 +471,26 @@ class QuantumCircuit(object):
                 Acopy.append(deepcopy(A,memo))
             else:
                 Acopy.append(Acopy[k0])  
-        qc_copy = QuantumCircuit(Acopy[:-1],Acopy[-1],numpy.copy(self.psi0))
+        qc_copy = QuantumCircuit(Acopy[:-1],Acopy[-1],numpy.copy(self.psi0),self.dtype,self.checkpoints,self.layout,self.threads)
         qc_copy.set_control(self.get_control())
         qc_copy.set_differential_control(self.get_differential_control())
         return qc_copy
 
 
+    def share_operators(self):
+        """
+        Move the diagonals of the diagonal operators of the circuit to shared memory, so that 
+        processes that receive the circuit attach to them. See DiagonalOperator.share.
+
+        Returns
+        -------
+        shared : list
+            Operators that were not shared before, which the caller must release
+        """
+        from qaoa.operators import DiagonalOperator
+        ops = { id(A) : A for A in self.A if isinstance(A,DiagonalOperator) and A.shared is None }
+        return [ A.share() for A in ops.values() ]
+
     def reset_count(self):
         for key in self.count.keys():
             self.count[key] = 0
@@ -129,51 +531,412 @@ class QuantumCircuit(object):
     def final_state(self,theta):
         return self.stages[-1].psi()
 
+    @threaded
     def value(self,theta):
         """
         Compute the objective function at a point theta
         """
         self.count["value"] += 1
+        if self.plan is not None:
+            self.allocate_checkpoints(None,1)
+            return self.A[-1].expectation(self.checkpoint_forward(theta)[0])
         self.set_control(theta)
         return self.A[-1].expectation(self.stage[-2].psi())
 
+    @threaded
     def gradient(self,theta):
         """
         Compute the gradient of the objective function at a point theta
         """
         self.count["gradient"] += 1
+        if self.plan is not None:
+            return self.checkpoint_gradient(theta)[1]
         self.set_control(theta)
         return np.array([self.stage[k+1].deriv_1() \
                          for k in range(self.num_stages)])
 
+    @threaded
+    def value_and_gradient(self,theta):
+        """
+        Compute the objective function and its gradient at a point theta with one 
+        forward sweep and one adjoint sweep
+
+        The value is obtained from the product of the target operator with the final
+        state that also initializes the adjoint sweep, so the target operator is applied
+        only once. The returned pair is the form expected by scipy.optimize.minimize 
+        when jac=True
+
+        >>> result = minimize(obj.value_and_gradient, theta, jac=True, method="BFGS")
+
+        Returns
+        -------
+        value : float
+            The objective function
+        gradient : numpy.ndarray
+            The gradient of the objective function
+        """
+        from qaoa.util.math import conj_inner_product
+        self.count["value"] += 1
+        self.count["gradient"] += 1
+        if self.plan is not None:
+            return self.checkpoint_gradient(theta)
+        self.set_control(theta)
+        Cpsi = self.stage[-2].lam()
+        value = conj_inner_product(self.num_qubits,self.stage[-2].psi(),Cpsi).real
+        return value, np.array([self.stage[k+1].deriv_1() \
+                                for k in range(self.num_stages)])
+
+    def default_batch_size(self,num_blocks):
+        """
+        Number of vectors per block for which num_blocks blocks fit in batch_memory bytes,
+        between one and batch_size
+        """
+        nbytes = num_blocks * (1 << self.num_qubits) * self.dtype.itemsize
+        return max(1,min(self.batch_size,self.batch_memory//nbytes))
+
+    def batch_workspace(self,num_blocks,B):
+        """
+        Return num_blocks contiguous blocks of B state vectors each, reallocating the batch 
+        workspace only if it is too small, so that smaller trailing batches reuse it
+        """
+        N = 1 << self.num_qubits
+        size = num_blocks*N*B
+        if self.batch_work is None or self.batch_work.size < size:
+            self.batch_work = np.zeros(size,dtype=self.dtype)
+        return self.batch_work[:size].reshape(num_blocks,N,B)
+
+    def batches(self,theta,batch_size,num_blocks):
+        """
+        Split an array of control vectors into batches, of the default size for num_blocks
+        blocks if batch_size is None
+        """
+        theta = np.atleast_2d(theta)
+        assert(theta.shape[1] == self.num_stages)
+        batch_size = self.default_batch_size(num_blocks) if batch_size is None else batch_size
+        return [theta[k:k+batch_size] for k in range(0,len(theta),batch_size)]
+
+    def forward_block(self,theta,X,Y):
+        """
+        Propagate the initial state through the circuit for a batch of control vectors,
+        alternating between the blocks X and Y. Returns the block holding the final states.
+        """
+        X[:] = self.psi0[:,None]
+        for k in range(self.num_stages):
+            self.stage[k+1].U.apply_block(X,Y,theta[:,k])
+            X, Y = Y, X
+        return X
+  
+    @threaded
+    def value_batch(self,theta,batch_size=None):
+        """
+        Compute the objective function at many points
+
+        The states for up to batch_size control vectors are propagated through the 
+        circuit together as a block of shape (2**nq,batch_size). Does not modify the
+        controls or the cached states of the circuit.
+
+        Parameters
+        ----------
+        theta : numpy.ndarray
+            Array of control vectors of shape (B,num_stages)
+        batch_size : unsigned int, optional
+            Maximum number of control vectors to propagate together. Uses 
+            default_batch_size(2) if not provided.
+
+        Returns
+        -------
+        values : numpy.ndarray
+            Array of B objective values
+        """
+        values = list()
+        for batch in self.batches(theta,batch_size,2):
+            B = len(batch)
+            self.count["value"] += B
+            X, Y = self.batch_workspace(2,B)
+            values.append(self.A[-1].expectation_block(self.forward_block(batch,X,Y)))
+        return np.concatenate(values)
+
+    @threaded
+    def gradient_batch(self,theta,batch_size=None):
+        """
+        Compute the gradient of the objective function at many points
+
+        The states of every stage are stored for a block of up to batch_size control vectors,
+        which requires a workspace of (num_stages+2)*batch_size state vectors. Does not modify
+        the controls or the cached states of the circuit.
+
+        Parameters
+        ----------
+        theta : numpy.ndarray
+            Array of control vectors of shape (B,num_stages)
+        batch_size : unsigned int, optional
+            Maximum number of control vectors to propagate together. Uses 
+            default_batch_size(num_stages+2) if not provided.
+
+        Returns
+        -------
+        gradient : numpy.ndarray
+            Array of shape (B,num_stages) containing the gradient at every point
+        """
+        L = self.num_stages
+        gradients = list()
+        for batch in self.batches(theta,batch_size,L+2):
+            B = len(batch)
+            self.count["gradient"] += B
+            W = self.batch_workspace(L+2,B)
+            psi, lam, work = W[:L], W[L], W[L+1]
+
+            # Forward sweep storing the state of every stage
+            lam[:] = self.psi0[:,None]
+            self.stage[1].U.apply_block(lam,psi[0],batch[:,0])
+            for k in range(1,L):
+                self.stage[k+1].U.apply_block(psi[k-1],psi[k],batch[:,k])
+
+            # Adjoint sweep
+            self.A[-1].apply_block(psi[L-1],lam)
+            grad = np.zeros((B,L))
+            for k in reversed(range(L)):
+                grad[:,k] = -2 * self.A[k].conj_inner_product_block(lam,psi[k]).imag
+                if k > 0:
+                    self.stage[k+1].U.apply_adjoint_block(lam,work,batch[:,k])
+                    lam, work = work, lam
+            gradients.append(grad)
+        return np.concatenate(gradients)
+
     def gradient_norm(self,theta):
         """
         Compute the norm of the gradient of the objective function at a point theta
         """
         return np.linalg.norm(self.gradient(theta))
 
+    @threaded
     def hess_vec(self,theta,dtheta):
         """
         Compute the action of the Hessian matrix evaluated at 
         a point theta on a direction vector dtheta
         """
         self.count["hess_vec"] += 1
+        if self.plan is not None:
+            return self.checkpoint_hess_vec(theta,dtheta)
         self.set_control(theta)
         self.set_differential_control(dtheta)
         return np.array([self.stage[k+1].deriv_2() \
                          for k in range(self.num_stages)])
  
-    def hessian(self,theta):
+    def sensitivity_blocks(self,j0,j1,psi,a,X,Y):
+        """
+        Internally-used generator for the forward sweep of the sensitivities of the state 
+        to the controls j0,...,j1-1, dpsi_k = U_k dpsi_{k-1} + i*A_k psi_k*e_k, in the 
+        blocks X and Y of j1-j0 vectors. The sensitivity to theta[j] vanishes before 
+        stage j. For every stage k >= j0, yields k and the block of the sensitivities to 
+        the controls j0,...,min(k,j1-1) after stage k, leaving A_k psi_k in a if k < j1.
+        """
+        active = lambda k : min(k+1,j1)-j0
+        for k in range(j0,self.num_stages):
+            if k > j0:
+                n = active(k-1)
+                self.stage[k+1].U.apply_block(X[:,:n],Y[:,:n])
+                X, Y = Y, X
+            if k < j1:
+                self.A[k].apply(psi[k],a)
+                X[:,k-j0] = 1j*a
+            yield k, X[:,:active(k)]
+
+    @threaded
+    def hessian(self,theta,batch_size=None):
         """
-        Evaluate the Hessian matri at a point theta
+        Evaluate the Hessian matrix at a point theta
+
+        The state sensitivities to every control are propagated together as blocks of
+        up to batch_size vectors in one forward and one adjoint sweep, reusing the states
+        and adjoints of the circuit. The products with the blocks are accumulated in double
+        precision. The sensitivity to theta[j] vanishes before stage j
+        and, after stage j, the adjoint sensitivity needs no source terms, so only the 
+        entries H[k,j] with k >= j are computed, on the nonzero columns of the blocks. 
+        Checkpointed circuits evaluate one Hessian-vector product per control.
+
+        Parameters
+        ----------
+        theta : numpy.ndarray
+            Control vector
+        batch_size : unsigned int, optional
+            Maximum number of sensitivities to propagate together. Uses 
+            default_batch_size(3) if not provided.
         """
         self.count["hessian"] += 1
+        if self.plan is not None:
+            I = np.eye(self.num_stages)
+            return np.array([self.hess_vec(theta,e) for e in I])
+
+        from qaoa.util import aligned_zeros
         self.set_control(theta)
-        I = np.eye(self.num_stages)
-        return np.array([self.hess_vec(theta,e) for e in I])
+        L = self.num_stages
+        B = min(L,self.default_batch_size(3) if batch_size is None else batch_size)
+        self.stage[1].lam()  # Computes every state and adjoint
+        psi = [stage.psi() for stage in self.stage[1:-1]]
+        lam = [stage.lam() for stage in self.stage[1:-1]]
+        a = aligned_zeros(1,1 << self.num_qubits,self.dtype)[0]
+
+        H = np.zeros((L,L))
+        for j0 in range(0,L,B):
+            j1 = min(j0+B,L)
+            W = self.batch_workspace(3,j1-j0)
+            for k, X in self.sensitivity_blocks(j0,j1,psi,a,W[0],W[1]):
+                self.A[k].apply(lam[k],a)
+                H[k,j0:j0+X.shape[1]] = -2 * np.matmul(a.conj(),X,dtype=complex).imag
+
+            # Adjoint sweep of dlam_{k-1} = U_k^H dlam_k, valid for the columns j <= k
+            self.A[-1].apply_block(X,W[2])
+            X, Y = W[2], X
+            for k in reversed(range(j0,L)):
+                m = min(k+1,j1)-j0
+                self.A[k].apply(psi[k],a)
+                H[k,j0:j0+m] -= 2 * np.conj(np.matmul(a.conj(),X[:,:m],dtype=complex)).imag
+                if k > j0:
+                    n = min(k,j1)-j0
+                    self.stage[k+1].U.apply_adjoint_block(X[:,:n],Y[:,:n])
+                    X, Y = Y, X
+        return np.tril(H) + np.tril(H,-1).T
+
+    @threaded
+    def metric_tensor(self,theta,batch_size=None):
+        """
+        Evaluate the Fubini-Study metric of the circuit states at a point theta
+
+        The metric is the real part of the quantum geometric tensor 
+
+        .. math:: G_{jk} = Re\\left(\\langle\\partial_j\\psi|\\partial_k\\psi\\rangle - 
+                  \\langle\\partial_j\\psi|\\psi\\rangle\\langle\\psi|\\partial_k\\psi\\rangle\\right)
+
+        Since the propagators are unitary, the inner product of the final sensitivities to 
+        theta[j] and theta[k], j <= k, equals that of their values after stage k, where 
+        the latter is i*A_k psi_k. The sensitivities are therefore propagated as blocks of 
+        up to batch_size vectors in one forward sweep from the stored states, and 
+        :math:`\\langle\\psi|\\partial_k\\psi\\rangle` is i times the expectation of A_k 
+        after stage k. Requires a circuit that stores every state.
+
+        Parameters
+        ----------
+        theta : numpy.ndarray
+            Control vector
+        batch_size : unsigned int, optional
+            Maximum number of sensitivities to propagate together. Uses 
+            default_batch_size(2) if not provided.
+        """
+        if self.plan is not None:
+            raise ValueError("The metric tensor requires a circuit that stores every state")
+        from qaoa.util import aligned_zeros
+        self.set_control(theta)
+        L = self.num_stages
+        B = min(L,self.default_batch_size(2) if batch_size is None else batch_size)
+        psi = [stage.psi() for stage in self.stage[1:-1]]
+        a = aligned_zeros(1,1 << self.num_qubits,self.dtype)[0]
+        e = np.array([A.expectation(v) for A,v in zip(self.A,psi)])
+
+        G = np.zeros((L,L))
+        for j0 in range(0,L,B):
+            j1 = min(j0+B,L)
+            for k, X in self.sensitivity_blocks(j0,j1,psi,a,*self.batch_workspace(2,j1-j0)):
+                if k >= j1:
+                    self.A[k].apply(psi[k],a)
+                # Re <i A_k psi_k|X> = Im <A_k psi_k|X>
+                G[k,j0:j0+X.shape[1]] = np.matmul(a.conj(),X,dtype=complex).imag
+        G = np.tril(G) + np.tril(G,-1).T
+        return G - np.outer(e,e)
+
+    @threaded
+    def natural_gradient(self,theta,regularization=0,rcond=1e-10):
+        """
+        Compute the natural gradient G^{-1} g at a point theta, where G is the metric 
+        tensor and g the gradient of the objective function
+
+        The metric is singular when some controls only change the global phase of the
+        state, e.g. for a stage generated by an operator of which the initial state is 
+        an eigenvector, so the system is solved in the least-squares sense with the 
+        singular values below rcond times the largest one treated as zero.
+
+        Parameters
+        ----------
+        theta : numpy.ndarray
+            Control vector
+        regularization : float
+            Multiple of the identity added to the metric. Default is 0
+        rcond : float
+            Relative cutoff of the singular values of the metric. Default is 1e-10
+        """
+        G = self.metric_tensor(theta)
+        G += regularization*np.eye(self.num_stages)
+        return np.linalg.lstsq(G,self.gradient(theta),rcond=rcond)[0]
 
+    @threaded
     def hess_eig(self,theta):
         """
         Compute the eigenvalues of the Hessian at the point theta
         """
         return np.linalg.eig(self.hessian(theta))[0]
+
+    @threaded
+    def hess_extreme_eigs(self,theta,k=1,tol=1e-6,maxiter=None,v0=None,stop_on_sign=True):
+        """
+        Estimate the smallest eigenvalues of the Hessian at the point theta with the 
+        Lanczos iteration, using only Hessian-vector products
+
+        The controls are set once, so the states and adjoints of the circuit are reused
+        by every product. The Lanczos vectors are fully reorthogonalized. The iteration
+        stops when the k smallest Ritz values have residuals below tol times the largest 
+        Ritz value in magnitude, when the Krylov space is exhausted, or with stop_on_sign
+        as soon as the smallest Ritz value is negative. The smallest Ritz value bounds the
+        smallest eigenvalue from above, so a negative one identifies a saddle point. A 
+        positive one proves nothing before convergence, since its residual only bounds the
+        distance to some eigenvalue, which need not be the smallest.
+
+        Parameters
+        ----------
+        theta : numpy.ndarray
+            Control vector
+        k : unsigned int
+            Number of eigenvalues to estimate
+        tol : float
+            Relative residual tolerance of the Ritz values
+        maxiter : unsigned int, optional
+            Maximum number of Hessian-vector products. Default is num_stages
+        v0 : numpy.ndarray, optional
+            Starting vector. Random if not provided
+        stop_on_sign : bool
+            Stop once the smallest Ritz value is negative. Default is True
+
+        Returns
+        -------
+        eigs : numpy.ndarray
+            Up to k smallest Ritz values in ascending order
+        residuals : numpy.ndarray
+            Residual norms of the Ritz pairs, each a bound on the distance from its Ritz 
+            value to an eigenvalue of the Hessian
+        """
+        L = self.num_stages
+        maxiter = L if maxiter is None else min(maxiter,L)
+        Q = np.zeros((maxiter,L))
+        Q[0] = np.random.randn(L) if v0 is None else v0
+        Q[0] /= np.linalg.norm(Q[0])
+        alpha, beta = np.zeros(maxiter), np.zeros(maxiter)
+        self.set_control(theta)
+        for m in range(maxiter):
+            w = self.hess_vec(theta,Q[m])
+            alpha[m] = Q[m] @ w
+            w -= Q[:m+1].T @ (Q[:m+1] @ w)
+            w -= Q[:m+1].T @ (Q[:m+1] @ w) # Twice is enough
+            beta[m] = np.linalg.norm(w)
+
+            T = np.diag(alpha[:m+1]) + np.diag(beta[:m],1) + np.diag(beta[:m],-1)
+            ritz, S = np.linalg.eigh(T)
+            residuals = beta[m]*np.abs(S[-1])
+            scale = np.abs(ritz).max()
+            n = min(k,m+1)
+            if beta[m] <= tol*scale or m+1 == maxiter:
+                break
+            if n == k and np.all(residuals[:k] <= tol*scale):
+                break
+            if stop_on_sign and ritz[0] < -tol*scale:
+                break
+            Q[m+1] = w/beta[m]
+        return ritz[:n], residuals[:n]
@@ -3,10 +3,10 @@ from qaoa.util.math import scale, additive_assign, axpy
 
 class UnitaryStage(CircuitStage):
 
-    def __init__(self,A,psi=None,lam=None,dpsi=None,dlam=None):
+    def __init__(self,A,psi=None,lam=None,dpsi=None,dlam=None,dtype=complex,storage=True):
 
         from qaoa.operators import HermitianOperator
-        from numpy import zeros
+        from qaoa.util import Workspace, aligned_zeros
 
         assert( isinstance(A,HermitianOperator) )        
         self.A = A
@@ -14,11 +14,14 @@ class UnitaryStage(CircuitStage):
         nq = self.A.num_qubits()
         N = 1 << nq
 
-        self._psi  = zeros(N,dtype=complex) if (psi  is None) else psi
-        self._lam  = zeros(N,dtype=complex) if (lam  is None) else lam
-        self._dpsi = zeros(N,dtype=complex) if (dpsi is None) else dpsi
-        self._dlam = zeros(N,dtype=complex) if (dlam is None) else dlam
-        self.work  = zeros(N,dtype=complex) 
+        # Stages of circuits that manage their own state storage only hold the 
+        # control and the propagator
+        alloc = lambda x : aligned_zeros(1,N,dtype)[0] if (x is None) and storage else x
+        self._psi  = alloc(psi)
+        self._lam  = alloc(lam)
+        self._dpsi = alloc(dpsi)
+        self._dlam = alloc(dlam)
+        self.work  = Workspace.scratch(nq,dtype,"stage") if storage else None
         self.theta = 0
         self.dtheta = 0
         super().__init__(nq)
@@ -62,10 +65,12 @@ class UnitaryStage(CircuitStage):
 
     def dpsi(self):
         if self.need_compute_dpsi:
+            # The previous sensitivity is computed first since the work vector is shared
+            prev_dpsi = None if self.prev.is_initial() else self.prev.dpsi()
             self.A.apply(self.prev.psi(),self.work)
             scale(self.num_qubits(),1j*self.dtheta,self.work)
-            if not self.prev.is_initial():
-                additive_assign(self.num_qubits(),self.prev.dpsi(),self.work )
+            if prev_dpsi is not None:
+                additive_assign(self.num_qubits(),prev_dpsi,self.work )
             self.U.apply(self.work,self._dpsi)
             self.need_compute_dpsi = False
             self.next.notify_compute_dpsi()
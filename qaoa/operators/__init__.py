@@ -4,6 +4,7 @@ from .unitary_operator import UnitaryOperator
 from .diagonal_operator import DiagonalOperator
 from .projection_operator import ProjectionOperator
 from .ising_hamiltonian import IsingHamiltonian
+from .matrix_free_ising_hamiltonian import MatrixFreeIsingHamiltonian
 from .kronecker import Kronecker
 from .sum_sigma_x_operator import SumSigmaXOperator
 from .sum_sigma_y_operator import SumSigmaYOperator
@@ -12,4 +13,6 @@ from .diagonal_propagator import DiagonalPropagator
 from .projection_propagator import ProjectionPropagator
 from .sum_sigma_x_propagator import SumSigmaXPropagator
 from .sum_sigma_y_propagator import SumSigmaYPropagator
+from .matrix_free_ising_propagator import MatrixFreeIsingPropagator
+from .qaoa_layer_propagator import QAOALayerPropagator
 from .load_ising_hamiltonian import load_max_cut_hamiltonian
@@ -1,11 +1,18 @@
 from qaoa.operators import HermitianOperator
-from qaoa.util.math import hadamard_mult, hadamard_div, hadamard_conj_mult, hadamard_conj_div, diag_inner_product, diag_conj_inner_product
+from qaoa.util.math import hadamard_mult, hadamard_div, hadamard_conj_mult, hadamard_conj_div, diag_inner_product, diag_conj_inner_product, \
+                           hadamard_mult_block, diag_conj_inner_product_block
 import numpy as np
 
 
 class DiagonalOperator(HermitianOperator):
     """
     Implements a Hermitian operator that can be represented as a diagonal matrix
+
+    The diagonal may be stored with a floating point or a signed integer type. Integer
+    diagonals are used directly by the kernels without conversion to floating point.
+
+    The diagonal can be moved to shared memory or to a mapped file with share(), so that
+    worker processes that receive the operator read the same copy of it.
     """
 
     def __init__(self,d):
@@ -13,7 +20,7 @@ class DiagonalOperator(HermitianOperator):
         import numpy
 
         assert(isinstance(d,numpy.ndarray) and d.ndim==1)
-        assert(numpy.isreal(d.dtype))
+        assert(numpy.isrealobj(d))
 
         self.data = d
         self.length = len(d)
@@ -22,14 +29,85 @@ class DiagonalOperator(HermitianOperator):
 #        super().__init__(int(numpy.log2(len(d))),dtype=d.dtype)
         self.true_max = numpy.max(self.data)
         self.true_min = numpy.min(self.data)
+        self._levels = False
+        self.shared = None
  
     def __str__(self):
         return "DiagonalOperator"
 
     def __deepcopy__(self,memo):
         import numpy 
+        if self.shared is not None:
+            # The shared diagonal is never written, so copies may read it too
+            from copy import copy
+            return copy(self)
         return DiagonalOperator(numpy.copy(self.data))
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.shared is not None:
+            # Pickle the handles of the shared arrays instead of their contents
+            state["data"] = None
+            if self._levels is not None:
+                state["_levels"] = (None,) + self._levels[1:]
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        if self.shared is not None:
+            self.attach()
+
+    def share(self,filename=None):
+        """
+        Move the diagonal, and the index of its spectrum levels if it has one, to a shared
+        memory block, or to the file filename, so that processes that receive this operator, 
+        or a circuit built with it, attach to them instead of receiving copies. See 
+        qaoa.util.SharedArray. The index is written to filename with ".levels" inserted 
+        before the extension. The operator must be released once the workers are done.
+
+        Returns
+        -------
+        self : DiagonalOperator
+        """
+        import os
+        from qaoa.util import SharedArray
+        if self.shared is not None:
+            return self
+        levels = self.spectrum_levels()
+        index = None if levels is None or levels[0] is self.data else levels[0]
+        files = (None,None) if filename is None else \
+                (filename,"{0}.levels{1}".format(*os.path.splitext(filename)))
+        self.shared = tuple(None if a is None else SharedArray.copy(a,f) for a, f in zip((self.data,index),files))
+        self.attach()
+        return self
+
+    def attach(self):
+        """
+        Internally-used method that points the diagonal and the index of its spectrum levels
+        to the shared arrays
+        """
+        data, index = self.shared
+        self.data = data.array
+        if self._levels is not None:
+            self._levels = (self.data if index is None else index.array,) + self._levels[1:]
+
+    def release(self):
+        """
+        Copy the shared arrays of this operator back to private memory and free them if this 
+        process shared them. Worker processes must not use the operator after.
+        """
+        import numpy
+        if self.shared is None:
+            return
+        self.data = numpy.copy(self.data)
+        if self._levels is not None:
+            index = self.data if self.shared[1] is None else numpy.copy(self._levels[0])
+            self._levels = (index,) + self._levels[1:]
+        for S in self.shared:
+            if S is not None:
+                S.unlink()
+        self.shared = None
+
     def true_maximum(self):
         return self.true_max
 
@@ -50,6 +128,42 @@ class DiagonalOperator(HermitianOperator):
         """
         return [k for k,val in enumerate(self.data) if val==self.true_min]
 
+    def spectrum_levels(self,max_levels=1<<16):
+        """
+        Describe the diagonal by a table of its distinct values and the index of the value
+        taken by each basis state, if it has no more than max_levels distinct values. 
+
+        Integer-valued diagonals, such as those of unweighted Max Cut Hamiltonians, are 
+        detected from their range without sorting. A diagonal stored with an integer type
+        serves as its own index. The result is computed on first use.
+
+        Returns
+        -------
+        levels : tuple or None
+            Triple (index,values,offset) where index is an integer array of length 2**nq 
+            and values is an array such that values[index-offset] equals the diagonal. 
+            Returns None if the diagonal has too many distinct values.
+        """
+        if self._levels is not False:
+            return self._levels
+        import numpy
+        self._levels = None
+        d = self.data
+        lo, hi = self.true_min, self.true_max
+        if numpy.issubdtype(d.dtype,numpy.integer):
+            if int(hi)-int(lo) < max_levels:
+                self._levels = (d,numpy.arange(lo,int(hi)+1,dtype=float),int(lo))
+        elif numpy.all(numpy.floor(d)==d) and hi-lo < max_levels:
+            values = numpy.arange(lo,hi+1,dtype=float)
+            index = (d-lo).astype(numpy.uint8 if hi-lo < 256 else numpy.uint16)
+            self._levels = (index,values,0)
+        elif len(numpy.unique(d[:max_levels+1])) <= max_levels:
+            values, index = numpy.unique(d,return_inverse=True)
+            if len(values) <= max_levels:
+                index = index.astype(numpy.uint8 if len(values) <= 256 else numpy.uint16)
+                self._levels = (index,values,0)
+        return self._levels
+
     def propagator(self,theta=0):
         from qaoa.operators import DiagonalPropagator
         return DiagonalPropagator(self,theta)
@@ -60,6 +174,10 @@ class DiagonalOperator(HermitianOperator):
     def conj_inner_product(self,u,v):
         return diag_conj_inner_product(self.num_qubits(),u,self.data,v)
 
+    def conj_inner_product_block(self,U,V):
+        X, Y = self.block_views(U,V)
+        return diag_conj_inner_product_block(self.num_qubits(),X,self.data,Y)
+
     def as_matrix(self):
         import numpy 
         return numpy.diag(self.data)
@@ -74,4 +192,8 @@ class DiagonalOperator(HermitianOperator):
         hadamard_conj_mult(self.num_qubits(),self.data,v,Dv)   
 
     def apply_adjoint_inverse(self,v,Dv):
-        hadamard_conj_div(self.num_qubits(),self.data,v,Dv)   
+        hadamard_conj_div(self.num_qubits(),self.data,v,Dv)
+
+    def apply_block(self,V,DV):
+        X, Y = self.block_views(V,DV)
+        hadamard_mult_block(self.num_qubits(),self.data,X,Y)
@@ -1,25 +1,73 @@
 from qaoa.operators import DiagonalOperator
 from qaoa.operators import Propagator
-from qaoa.util.math import cexp_hadamard_mult, cexp_hadamard_div
+from qaoa.util.math import cexp_hadamard_mult, cexp_hadamard_div, cexp_hadamard_mult_block, \
+                           table_hadamard_mult, table_hadamard_mult_block
 import numpy as np
 
 class DiagonalPropagator(Propagator):
 
+    """
+    Propagator generated by a DiagonalOperator
+
+    If the diagonal takes few distinct values, as for Ising Hamiltonians with integer
+    coefficients, the complex exponentials of the distinct values are tabulated whenever 
+    the control is set, so that applying the propagator requires only a table lookup and 
+    a multiplication for each element rather than an evaluation of exp.
+    """
+
     def __init__(self,D,theta=0):
 
        assert(isinstance(D,DiagonalOperator))
 
        super().__init__(D,theta)
+       self.set_control(theta)
+
+    def __str__(self):
+        return "DiagonalPropagator"
+
+    @property
+    def levels(self):
+        """
+        Spectrum levels of the diagonal, see DiagonalOperator.spectrum_levels. They are
+        kept by the operator only, which may share them between processes.
+        """
+        return self.A.spectrum_levels()
+
+    def set_control(self,theta):
+        self.theta = theta
+        if self.levels is not None:
+            self.table = np.exp(1j*self.theta*self.levels[1])
+            self.table_adjoint = np.conj(self.table)
 
     def apply(self,v,u):
-        cexp_hadamard_mult(self.num_qubits(),self.get_operator().data,self.theta,v,u)
+        if self.levels is not None:
+            table_hadamard_mult(self.num_qubits(),self.levels[0],self.levels[2],self.table,v,u)
+        else:
+            cexp_hadamard_mult(self.num_qubits(),self.get_operator().data,self.theta,v,u)
 
     def apply_adjoint(self,v,u):
-        cexp_hadamard_mult(self.num_qubits(),self.get_operator().data,-self.theta,v,u)
+        if self.levels is not None:
+            table_hadamard_mult(self.num_qubits(),self.levels[0],self.levels[2],self.table_adjoint,v,u)
+        else:
+            cexp_hadamard_div(self.num_qubits(),self.get_operator().data,self.theta,v,u)
 
-    def apply_adjoint(self,v,u):
-        cexp_hadamard_div(self.num_qubits(),self.get_operator().data,self.theta,v,u)
+    def apply_block(self,V,U,theta=None):
+        X, Y = self.block_views(V,U)
+        theta = self.block_control(theta,X.shape[1])
+        if self.levels is not None:
+            table = np.exp(1j*np.outer(self.levels[1],theta))
+            table_hadamard_mult_block(self.num_qubits(),self.levels[0],self.levels[2],table,X,Y)
+        else:
+            cexp_hadamard_mult_block(self.num_qubits(),self.get_operator().data,theta,X,Y)
+
+    def apply_adjoint_block(self,V,U,theta=None):
+        X, Y = self.block_views(V,U)
+        theta = self.block_control(theta,X.shape[1])
+        if self.levels is not None:
+            table = np.exp(-1j*np.outer(self.levels[1],theta))
+            table_hadamard_mult_block(self.num_qubits(),self.levels[0],self.levels[2],table,X,Y)
+        else:
+            cexp_hadamard_mult_block(self.num_qubits(),self.get_operator().data,-theta,X,Y)
 
     def as_matrix(self):
         return np.diag(np.exp(1j*self.theta*self.get_operator().data))
-    
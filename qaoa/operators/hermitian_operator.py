@@ -128,6 +128,45 @@ class HermitianOperator(LinearOperator,metaclass=DocumentationInheritance):
         """
         return np.real(self.conj_inner_product(v,v))
 
+    def conj_inner_product_block(self,U,V):
+        """
+        Compute the complex-conjugated inner products of corresponding vectors in two blocks
+        using the Hermitian operator
+
+        Derived classes with a dedicated block kernel override this method. The default 
+        implementation evaluates conj_inner_product() one pair of vectors at a time.
+
+        Parameters
+        ----------
+        U : numpy.ndarray
+            Block of vectors of shape (len(A),B) or (B,len(A))
+        V : numpy.ndarray
+            Block of vectors with the same shape as U
+
+        Returns
+        -------
+        values : numpy.ndarray
+            One-dimensional array of B complex values
+        """
+        X, Y = self.block_views(U,V)
+        return np.array([self.conj_inner_product(X[:,b],Y[:,b]) for b in range(X.shape[1])])
+
+    def expectation_block(self,V):
+        """
+        Compute the expectation of this Hermitian operator with every vector in a block
+
+        Parameters
+        ----------
+        V : numpy.ndarray
+            Block of vectors of shape (len(A),B) or (B,len(A))
+
+        Returns
+        -------
+        values : numpy.ndarray
+            One-dimensional array of B real values
+        """
+        return np.real(self.conj_inner_product_block(V,V))
+
     @abc.abstractmethod
     def propagator(self,theta=0):
         """
@@ -158,4 +197,7 @@ class HermitianOperator(LinearOperator,metaclass=DocumentationInheritance):
     def apply_adjoint_inverse(self,v,Hv):
         self.apply_inverse(v,Hv)
 
+    def apply_adjoint_block(self,V,HV):
+        self.apply_block(V,HV)
+
 
@@ -5,9 +5,22 @@ class IsingHamiltonian(DiagonalOperator):
 
     """
     A specialized DiagonalOperator for representing an Ising Model Hamiltonian
+
+    Attributes
+    ----------
+    h : numpy.ndarray
+        External field coefficients, one per qubit
+    ei, ej, w : numpy.ndarray
+        Qubit indices and coefficients of the nonzero interaction terms
+    tile_bits : unsigned int
+        Base-2 logarithm of the number of consecutive basis states whose energies
+        are computed together when the diagonal is built, at most nq. The class 
+        attribute is the default of new objects.
     """
 
-    def __init__(self,nq=None,h=None,J=None,graph=None):
+    tile_bits = 12
+
+    def __init__(self,nq=None,h=None,J=None,graph=None,compact=False,dtype=float,tile_bits=None):
         """
         Create an IsingHamiltonian object from Ising Model expansion coefficients and/or a graph
 
@@ -26,6 +39,17 @@ class IsingHamiltonian(DiagonalOperator):
             Container of interaction term coefficients
         graph : networkx.Graph or compatible type, optional
             Object must have a member variable called edges that may be weighted
+        compact : bool, optional
+            If True, store the diagonal with the smallest of int8, int16 or int32 that can
+            hold every energy instead of float64. All coefficients must be integers. The 
+            DiagonalOperator kernels and the DiagonalPropagator consume the integer diagonal 
+            directly. Default is False.
+        dtype : type, optional
+            Floating point type of the diagonal if compact is False. Use numpy.float32 with
+            single precision circuits. Default is float.
+        tile_bits : unsigned int, optional
+            Base-2 logarithm of the number of basis states per tile when the diagonal is
+            built. Default is IsingHamiltonian.tile_bits
 
         Examples
         --------
@@ -92,106 +116,115 @@ class IsingHamiltonian(DiagonalOperator):
         This example works identically if weights would be assigned to the graph prior to 
         constructing C
 
+        6. Compact storage of an unweighted graph Hamiltonian uses one byte per basis state
+           
+        >>> C = IsingHamiltonian(graph=G,compact=True)
+        >>> print(C.data.dtype)
+        int8
+
         """
 
-        from qaoa.util import types
-        self.nq = None
-        self.data = None
         assert( (J is None) or (graph is None) )
+        nq, self.h, self.ei, self.ej, self.w = self.parse_terms(nq,h,J,graph)
+        self.storage_dtype = self.compact_dtype(self.h,self.w) if compact else dtype
+        self.tile_bits = min(type(self).tile_bits if tile_bits is None else tile_bits,nq)
+        super().__init__(self.build(nq))
+
+    @staticmethod
+    def parse_terms(nq=None,h=None,J=None,graph=None):
+        """
+        Convert any of the supported descriptions of the coefficients to a dense vector of 
+        external field coefficients and arrays of interaction terms
+
+        Returns
+        -------
+        nq : unsigned int
+            Number of qubits
+        h : numpy.ndarray
+            External field coefficient of each qubit
+        ei, ej, w : numpy.ndarray
+            Qubit indices and coefficients of the nonzero interaction terms
+        """
+        from qaoa.util.types import is_nparray, is_squarematrix, is_container
+        from qaoa.util.graph import graph_edges
 
-        if nq is not None: 
-            self.nq = nq
-            self.data =  np.zeros(1<<nq)
+        if graph is not None:
+            if nq is not None:
+                assert(nq==len(graph))
+            nq = len(graph)
+            J = graph_edges(graph)
+
+        if nq is None:
+            if is_nparray(h):
+                nq = len(h)
+            elif is_squarematrix(J):
+                nq = J.shape[0]
+            else:
+                raise ValueError("The number of qubits must be provided when h and J are sparse")
 
+        hv = np.zeros(nq)
         if h is not None:
-            self.h_terms(h)
+            if is_nparray(h):
+                assert(len(h)==nq)
+                hv[:] = h
+            elif is_container(h):
+                for i,v in h:
+                    hv[i] += v
+            else:
+                raise TypeError("Argument of type {0} is unsupported".format(type(h)))
 
+        terms = list()
         if J is not None:
-            self.J_terms(J)
-
-        if graph is not None:
-            self.graph_terms(graph)
+            if is_squarematrix(J):
+                assert(J.shape[0]==nq)
+                terms = [(i,j,J[i,j]) for i,j in zip(*np.nonzero(np.triu(J,1)))]
+            elif is_container(J):
+                terms = [e if len(e)==3 else (e[0],e[1],1) for e in J]
+            else:
+                raise TypeError("Argument of type {0} is unsupported".format(type(J)))
 
-        super().__init__(self.data)
+        ei = np.array([e[0] for e in terms],dtype=np.int64)
+        ej = np.array([e[1] for e in terms],dtype=np.int64)
+        w  = np.array([e[2] for e in terms],dtype=float)
+        return nq, hv, ei, ej, w
 
-    def graph_terms(self,G):
+    @staticmethod
+    def compact_dtype(h,w):
         """
-        Internally-used method used based on a graph edge set description 
+        Smallest signed integer type that can represent every energy of the Ising 
+        Hamiltonian with external field coefficients h and interaction coefficients w
+
+        Raises
+        ------
+        ValueError
+            If any coefficient is not an integer or the energies exceed the range of int32
         """
-        from qaoa.util.graph import is_graph, graph_edges
-        from numba.typed import List
-        from qaoa.util.math import ising_sparse_J, ising_sparse_weighted_J, ising_dense_J
-        from networkx import is_weighted
-
-        if self.num_qubits() is not None:
-            assert(self.num_qubits()==len(G))
-        else:
-            DiagonalOperator.__init__(self,np.zeros(1<<len(G)))
-
-        J = graph_edges(G)
-        JL = List()
-        [JL.append(e) for e in J]
-        if is_weighted(G):
-            ising_sparse_weighted_J(self.num_qubits(),JL, self.data) 
-        else:
-            ising_sparse_J(self.num_qubits(),JL,self.data)
-
-    def J_terms(self,J):
+        coefs = np.concatenate((h,w))
+        if not np.all(np.floor(coefs)==coefs):
+            raise ValueError("Compact storage requires integer-valued coefficients")
+        bound = np.sum(np.abs(coefs))
+        for dtype in (np.int8,np.int16,np.int32):
+            if bound <= np.iinfo(dtype).max:
+                return dtype
+        raise ValueError("Energies of magnitude up to {0} exceed the range of compact storage".format(bound))
+
+    def is_compact(self):
         """
-        Internally-used method used to populate the interaction matrix J
+        Indicates whether the diagonal is stored with an integer type
         """
+        return np.issubdtype(self.storage_dtype,np.integer)
 
-        from qaoa.util.types import is_container, is_squarematrix
-
-        if is_squarematrix(J):
-            if self.num_qubits() is not None:
-                assert(self.num_qubits()==J.shape[0])
-            else:
-                DiagonalOperator.__init__(self,np.zeros(1<<self.nq))
-
-            from qaoa.util.math import ising_dense_J
-            ising_dense_J(self.num_qubits(),J,self.data)
-
-        elif is_container(J):
-            assert(self.data is not None)
-            from numba.typed import List
-            JL = List()
-            [JL.append(e) for e in J]
-            if len(J[0]) == 2: # Unweighted
-                from qaoa.util.math import ising_sparse_J
-                ising_sparse_J(self.num_qubits(),JL,self.data)                      
-            else: # Weighted Edges
-                from qaoa.util.math import ising_sparse_weighted_J
-                ising_sparse_weighted_J(self.num_qubits(),JL,self.data)                      
-        else:
-            raise TypeError("Argument of type {0} is unsupported".format(type(J))) 
-
-    def h_terms(self,h):
-        """
-        Internally-used method used to populate the external field coefficient vector
+    def build(self,nq):
         """
+        Internally-used method that computes the diagonal with the storage type
 
-        from qaoa.util.math import ising_sparse_h, ising_dense_h
-        from qaoa.util.types import is_container, is_nparray
-
-        if is_nparray(h):
-            if self.num_qubits() is not None:
-                assert(self.num_qubits()==len(h))
-            else:
-                self.num_qubits() == len(h)
-            if self.data is None:
-                DiagonalOperator.__init__(self,np.zeros(1<<self.nq))
-            ising_dense_h(self.num_qubits(),h,self.data)
-
-        elif is_container(h):
-            assert(self.data is not None)
-            from numba.typed import List
-            hL = List()
-            [hL.append(e) for e in h]
-            ising_sparse_h(self.num_qubits(),hL,self.data)
-   
-        else:
-            raise TypeError("Argument of type {0} is unsupported".format(type(h))) 
- 
-
-  
+        The basis states are processed in parallel in tiles of consecutive indices. Within a 
+        tile, the couplings to the qubits in the low bits of the index act as an external field, 
+        so the energies of a tile are obtained by recursive doubling, one qubit at a time. The
+        cost is O(1) per basis state plus O(nq+|J|) per tile.
+        """
+        from qaoa.util.math import ising_low_energies, ising_energies
+        d = np.zeros(1<<nq,dtype=self.storage_dtype)
+        elow = ising_low_energies(nq,self.tile_bits,self.h,self.ei,self.ej,self.w)
+        ising_energies(nq,self.tile_bits,self.h,self.ei,self.ej,self.w,elow,d)
+        return d
@@ -1,5 +1,5 @@
 from qaoa.operators import LinearOperator
-from qaoa.util.math import apply_kron2
+from qaoa.util.math import apply_kron2, apply_kron2_block
 import numpy as np
 
 class Kronecker(LinearOperator):
@@ -12,26 +12,64 @@ class Kronecker(LinearOperator):
         super().__init__(nq)
         self.K = K
         self.dtype = dtype
-        self.work = np.zeros(1<<nq,dtype=self.dtype)
 
     def __deepcopy__(self,memo):
         return Kronecker(deepcopy(self.K,memo),self.nq,self.dtype)
 
-    def compute(self,f,v,u):
+    def vector_work(self,u):
+        """
+        Return a workspace vector with the data type of u from the scratch arena shared 
+        by every Kronecker product on the same number of qubits
+        """
+        from qaoa.util import Workspace
+        return Workspace.scratch(self.nq,u.dtype,"kronecker")
+
+    def compute(self,f,v,u,work=None):
+        work = self.vector_work(u) if work is None else work
         if self.nq % 2: # Odd number of stages
             f(0,v,u)
             for k in range(1,self.nq):
                 if k % 2: # Odd stage
-                    f(k,u,self.work)
+                    f(k,u,work)
                 else:
-                    f(k,self.work,u) # Even stage
+                    f(k,work,u) # Even stage
         else: # Even number of stages       
-            f(0,v,self.work)
+            f(0,v,work)
             for k in range(1,self.nq):
                 if k % 2: # Odd stage
-                    f(k,self.work,u)
+                    f(k,work,u)
                 else:
-                    f(k,u,self.work)
+                    f(k,u,work)
+
+    def block_work(self,X):
+        """
+        Return a workspace block matching the shape of X, reallocating it only if the
+        batch size or data type has changed
+        """
+        dtype = np.result_type(self.dtype,X.dtype) if not np.iscomplexobj(X) else X.dtype
+        if not hasattr(self,'_block_work') or self._block_work.shape != X.shape or \
+           self._block_work.dtype != dtype:
+            self._block_work = np.zeros(X.shape,dtype=dtype)
+        return self._block_work
+
+    def compute_block(self,K,V,U):
+        """
+        Apply a different Kronecker product to each vector of a block
+
+        Parameters
+        ----------
+        K : numpy.ndarray
+            Stack of 2x2 matrices of shape (B,2,2). The vector in column b of the block 
+            is multiplied by the nq-fold Kronecker product of K[b] with itself
+        V : numpy.ndarray 
+            Block of domain vectors of shape (2**nq,B) or (B,2**nq)
+        U : numpy.ndarray 
+            Block of range vectors with the same shape as V. Modified in-place
+        """
+        X, Y = self.block_views(V,U)
+        assert(K.shape == (X.shape[1],2,2))
+        f = lambda k,x,y : apply_kron2_block(K,self.nq,k,x,y)
+        self.compute(f,X,Y,self.block_work(X))
 
     def apply(self,v,u):
         f = lambda k,x,y : apply_kron2(self.K,self.nq,k,x,y)
@@ -41,6 +79,14 @@ class Kronecker(LinearOperator):
         f = lambda k,x,y : apply_kron2(np.conj(self.K.T),self.nq,k,x,y)
         self.compute(f,v,u)
 
+    def apply_block(self,V,U):
+        B = V.size >> self.nq
+        self.compute_block(np.array([self.K]*B),V,U)
+
+    def apply_adjoint_block(self,V,U):
+        B = V.size >> self.nq
+        self.compute_block(np.array([np.conj(self.K.T)]*B),V,U)
+
     def apply_inverse(self,v,u):
         Ki = np.linalg.inv(K)
         f = lambda k,x,y : apply_kron2(Ki,self.nq,k,x,y)
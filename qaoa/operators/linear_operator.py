@@ -121,6 +121,68 @@ class LinearOperator(object,metaclass=qaoa.util.DocumentationInheritance):
         """
         raise NotImplementedError("Derived class does not override apply_adjoint_inverse() method")
 
+    def block_views(self,V,AV):
+        """
+        Return views of a pair of vector blocks with the state index along the first axis
+
+        Blocks may be stored either as (2**nq,B), with one state per column, or as (B,2**nq),
+        with one state per row. The former is the preferred layout as it lets the block
+        kernels stream the operator once while accessing the B states with unit stride.
+        If B == 2**nq the block is taken to be of shape (2**nq,B).
+
+        Parameters
+        ----------
+        V : numpy.ndarray
+            Block of domain vectors
+        AV : numpy.ndarray
+            Block of range vectors with the same shape as V
+
+        Returns
+        -------
+        X, Y : numpy.ndarray
+            Views of V and AV with shape (2**nq,B)
+        """
+        assert(V.shape == AV.shape)
+        if V.ndim == 2 and V.shape[0] == self.length:
+            return V, AV
+        elif V.ndim == 2 and V.shape[1] == self.length:
+            return V.T, AV.T
+        else:
+            raise ValueError("Block of shape {0} is incompatible with an operator of length {1}".format(V.shape,self.length))
+
+    def apply_block(self,V,AV):
+        """
+        Apply a linear operator to a block of vectors
+
+        Derived classes with a dedicated block kernel override this method. The default
+        implementation applies the operator to each vector of the block in turn.
+
+        Parameters
+        ----------
+        V : numpy.ndarray
+            Block of domain vectors of shape (2**nq,B) or (B,2**nq)
+        AV : numpy.ndarray
+            Block of range vectors with the same shape as V. Modified in-place
+        """
+        X, Y = self.block_views(V,AV)
+        for b in range(X.shape[1]):
+            self.apply(X[:,b],Y[:,b])
+
+    def apply_adjoint_block(self,V,AV):
+        """
+        Apply the adjoint of a linear operator to a block of vectors
+
+        Parameters
+        ----------
+        V : numpy.ndarray
+            Block of domain vectors of shape (2**nq,B) or (B,2**nq)
+        AV : numpy.ndarray
+            Block of range vectors with the same shape as V. Modified in-place
+        """
+        X, Y = self.block_views(V,AV)
+        for b in range(X.shape[1]):
+            self.apply_adjoint(X[:,b],Y[:,b])
+
     @abc.abstractmethod
     def as_matrix(self):
         """
@@ -0,0 +1,153 @@
+from qaoa.operators import HermitianOperator
+from qaoa.util.math import ising_low_energies, ising_mult, ising_inner_product, ising_conj_inner_product, \
+                           ising_energies, ising_extrema
+import numpy as np
+
+class MatrixFreeIsingHamiltonian(HermitianOperator):
+
+    """
+    An Ising Model Hamiltonian that never stores its 2**nq diagonal
+
+    Only the external field coefficients and the list of interaction terms are stored. The
+    kernels compute the energy of each basis state when it is needed, one tile of 2**t
+    consecutive basis states at a time. Within a tile the couplings to the t low qubits act
+    as an external field, so that the energies of the tile are built by recursive doubling
+    at a cost of O(1) per state plus O(nq+|J|) per tile.
+
+    Attributes
+    ----------
+    h : numpy.ndarray
+        External field coefficients, one per qubit
+    ei, ej : numpy.ndarray
+        Qubit indices of the interaction terms
+    w : numpy.ndarray
+        Coefficients of the interaction terms
+    tile_bits : unsigned int
+        Base-2 logarithm of the number of basis states per tile, at most nq. The class 
+        attribute is the default of new objects.
+    """
+
+    tile_bits = 12
+
+    def __init__(self,nq=None,h=None,J=None,graph=None,tile_bits=None):
+        """
+        Create a MatrixFreeIsingHamiltonian object from Ising Model expansion coefficients
+        and/or a graph
+
+        The arguments are the same as those of IsingHamiltonian and describe the operator
+
+        .. math:: H = \\sum\\limits_i h_i Z_i + \\sum\\limits_{i<j} J_{ij} Z_i Z_j
+
+        Parameters
+        ----------
+        nq : unsigned int, optional
+            Number of qubits
+        h : numpy.ndarray (1D) or list of (index,value) pairs, optional
+            Container of external field coefficients
+        J : numpy.ndarray (2D) or list of (row,column) or (row,column,value) tuples, optional
+            Container of interaction term coefficients
+        graph : networkx.Graph or compatible type, optional
+            Object must have a member variable called edges that may be weighted
+        tile_bits : unsigned int, optional
+            Base-2 logarithm of the number of basis states per tile. The table of the
+            energies of the low qubits is built for this tile, so it is fixed for the 
+            lifetime of the object. Default is MatrixFreeIsingHamiltonian.tile_bits
+        """
+        from qaoa.operators import IsingHamiltonian
+        assert( (J is None) or (graph is None) )
+        nq, self.h, self.ei, self.ej, self.w = IsingHamiltonian.parse_terms(nq,h,J,graph)
+        self.extrema = None
+        super().__init__(nq)
+        self.tile_bits = min(type(self).tile_bits if tile_bits is None else tile_bits,nq)
+        self.elow = ising_low_energies(nq,self.tile(),self.h,self.ei,self.ej,self.w)
+
+    def __str__(self):
+        return "MatrixFreeIsingHamiltonian"
+
+    def __deepcopy__(self,memo):
+        J = list(zip(self.ei,self.ej,self.w))
+        return MatrixFreeIsingHamiltonian(self.num_qubits(),np.copy(self.h),J,tile_bits=self.tile_bits)
+
+    def tile(self):
+        """
+        Number of qubits stored in the low bits of each tile
+        """
+        return self.tile_bits
+
+    def terms(self):
+        """
+        Arguments describing the Hamiltonian that are passed to every kernel
+        """
+        return self.num_qubits(), self.tile(), self.h, self.ei, self.ej, self.w, self.elow
+
+    def is_integer(self):
+        """
+        Indicates whether every coefficient, and therefore every energy, is an integer
+        """
+        return np.all(np.floor(self.h)==self.h) and np.all(np.floor(self.w)==self.w)
+
+    def energy_bound(self):
+        """
+        Upper bound on the magnitude of the energy of any basis state
+        """
+        return np.sum(np.abs(self.h)) + np.sum(np.abs(self.w))
+
+    def diagonal(self):
+        """
+        Compute the diagonal of the Hamiltonian.
+
+        Important
+        ---------
+        This allocates the 2**nq vector that this class otherwise avoids storing
+
+        Returns
+        -------
+        d : numpy.ndarray
+            The energy of every basis state
+        """
+        d = np.zeros(self.length)
+        ising_energies(*self.terms(),d)
+        return d
+
+    def true_minimum(self):
+        if self.extrema is None:
+            self.extrema = ising_extrema(*self.terms())
+        return self.extrema[0]
+
+    def true_maximum(self):
+        if self.extrema is None:
+            self.extrema = ising_extrema(*self.terms())
+        return self.extrema[1]
+
+    def min_state(self):
+        """
+        Returns a list of indices of canonical vectors that minimize the
+        expectation value. Materializes the diagonal.
+        """
+        return list(np.flatnonzero(self.diagonal()==self.true_minimum()))
+
+    def max_state(self):
+        """
+        Returns a list of indices of canonical vectors that maximize the
+        expectation value. Materializes the diagonal.
+        """
+        return list(np.flatnonzero(self.diagonal()==self.true_maximum()))
+
+    def propagator(self,theta=0):
+        from qaoa.operators import MatrixFreeIsingPropagator
+        return MatrixFreeIsingPropagator(self,theta)
+
+    def inner_product(self,u,v):
+        return ising_inner_product(*self.terms(),u,v)
+
+    def conj_inner_product(self,u,v):
+        return ising_conj_inner_product(*self.terms(),u,v)
+
+    def as_matrix(self):
+        return np.diag(self.diagonal())
+
+    def apply(self,v,Hv):
+        ising_mult(*self.terms(),v,Hv)
+
+    def apply_inverse(self,v,Hv):
+        raise NotImplementedError("MatrixFreeIsingHamiltonian does not implement apply_inverse()")
@@ -0,0 +1,45 @@
+from qaoa.operators import Propagator
+from qaoa.operators import MatrixFreeIsingHamiltonian
+from qaoa.util.math import ising_cexp_mult, ising_table_mult
+import numpy as np
+
+class MatrixFreeIsingPropagator(Propagator):
+
+    """
+    Propagator generated by a MatrixFreeIsingHamiltonian
+
+    The energies are computed inside the kernel. If every coefficient is an integer, the
+    phases of the possible energies are tabulated whenever the control is set so that
+    no complex exponentials are evaluated in the kernel.
+    """
+
+    def __init__(self,C,theta=0):
+        assert(isinstance(C,MatrixFreeIsingHamiltonian))
+        super().__init__(C,theta)
+        bound = int(C.energy_bound())
+        self.offset = bound if C.is_integer() and bound < (1<<16) else None
+        self.set_control(theta)
+
+    def __str__(self):
+        return "MatrixFreeIsingPropagator"
+
+    def set_control(self,theta):
+        self.theta = theta
+        if self.offset is not None:
+            self.table = np.exp(1j*self.theta*np.arange(-self.offset,self.offset+1))
+            self.table_adjoint = np.conj(self.table)
+
+    def apply(self,v,u):
+        if self.offset is not None:
+            ising_table_mult(*self.get_operator().terms(),self.offset,self.table,v,u)
+        else:
+            ising_cexp_mult(*self.get_operator().terms(),self.theta,v,u)
+
+    def apply_adjoint(self,v,u):
+        if self.offset is not None:
+            ising_table_mult(*self.get_operator().terms(),self.offset,self.table_adjoint,v,u)
+        else:
+            ising_cexp_mult(*self.get_operator().terms(),-self.theta,v,u)
+
+    def as_matrix(self):
+        return np.diag(np.exp(1j*self.theta*self.get_operator().diagonal()))
@@ -37,6 +37,72 @@ class Propagator(UnitaryOperator):
         """
         self.theta = theta
 
+    def block_control(self,theta,B):
+        """
+        Return the control angles to use for each vector of a block
+
+        Parameters
+        ----------
+        theta : array-like or None
+          Control angles, one per vector in the block. If None, the current control angle 
+          is used for every vector
+        B : unsigned int
+          Number of vectors in the block
+
+        Returns
+        -------
+        theta : numpy.ndarray
+          One-dimensional array of B control angles 
+        """
+        import numpy as np
+        if theta is None:
+            return np.full(B,self.theta,dtype=float)
+        theta = np.asarray(theta,dtype=float)
+        assert(theta.shape == (B,))
+        return theta
+
+    def apply_block(self,V,U,theta=None):
+        """
+        Apply the propagator to a block of vectors
+
+        Parameters
+        ----------
+        V : numpy.ndarray
+          Block of domain vectors of shape (2**nq,B) or (B,2**nq)
+        U : numpy.ndarray
+          Block of range vectors with the same shape as V. Modified in-place
+        theta : array-like, optional
+          Control angles for each vector of the block. The current control angle 
+          is used for all vectors if not provided
+        """
+        X, Y = self.block_views(V,U)
+        theta_old = self.theta
+        for b,t in enumerate(self.block_control(theta,X.shape[1])):
+            self.set_control(t)
+            self.apply(X[:,b],Y[:,b])
+        self.set_control(theta_old)
+
+    def apply_adjoint_block(self,V,U,theta=None):
+        """
+        Apply the adjoint of the propagator to a block of vectors
+
+        Parameters
+        ----------
+        V : numpy.ndarray
+          Block of domain vectors of shape (2**nq,B) or (B,2**nq)
+        U : numpy.ndarray
+          Block of range vectors with the same shape as V. Modified in-place
+        theta : array-like, optional
+          Control angles for each vector of the block. The current control angle 
+          is used for all vectors if not provided
+        """
+        X, Y = self.block_views(V,U)
+        theta_old = self.theta
+        for b,t in enumerate(self.block_control(theta,X.shape[1])):
+            self.set_control(t)
+            self.apply_adjoint(X[:,b],Y[:,b])
+        self.set_control(theta_old)
+
     def get_operator(self):
         """
         Get the Hermitian operator that generates this propagator
@@ -68,7 +134,7 @@ class Propagator(UnitaryOperator):
             v = np.random.randn(self.length) + \
                 1j*np.random.randn(self.length) 
         else:
-            assert isinstance(v.dtype,complex)
+            assert np.iscomplexobj(v)
         Av = np.ndarray(self.length,dtype=complex)
         self.apply(v,Av)
         res = self.as_matrix() @ v - Av
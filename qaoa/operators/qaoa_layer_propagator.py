@@ -0,0 +1,81 @@
+from qaoa.operators import UnitaryOperator, DiagonalOperator, DiagonalPropagator, \
+                           SumSigmaXOperator, SumSigmaXPropagator
+from qaoa.util.math import apply_kron2_low, apply_kron2_high, cexp_kron2_low, table_kron2_low
+
+class QAOALayerPropagator(UnitaryOperator):
+
+    """
+    One layer of a QAOA circuit, exp(i*beta*D)*exp(i*gamma*C), where C is a DiagonalOperator
+    and D is the transverse field mixer
+
+    The phase separator is applied within the first pass of the mixer over tiles of
+    consecutive elements, so that the state between the two half-steps of the layer is
+    never written to memory. The adjoint applies the phases in the last pass of the
+    adjoint mixer. The controls are those of the two propagators the layer is made from.
+    """
+
+    def __init__(self,Uc,Ud):
+        """
+        Create a layer from the propagators of its two half-steps
+
+        Parameters
+        ----------
+        Uc : qaoa.operators.DiagonalPropagator
+            The phase separator exp(i*gamma*C)
+        Ud : qaoa.operators.SumSigmaXPropagator
+            The mixer exp(i*beta*D), which must use the stencil backend
+        """
+        assert( self.is_fusable(Uc.get_operator(),Ud.get_operator()) )
+        self.Uc = Uc
+        self.Ud = Ud
+        super().__init__(Uc.num_qubits())
+
+    def __str__(self):
+        return "QAOALayerPropagator"
+
+    @staticmethod
+    def is_fusable(C,D):
+        """
+        Indicates whether the layer generated by C and D can be applied by a QAOALayerPropagator
+        """
+        return isinstance(C,DiagonalOperator) and isinstance(D,SumSigmaXOperator) and \
+               D.backend == "stencil" and C.num_qubits() == D.num_qubits()
+
+    def apply_phase_low(self,table,theta,first,v,u):
+        """
+        Apply the mixer on the lowest qubits and the phase separator with either the given
+        tabulated phases or the control theta in one pass
+        """
+        nq = self.num_qubits()
+        t, g = self.Ud.tiling()
+        K = self.Ud.K if first else self.Ud.K_adjoint
+        if self.Uc.levels is not None:
+            idx, values, offset = self.Uc.levels
+            table_kron2_low(K,nq,t,idx,offset,table,first,v,u)
+        else:
+            cexp_kron2_low(K,nq,t,self.Uc.get_operator().data,theta,first,v,u)
+
+    def apply(self,v,u):
+        """
+        Apply the layer to v and store the result in u. Passing the same array as v
+        and u applies the layer in-place.
+        """
+        table = self.Uc.table if self.Uc.levels is not None else None
+        self.apply_phase_low(table,self.Uc.theta,True,v,u)
+        apply_kron2_high(self.Ud.K,self.num_qubits(),*self.Ud.tiling(),u,u)
+
+    def apply_adjoint(self,v,u):
+        """
+        Apply the adjoint of the layer to v and store the result in u. Passing the same
+        array as v and u applies the adjoint in-place.
+        """
+        nq = self.num_qubits()
+        t, g = self.Ud.tiling()
+        if t < nq:
+            apply_kron2_high(self.Ud.K_adjoint,nq,t,g,v,u)
+            v = u
+        table = self.Uc.table_adjoint if self.Uc.levels is not None else None
+        self.apply_phase_low(table,-self.Uc.theta,False,v,u)
+
+    def as_matrix(self):
+        return self.Ud.as_matrix() @ self.Uc.as_matrix()
@@ -1,31 +1,104 @@
 from qaoa.operators import HermitianOperator
-from qaoa.util.math import sum_sigma_x_mult, sum_sigma_x_inner_product, sum_sigma_x_conj_inner_product
+from qaoa.util.math import sum_sigma_x_mult, sum_sigma_x_inner_product, sum_sigma_x_conj_inner_product, \
+                           sum_sigma_x_mult_block, sum_sigma_x_conj_inner_product_block, \
+                           fwht, hamming_weights, walsh_spectrum_mult, inner_product, conj_inner_product
 
 class SumSigmaXOperator(HermitianOperator):
 
-    def __init__(self,nq):
+    """
+    The transverse field mixer, given by the sum of Pauli X operators on each qubit
+
+    Attributes
+    ----------
+    backend : string
+        Either "stencil" or "walsh". The stencil backend applies the operator directly by
+        summing the nq bit-flipped elements of the input. The walsh backend uses the fact
+        that the operator is diagonal in the Hadamard basis and applies it as a fast
+        Walsh-Hadamard transform, a multiplication by the Hamming-weight spectrum and a
+        second transform. Propagators generated by this operator use the same backend.
+        The backend applies to single vectors only: the block methods of the operator and
+        of its propagators, used by the batch evaluations, the Hessian and the metric 
+        tensor of QuantumCircuit, always use the stencil kernels, which have block 
+        variants. Both backends give the same results up to round-off.
+    tile_bits : unsigned int or None
+        Tile size of the propagators generated by this operator, see SumSigmaXPropagator.
+        The default of SumSigmaXPropagator is used if None.
+    """
+
+    backends = ("stencil","walsh")
+
+    def __init__(self,nq,backend="stencil",tile_bits=None):
         """
         Create a SumSigmaXOperator for nq qubits
-        
+
         Parameters
         ----------
         nq : unsigned int
             Number of qubits
+        backend : string, optional
+            Either "stencil" (default) or "walsh"
+        tile_bits : unsigned int, optional
+            Tile size of the generated propagators
         """
+        assert(backend in self.backends)
+        self.backend = backend
+        self.tile_bits = tile_bits
+        self._weights = None
+        self._work = None
         super().__init__(nq)
 
     def __str__(self):
         return "SumSigmaXOperator"
 
     def __deepcopy__(self,memo):
-        return SumSigmaXOperator(self.nq) 
+        return SumSigmaXOperator(self.nq,self.backend,self.tile_bits)
+
+    def hamming_weights(self):
+        """
+        Number of ones in the binary representation of each basis state index. The
+        eigenvalue of the operator associated with the jth Hadamard basis vector is
+        nq-2*w[j]. Computed on first use.
+
+        Returns
+        -------
+        w : numpy.ndarray
+            Array of unsigned 8-bit integers of length 2**nq
+        """
+        if self._weights is None:
+            self._weights = hamming_weights(self.num_qubits())
+        return self._weights
+
+    def walsh_work(self,v):
+        """
+        Workspace vector for the walsh backend inner products
+        """
+        import numpy as np
+        dtype = np.result_type(np.complex64,v.dtype)
+        if self._work is None or self._work.dtype != dtype:
+            self._work = np.zeros(self.length,dtype=dtype)
+        return self._work
 
     def inner_product(self,u,v):
+        if self.backend == "walsh":
+            Dv = self.walsh_work(v)
+            self.apply(v,Dv)
+            return inner_product(self.num_qubits(),u,Dv)
         return sum_sigma_x_inner_product(self.num_qubits(),u,v)
 
     def conj_inner_product(self,u,v):
+        if self.backend == "walsh":
+            Dv = self.walsh_work(v)
+            self.apply(v,Dv)
+            return conj_inner_product(self.num_qubits(),u,Dv)
         return sum_sigma_x_conj_inner_product(self.num_qubits(),u,v)
 
+    def conj_inner_product_block(self,U,V):
+        """
+        Conjugate inner products with the stencil kernel for any backend
+        """
+        X, Y = self.block_views(U,V)
+        return sum_sigma_x_conj_inner_product_block(self.num_qubits(),X,Y)
+
     def propagator(self,theta=0):
         from qaoa.operators import SumSigmaXPropagator
         return SumSigmaXPropagator(self,theta)
@@ -37,6 +110,19 @@ class SumSigmaXOperator(HermitianOperator):
         I = lambda k : np.eye(1<<k)
         D = sum( otimes(I(k),sx,I(self.num_qubits()-k-1)) for k in range(self.num_qubits()) )
         return D
-    
+
     def apply(self,v,Dv):
-        sum_sigma_x_mult(self.num_qubits(),v,Dv)          
+        if self.backend == "walsh":
+            nq = self.num_qubits()
+            fwht(nq,v,Dv)
+            walsh_spectrum_mult(nq,self.hamming_weights(),Dv)
+            fwht(nq,Dv,Dv)
+        else:
+            sum_sigma_x_mult(self.num_qubits(),v,Dv)
+
+    def apply_block(self,V,DV):
+        """
+        Apply the operator to a block of vectors with the stencil kernel for any backend
+        """
+        X, Y = self.block_views(V,DV)
+        sum_sigma_x_mult_block(self.num_qubits(),X,Y)
@@ -1,12 +1,35 @@
 import numpy as np
-from qaoa.operators import Kronecker, SumSigmaXOperator, Propagator
+from qaoa.operators import SumSigmaXOperator, Propagator
+from qaoa.util.math import apply_kron2_fused, apply_kron2_fused_block, fwht, walsh_spectrum_table_mult
 
 class SumSigmaXPropagator(Propagator):
-    
+
+    """
+    Propagator generated by the transverse field mixer. With the default stencil backend of
+    the generating operator, applies the single-qubit rotation exp(i*theta*X) to every qubit 
+    with a cache-blocked kernel that needs no workspace. With the walsh backend, applies a
+    Walsh-Hadamard transform, the phases exp(i*theta*(nq-2*w)) of the Hamming weights w 
+    and a second transform. Blocks of vectors are always applied with the stencil kernel.
+
+    Attributes
+    ----------
+    tile_bits : unsigned int
+        Base-2 logarithm of the number of consecutive state elements that are updated
+        together in each pass. The default tile of 4096 complex elements fits in L2 cache.
+        Taken from the generating operator if it sets one, otherwise from the class 
+        attribute when the propagator is created.
+    group_bits : unsigned int
+        Maximum number of qubits beyond the first tile_bits qubits that are applied per pass
+    """
+
+    tile_bits = 12
+    group_bits = 6
+
     def __init__(self,D,theta=0):
         assert( isinstance(D,SumSigmaXOperator) )
-        self.kronecker = Kronecker(np.eye(2),D.num_qubits(),dtype=complex)
         super().__init__(D,theta)
+        self.tile_bits = type(self).tile_bits if D.tile_bits is None else D.tile_bits
+        self.set_control(theta)
 
     def __str__(self):
         return "SumSigmaXPropagator"
@@ -15,13 +38,77 @@ class SumSigmaXPropagator(Propagator):
         self.theta = theta
         c = np.cos(self.theta)
         s = 1j*np.sin(self.theta)
-        self.kronecker.K = np.array(((c,s),(s,c)),dtype=complex)
+        self.K = np.array(((c,s),(s,c)),dtype=complex)
+        self.K_adjoint = np.conj(self.K)
+        if self.get_operator().backend == "walsh":
+            nq = self.num_qubits()
+            self.phase = np.exp(1j*self.theta*(nq-2*np.arange(nq+1)))/(1<<nq)
+
+    def tiling(self,B=1):
+        """
+        Tile and group sizes used by the kernels for a block of B vectors
+        """
+        t = max(1,self.tile_bits-int(np.ceil(np.log2(B))))
+        return min(t,self.num_qubits()), self.group_bits
 
     def apply(self,v,u):
-        self.kronecker.apply(v,u)
+        """
+        Apply the propagator to v and store the result in u. Passing the same array
+        as v and u applies the propagator in-place.
+        """
+        if self.get_operator().backend == "walsh":
+            self.apply_walsh(self.phase,v,u)
+        else:
+            apply_kron2_fused(self.K,self.num_qubits(),*self.tiling(),v,u)
 
     def apply_adjoint(self,v,u):
-        self.kronecker.apply_adjoint(v,u)
+        """
+        Apply the adjoint propagator to v and store the result in u. Passing the same
+        array as v and u applies the adjoint propagator in-place.
+        """
+        if self.get_operator().backend == "walsh":
+            self.apply_walsh(np.conj(self.phase),v,u)
+        else:
+            apply_kron2_fused(self.K_adjoint,self.num_qubits(),*self.tiling(),v,u)
+
+    def apply_walsh(self,phase,v,u):
+        """
+        Apply the propagator in the Hadamard basis with the phases tabulated by Hamming weight
+        """
+        nq = self.num_qubits()
+        t, g = self.tiling()
+        fwht(nq,v,u,t,g)
+        walsh_spectrum_table_mult(nq,self.get_operator().hamming_weights(),phase,u)
+        fwht(nq,u,u,t,g)
+
+    def block_kronecker(self,theta,B):
+        """
+        Stack of the 2x2 single-qubit rotations for each vector of a block
+        """
+        theta = self.block_control(theta,B)
+        K = np.zeros((B,2,2),dtype=complex)
+        K[:,0,0] = K[:,1,1] = np.cos(theta)
+        K[:,0,1] = K[:,1,0] = 1j*np.sin(theta)
+        return K
+
+    def apply_block(self,V,U,theta=None):
+        """
+        Apply the propagator to a block of vectors with the stencil kernel for any backend,
+        see Propagator.apply_block
+        """
+        X, Y = self.block_views(V,U)
+        K = self.block_kronecker(theta,X.shape[1])
+        apply_kron2_fused_block(K,self.num_qubits(),*self.tiling(X.shape[1]),X,Y)
+
+    def apply_adjoint_block(self,V,U,theta=None):
+        """
+        Apply the adjoint propagator to a block of vectors with the stencil kernel for any
+        backend, see Propagator.apply_adjoint_block
+        """
+        X, Y = self.block_views(V,U)
+        K = self.block_kronecker(theta,X.shape[1])
+        apply_kron2_fused_block(np.conj(K),self.num_qubits(),*self.tiling(X.shape[1]),X,Y)
 
     def as_matrix(self):
-        return self.kronecker.as_matrix()
+        otimes = lambda A0,*A : np.kron(A0,otimes(*A)) if len(A) else A0
+        return otimes(*([self.K]*self.num_qubits()))
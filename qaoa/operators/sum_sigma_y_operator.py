@@ -1,5 +1,5 @@
 from qaoa.operators import HermitianOperator
-from qaoa.util.math import sum_sigma_y_mult, sum_sigma_y_inner_product, sum_sigma_y_conj_inner_product
+from qaoa.util.math import sum_sigma_y_mult, sum_sigma_y_inner_product, sum_sigma_y_conj_inner_product, sum_sigma_y_mult_block
 
 class SumSigmaYOperator(HermitianOperator):
 
@@ -27,4 +27,6 @@ class SumSigmaYOperator(HermitianOperator):
     def apply(self,v,Dv):
         sum_sigma_y_mult(self.num_qubits(),v,Dv)
 
-
+    def apply_block(self,V,DV):
+        X, Y = self.block_views(V,DV)
+        sum_sigma_y_mult_block(self.num_qubits(),X,Y)
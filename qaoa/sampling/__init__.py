@@ -1 +1,2 @@
-from .qaoa_process import QAOAProcess, sample_QAOA
+from .qaoa_process import QAOAProcess, sample_QAOA, control_chunks
+from .objective_sampler import ObjectiveSampler
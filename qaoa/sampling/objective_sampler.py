@@ -1,52 +1,248 @@
-lass ObjectiveSampler(object):
+import numpy as np
+import os
+from qaoa.util.shard_writer import ShardWriter, load_shards, read_manifest, column_name
+from .qaoa_process import resume_random_state
+
+class ObjectiveSampler(object):
+
+    """
+    Evaluate quantities of a circuit at many controls with a persistent pool of worker
+    processes
+
+    Every worker receives the circuit once, when the pool is started, and keeps it for
+    the lifetime of the pool. The controls are sent to the workers as chunks of rows of
+    one array and the results are returned as arrays that are copied into preallocated
+    columns, so the only data exchanged per sample is the control vector and its results.
+    The pool is started on first use, or on entering a with block, and must be released
+    with close(), or by leaving the with block:
+
+    >>> with ObjectiveSampler(obj,num_threads=8) as sampler:
+    ...     results = sampler(10000,"Objective Value","Gradient Norm")
+    """
+
+    # Names of the result columns and the number of values of each per sample, where None
+    # stands for the number of controls
+    quantities = { "Objective Value"     : ("fval",()),
+                   "Approximation Ratio" : ("APR",()),
+                   "Gradient"            : ("grad",None),
+                   "Gradient Norm"       : ("gnorm",()),
+                   "Hessian Eigenvalues" : ("heig",None) }
+
+    # Circuit of a worker process
+    worker_obj = None
 
     @staticmethod
-    def run(objlist,k,x,*opts):
+    def init_worker(obj,threads):
+        """
+        Internally-used initializer of the worker processes
+        """
+        from qaoa.util import kernel_threads
+        kernel_threads.set(threads)
+        ObjectiveSampler.worker_obj = obj
+
+    @staticmethod
+    def run(start,X,options):
+        """
+        Evaluate the options for every row of X with the circuit of this worker
+
+        Returns
+        -------
+        start : unsigned int
+            Index of the first sample of the chunk, passed through
+        results : dict
+            Arrays of the results of the chunk keyed by column name
+        """
         from numpy.linalg import norm
-        obj = objlist[k]
-        results = dict()
+        obj = ObjectiveSampler.worker_obj
+        results = { ObjectiveSampler.quantities[option][0] : list() for option in options }
+        for x in X:
+            if "Gradient" in options or "Gradient Norm" in options:
+                fval, grad = obj.value_and_gradient(x)
+            else:
+                fval = obj.value(x)
+            if "fval" in results:
+                results["fval"].append(fval)
+            if "APR" in results:
+                results["APR"].append(fval/obj.true_minimum())
+            if "grad" in results:
+                results["grad"].append(grad)
+            if "gnorm" in results:
+                results["gnorm"].append(norm(grad))
+            if "heig" in results:
+                # The Hessian is symmetric, so its eigenvalues are real
+                results["heig"].append(np.real(obj.hess_eig(x)))
+        return start, { name : np.array(values) for name, values in results.items() }
 
-        if "Objective Value" in opts:
-            results["fval"] = obj.value(x)
-        if "Approximation Ratio "in opts:
-            results["APR"] = obj.value(x)/obj.true_minimum() if  \
-                             "value" not in results.keys() else results["value"]/obj.true_minimum()
-
-        if "Gradient" in opts:
-            results["grad"] = obj.gradient(x)
-        if "Gradient Norm" in opts:
-            results["gnorm"] = norm(obj.gradient(x)) if "grad" not in results.keys() else \
-                               norm(results["grad"])
-
-        if "Hessian Eigenvalues" in opts:
-            results["heig"] = obj.hess_eig(x)
-        
-        return results
+    @staticmethod
+    def run_chunk(args):
+        """
+        Internally-used wrapper of run for Pool.imap_unordered
+        """
+        return ObjectiveSampler.run(*args)
+
+    def __init__(self,obj,num_threads=None,threads=None,chunk_size=None,start_method="spawn",share=True):
+        """
+        Sample the objective of a circuit with num_threads worker processes, each running
+        the kernels with the given number of threads. The kernels of the workers are
+        serial by default, see qaoa.util.kernel_threads.
 
-    def __init__(self,obj,num_threads=None):
+        Parameters
+        ----------
+        obj : qaoa.circuit.QuantumCircuit
+            Circuit to sample. Each worker holds its own copy, apart from the shared data
+        num_threads : unsigned int
+            Number of worker processes, a quarter of the CPUs by default
+        threads : unsigned int
+            Number of threads of the kernels of every worker
+        chunk_size : unsigned int
+            Number of samples sent to a worker at once. By default the samples of each
+            call are split into four chunks per worker
+        start_method : string
+            How the workers are started, see multiprocessing.get_context. Forking a
+            process that has run the parallel kernels is unsafe with some Numba
+            threading layers, so the workers are spawned by default and load the
+            compiled kernels from the cache (see qaoa.warmup)
+        share : bool
+            Move the diagonals of the circuit to shared memory while the workers run, so 
+            that the workers do not receive copies of them. See DiagonalOperator.share
+        """
         from multiprocessing import cpu_count
-        from copy import deepcopy
-        import numpy as np
-        self.obj = [obj,]
+        self.obj = obj
         self.num_threads = max(1,cpu_count()//4) if num_threads is None else num_threads
+        self.threads = threads
+        self.chunk_size = chunk_size
+        self.start_method = start_method
+        self.share = share
+        self.shared = list()
         self.num_stages = len(obj)
         self.default_sample_dist = lambda k : np.random.rand(k)*np.pi/2
-        [self.obj.append(deepcopy(obj)) for thread in range(1,self.num_threads)]
+        self.pool = None
 
-    def __call__(self,num_samples,*options,sample_dist=None):
-        from pandas import DataFrame
-        from multiprocessing import Pool
-        pool = Pool(self.num_threads)
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def start(self):
+        """
+        Start the worker processes if they are not running
+        """
+        from multiprocessing import get_context
+        if self.pool is None:
+            if self.share:
+                self.shared = self.obj.share_operators()
+            context = get_context(self.start_method)
+            self.pool = context.Pool(self.num_threads,initializer=self.init_worker,
+                                     initargs=(self.obj,self.threads))
+
+    def close(self):
+        """
+        Stop the worker processes after they finish their chunks
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        for A in self.shared:
+            A.release()
+        self.shared = list()
+
+    def sample(self,X,*options,path=None,metadata=None):
+        """
+        Evaluate the options at every row of X with the worker processes
+
+        If path is given, the results are also written to .npy shards in that directory as
+        they are computed, see qaoa.util.ShardWriter. If the directory already has results
+        of the same options, chunk size and controls, the chunks recorded in its manifest
+        are read instead of evaluated, so that a run that stopped is resumed. The controls
+        are identified by the SHA-1 digest of X, so a ValueError is raised if they differ.
+
+        Parameters
+        ----------
+        X : numpy.ndarray
+            Controls of shape (num_samples,num_stages)
+        options : strings
+            Keys of ObjectiveSampler.quantities, "Objective Value" by default
+        path : string
+            Directory of the shards
+        metadata : dict
+            Additional entries of the manifest, see qaoa.util.ShardWriter
+
+        Returns
+        -------
+        results : dict
+            Columns of the results keyed by name, of shape (num_samples,) for scalars and
+            (num_samples,num_stages) for vectors
+        """
+        X = np.ascontiguousarray(X,dtype=float)
+        assert( X.ndim == 2 and X.shape[1] == self.num_stages )
         if not len(options):
-            options = ["Objective Value",]
-        sample = self.default_sample_dist if sample_dist is None else sample_dist
-        num_threads = self.num_threads
-        num_stages = self.num_stages
-        
-        results = [ pool.apply_async( self.run, (self.obj,k%self.num_stages,sample(num_stages),*options) ) for k in range(num_samples) ]
-        
+            options = ("Objective Value",)
+        options = tuple(option.strip() for option in options)
+        for option in options:
+            if option not in self.quantities:
+                raise ValueError("Unknown quantity {0}".format(option))
+        num_samples = X.shape[0]
+        chunk_size = self.chunk_size
+        manifest = read_manifest(path) if path is not None and os.path.isdir(path) else None
+        if chunk_size is None and manifest is not None and "chunk_size" in manifest:
+            chunk_size = manifest["chunk_size"]
+        if chunk_size is None:
+            chunk_size = max(1,-(-num_samples//(4*self.num_threads)))
+
+        results = dict()
+        for option in options:
+            name, shape = self.quantities[option]
+            shape = (self.num_stages,) if shape is None else shape
+            results[name] = np.empty((num_samples,)+shape)
 
-        return DataFrame([ res.get() for res in results ])
-       
+        writer, completed = None, set()
+        if path is not None:
+            from hashlib import sha1
+            metadata = dict(metadata or dict(),chunk_size=chunk_size,num_samples=num_samples,
+                            controls=sha1(X.tobytes()).hexdigest())
+            writer = ShardWriter(path,[self.quantities[option][0] for option in options],metadata=metadata)
+            completed = writer.completed()
+            if len(completed):
+                done = load_shards(path)
+                for name in results:
+                    results[name][done["index"]] = done[column_name(name)]
 
+        self.start()
+        chunks = [ (start,X[start:start+chunk_size],options) for start in range(0,num_samples,chunk_size) \
+                   if start//chunk_size not in completed ]
+        try:
+            for start, chunk in self.pool.imap_unordered(self.run_chunk,chunks):
+                for name, values in chunk.items():
+                    results[name][start:start+len(values)] = values
+                if writer is not None:
+                    index = np.arange(start,min(start+chunk_size,num_samples))
+                    writer.add((start//chunk_size,index,{ column_name(name) : values for name, values in chunk.items() }))
+        finally:
+            if writer is not None:
+                writer.close()
+        return results
+
+    def __call__(self,num_samples,*options,sample_dist=None,path=None):
+        """
+        Evaluate the options at num_samples controls drawn from sample_dist, a function
+        that returns a random control vector of the given length, and return them as a
+        pandas.DataFrame with one row per sample
 
+        If path is given, the results are also written to that directory and a run that 
+        stopped is resumed, see sample(). The state of numpy.random before the controls are
+        drawn is recorded in the manifest and restored on resumption, so sample_dist must
+        draw from numpy.random.
+        """
+        from pandas import DataFrame
+        metadata = dict()
+        if path is not None:
+            metadata["rng_state"] = resume_random_state(path)
+        if sample_dist is None:
+            X = np.random.rand(num_samples,self.num_stages)*np.pi/2
+        else:
+            X = np.array([ sample_dist(self.num_stages) for k in range(num_samples) ]).reshape(num_samples,-1)
+        results = self.sample(X,*options,path=path,metadata=metadata)
+        return DataFrame({ name : list(values) if values.ndim > 1 else values for name, values in results.items() })
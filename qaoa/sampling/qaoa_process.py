@@ -1,73 +1,198 @@
 import multiprocessing as mp
-import queue
-from copy import deepcopy
+import numpy as np
+import os
 
-class QAOAProcess(mp.Process):
+# Forking a process that has run the parallel kernels is unsafe with some Numba threading
+# layers, so the processes are spawned and load the compiled kernels from the cache
+context = mp.get_context("spawn")
 
-    def __init__(self,job,qctrl,qresult,quantities,nlayers,C,D=None,psi0=None):
-        from qaoa.circuit import QAOACircuit
+class QAOAProcess(context.Process):
+
+    def __init__(self,job,qctrl,qresult,quantities,nlayers,C,D=None,psi0=None,threads=None):
         super().__init__()
         self.qctrl = qctrl
         self.qresult = qresult
         self.quantities = quantities
-        
+        # The circuit is built by the process, so that its states are not allocated by the
+        # parent and C, which may be shared (see DiagonalOperator.share), is not copied
+        self.circuit_args = (nlayers,C,D,psi0)
+        self.threads = threads
+
         print("Starting job {0}".format(job))
-        self.obj = QAOACircuit(nlayers,C,D,psi0)
 
     def run(self):
-        while not self.qctrl.empty():
-            try:
-
-                result = list()
-                theta = self.qctrl.get(block=False)
+        """
+        Evaluate the quantities at every control of the chunks (chunk,start,X) read from 
+        qctrl until None is read, and put the identifier of the chunk, the index of its
+        samples, their columns and the digest of X in qresult
+        """
+        from qaoa.circuit import QAOACircuit
+        from qaoa.util.shard_writer import column_name, chunk_digest
+        self.obj = QAOACircuit(*self.circuit_args,threads=self.threads)
+        while True:
+            chunk = self.qctrl.get()
+            if chunk is None:
+                break
+            chunk, start, X = chunk
+            columns = { q : list() for q in self.quantities }
+            for theta in X:
 
                 if "Theta" in self.quantities:
-                    result.append(theta)
+                    columns["Theta"].append(theta)
 
                 if "Value" in self.quantities:
                     fval = self.obj.value(theta)
-                    result.append(fval)
+                    columns["Value"].append(fval)
 
                 if "Gradient" in self.quantities:
                     grad = self.obj.gradient(theta)
-                    result.append(grad)
+                    columns["Gradient"].append(grad)
 
                 if "Hessian Eigenvalues" in self.quantities:
+                    # The Hessian is symmetric, so its eigenvalues are real
                     heig = self.obj.hess_eig(theta)
-                    result.append(hess_eig)
-
-                self.qresult.put(result)
-                self.qctrl.task_done()
-            except queue.Empty:
-                break
-
-
-def sample_QAOA(filename,quantities,nsamples,njobs,buffersize,ctrlgen,C,D=None,psi0=None):
-    from qaoa.util import QueueLogger
-
-    print("\nSetting up QAOA processes") 
-
-    log = QueueLogger(filename,quantities,buffersize,nsamples)
-
-    qctrl = mp.JoinableQueue()
-    qresult = mp.Queue()
+                    columns["Hessian Eigenvalues"].append(np.real(heig))
+
+            index = np.arange(start,start+len(X))
+            self.qresult.put((chunk,index,{ column_name(q) : np.array(v) for q, v in columns.items() },chunk_digest(X)))
+
+
+def resume_random_state(path):
+    """
+    Restore the state of numpy.random recorded in the manifest of the directory path, if
+    any, so that a resumed run draws the same controls. Returns the state to record in the 
+    manifest as a list.
+    """
+    from qaoa.util.shard_writer import read_manifest
+    manifest = read_manifest(path) if os.path.isdir(path) else None
+    if manifest is not None and "rng_state" in manifest:
+        name, key, pos, has_gauss, cached = manifest["rng_state"]
+        np.random.set_state((name,np.array(key,dtype=np.uint32),pos,has_gauss,cached))
+    name, key, pos, has_gauss, cached = np.random.get_state()
+    return [name,key.tolist(),int(pos),int(has_gauss),float(cached)]
+
+def control_chunks(ctrlgen,nsamples=None,chunk_size=64):
+    """
+    Generate controls lazily as arrays of up to chunk_size rows
+
+    Parameters
+    ----------
+    ctrlgen : function, iterable or numpy.ndarray
+        Either a function that returns a new control vector, which is called nsamples times,
+        an iterable of control vectors or a 2D array with one control vector per row. The
+        first nsamples controls of an iterable or an array are used if nsamples is given.
+    nsamples : unsigned int, optional
+        Number of controls. Required if ctrlgen is a function
+    chunk_size : unsigned int
+        Number of rows of every chunk but the last
+    """
+    from itertools import islice
+    if isinstance(ctrlgen,np.ndarray):
+        assert( ctrlgen.ndim == 2 )
+        X = ctrlgen if nsamples is None else ctrlgen[:nsamples]
+        for start in range(0,len(X),chunk_size):
+            yield np.asarray(X[start:start+chunk_size],dtype=float)
+        return
+    if callable(ctrlgen):
+        if nsamples is None:
+            raise ValueError("The number of samples must be provided with a function that generates controls")
+        controls = (ctrlgen() for k in range(nsamples))
+    else:
+        controls = iter(ctrlgen) if nsamples is None else islice(ctrlgen,nsamples)
+    while True:
+        X = list(islice(controls,chunk_size))
+        if not len(X):
+            return
+        yield np.array(X,dtype=float)
+
+
+def sample_QAOA(filename,quantities,nsamples,njobs,buffersize,ctrlgen,C,D=None,psi0=None,threads=None,share=True,
+                chunk_size=64,window=None,interval=60.0,resume=True):
+    """
+    Evaluate the quantities of a QAOA circuit at the controls given by ctrlgen with njobs
+    processes and write them to the directory filename as columns of .npy shards, see 
+    qaoa.util.ShardWriter and qaoa.util.load_shards. The rows are written once buffersize
+    of them are collected or the oldest has waited interval seconds. Each process runs the
+    kernels with the given number of threads, serial by default (see 
+    qaoa.util.kernel_threads). If share is True and C is a DiagonalOperator, its diagonal 
+    is moved to shared memory while the processes run, see DiagonalOperator.share.
+
+    The controls are generated in chunks of chunk_size rows while the processes evaluate
+    the earlier chunks, see control_chunks for the accepted types of ctrlgen. At most window
+    chunks, 2*njobs by default, wait in the queue of the processes, so the generation of the
+    controls blocks when it is ahead and the memory used does not grow with nsamples. The
+    number of layers is that of the first control. nsamples may be None for iterables and
+    arrays of controls.
+
+    The chunks written are recorded in the manifest of filename with the digests of their
+    controls (see ShardWriter). If resume is True and filename already has results, the run
+    continues: the controls of the chunks that are recorded are generated again but not 
+    evaluated, and the results of the other chunks are written to a new shard. The controls 
+    must then be the same as in the first run, as for an array, or a function that draws 
+    from numpy.random, whose state at the start of the first run is recorded and restored. 
+    A ValueError is raised if a recorded chunk is generated with other controls, after the
+    chunks sent before it are written. The chunk_size must not change.
+    """
+    from itertools import chain
+    from qaoa.util import ShardWriter
+    from qaoa.util.shard_writer import read_manifest, chunk_digest
+    from qaoa.operators import DiagonalOperator
+
+    print("\nSetting up QAOA processes")
+
+    if not resume and os.path.isdir(filename) and read_manifest(filename) is not None:
+        raise ValueError("{0} already has results".format(filename))
+    metadata = { "chunk_size" : chunk_size }
+    if callable(ctrlgen):
+        metadata["rng_state"] = resume_random_state(filename)
+    if nsamples is None and isinstance(ctrlgen,np.ndarray):
+        nsamples = len(ctrlgen)
+    log = ShardWriter(filename,quantities,buffersize,interval,metadata=metadata)
+    completed = log.completed()
+    if nsamples is not None:
+        log.total = nsamples - sum(rows for shard, rows in log.manifest["shards"])
+
+    chunks = control_chunks(ctrlgen,nsamples,chunk_size)
+    first = next(chunks,None)
+    if first is None:
+        raise ValueError("No controls to sample")
+    nlayers = first.shape[1]//2
+
+    qctrl = context.Queue(2*njobs if window is None else window)
+    qresult = context.Queue()
+
+    if isinstance(C,DiagonalOperator):
+        C.spectrum_levels() # Computed once for every process
+    shared = share and isinstance(C,DiagonalOperator) and C.shared is None
+    if shared:
+        C.share()
+
+    qaoa_procs = [ QAOAProcess(job,qctrl,qresult,quantities,nlayers,C,D,psi0,threads) for job in range(njobs) ]
+
+    log_proc = context.Process(target=log.read,args=(qresult,))
+    log_proc.start()
 
-    [ qctrl.put(ctrlgen()) for k in range(nsamples) ]
-    
-    nlayers = len(ctrlgen())//2
+    [ qp.start() for qp in qaoa_procs ]
 
-    qaoa_procs = [ QAOAProcess(job,qctrl,qresult,quantities,nlayers,C,D,psi0) for job in range(njobs) ]
+    start, count = 0, 0
+    try:
+        for chunk, X in enumerate(chain((first,),chunks)):
+            if chunk not in completed:
+                qctrl.put((chunk,start,X))
+                count += len(X)
+            elif log.digest(chunk) not in (None,chunk_digest(X)):
+                raise ValueError("The controls of chunk {0} differ from those of the results in {1}".format(chunk,filename))
+            start += len(X)
+    finally:
+        [ qctrl.put(None) for qp in qaoa_procs ]
 
-    log_proc = mp.Process(target=log.read,args=(qresult,))
-    log_proc.start()
+        [ qp.join() for qp in qaoa_procs ]
 
-    [ qp.start() for qp in qaoa_procs ]
+        qresult.put(None)
+        log_proc.join()
 
-    qctrl.join()    
+        if shared:
+            C.release()
 
-    log_proc.terminate()
+    print("\nResults collected for {0} control angles and written to file {1}".format(count,filename))
 
-    [ qp.join() for qp in qaoa_procs ]
- 
-    print("\nResults collected for {0} control angles and written to file {1}".format(nsamples,filename))
-               
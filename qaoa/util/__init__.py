@@ -6,3 +6,8 @@ from .sine_interp import SineInterp
 from . import finite_difference
 from . import number_format
 from .queue_logger import QueueLogger
+from .workspace import Workspace, aligned_zeros
+from .compilation import warmup
+from .math import kernel_threads
+from .shared_array import SharedArray
+from .shard_writer import ShardWriter, load_shards, read_manifest
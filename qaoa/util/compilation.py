@@ -0,0 +1,87 @@
+import numpy as np
+
+def warmup(nq=4,dtypes=(np.complex128,np.complex64),threads=(None,1)):
+    """
+    Compile the kernels used by the operators and circuits for the given state types
+
+    Every kernel is compiled on first use for the types of its arguments. warmup()
+    exercises the operators and the circuit evaluations on small problems, with the
+    tiles of the tiled kernels reduced so that all of their passes run, for states of
+    each type in dtypes and stored, compact (int8) and random diagonals, and for each
+    kernel_threads setting in threads. The compiled kernels are cached on disk, so later
+    interpreters and spawned worker processes load them instead of compiling. Worker 
+    processes forked after warmup() share the compiled kernels of the parent.
+
+    Parameters
+    ----------
+    nq : unsigned int
+        Number of qubits of the problems. The compiled kernels do not depend on it
+    dtypes : tuple
+        Types of the state vectors, complex128 and/or complex64
+    threads : tuple
+        Settings of qaoa.util.kernel_threads. The default compiles the kernels of the 
+        main process and the serial kernels of worker processes
+
+    Returns
+    -------
+    elapsed : float
+        Wall-clock time spent in seconds
+    """
+    from time import perf_counter
+    from qaoa.operators import IsingHamiltonian, MatrixFreeIsingHamiltonian, SumSigmaXPropagator
+    from qaoa.util import kernel_threads
+
+    start = perf_counter()
+    classes = (IsingHamiltonian,MatrixFreeIsingHamiltonian,SumSigmaXPropagator)
+    tile_bits = [cls.tile_bits for cls in classes]
+    rng = np.random.default_rng(0)
+    try:
+        for cls in classes:
+            cls.tile_bits = max(1,nq//2)
+        for dtype, n in [(np.dtype(dtype),n) for dtype in dtypes for n in threads]:
+            with kernel_threads(n):
+                warmup_circuits(nq,dtype,rng)
+    finally:
+        for cls, t in zip(classes,tile_bits):
+            cls.tile_bits = t
+    return perf_counter() - start
+
+def warmup_circuits(nq,dtype,rng):
+    """
+    Internally-used function that evaluates every operator and circuit path once for
+    states of the given type
+    """
+    from qaoa.operators import IsingHamiltonian, MatrixFreeIsingHamiltonian, DiagonalOperator, \
+                               SumSigmaXOperator, SumSigmaYOperator
+    from qaoa.circuit import QAOACircuit
+    real = np.finfo(dtype).dtype
+    h = rng.integers(-2,3,nq)
+    J = np.triu(rng.integers(-2,3,(nq,nq)),1)
+    d = rng.standard_normal(1<<nq).astype(real)
+    theta = rng.random(4)
+    thetas = rng.random((3,4))
+    Cs = [IsingHamiltonian(h=h,J=J,dtype=real), IsingHamiltonian(h=h,J=J,compact=True),
+          DiagonalOperator(d), MatrixFreeIsingHamiltonian(h=h,J=J),
+          MatrixFreeIsingHamiltonian(h=h+0.5,J=J)]
+    Cs[2]._levels = None # Exponentials instead of tabulated phases
+    Ds = [SumSigmaXOperator(nq), SumSigmaXOperator(nq,backend="walsh")]
+    for C in Cs:
+        C.true_minimum()
+        for D in Ds:
+            objs = [QAOACircuit(2,C,D,dtype=dtype,fuse_layers=fused) for fused in (True,False)]
+            if isinstance(C,DiagonalOperator) and D.backend == "stencil":
+                objs.append(QAOACircuit(2,C,D,dtype=dtype,compiled=True))
+            for obj in objs:
+                obj.value_and_gradient(theta)
+                obj.hess_vec(theta,theta)
+                obj.value_batch(thetas)
+                obj.gradient_batch(thetas)
+            objs[0].hessian(theta)
+            objs[0].metric_tensor(theta)
+
+    # The sigma-y mixer is not used by the circuits above
+    Y = SumSigmaYOperator(nq)
+    v = np.ones(1<<nq,dtype=dtype)
+    u = np.zeros_like(v)
+    Y.apply(v,u)
+    Y.propagator(0.5).apply(v,u)
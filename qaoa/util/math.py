@@ -1,13 +1,104 @@
 import numpy as np
+import numba
 from numba import njit, prange
 from multiprocessing import current_process
+from types import FunctionType
+
+def serial_copy(f):
+    """
+    Copy of a function under a distinct qualified name. Numba names the cache files of a 
+    kernel after its function, so the copy keeps the serial compilation of a kernel from
+    replacing the parallel one in the on-disk cache.
+    """
+    g = FunctionType(f.__code__,f.__globals__,f.__name__,f.__defaults__,f.__closure__)
+    g.__qualname__ = f.__qualname__ + "_serial"
+    g.__module__ = f.__module__
+    g.__doc__ = f.__doc__
+    return g
+
+
+class kernel_threads(object):
+
+    """
+    Number of threads used by the kernels, chosen at call time
+
+    Every kernel decorated with mpnjit has a serial and a parallel variant. With one
+    thread the serial variants are called, otherwise the parallel variants with up to
+    the given number of Numba threads. With None (default), the kernels are parallel in 
+    the main process and serial in worker processes, which run concurrently, and the
+    parallel kernels use every Numba thread. The setting applies to the whole process. 
+    Used as a context manager, it is restored on exit along with the number of Numba
+    threads
+
+    >>> with kernel_threads(1):
+    ...     obj.gradient(theta)
+    """
+
+    threads = None
+
+    def __init__(self,threads):
+        assert( threads is None or int(threads) >= 1 )
+        self.threads = threads
+
+    def __enter__(self):
+        self.num_threads = numba.get_num_threads() if self.threads is not None and self.threads > 1 else None
+        self.previous = self.set(self.threads)
+        return self
+
+    def __exit__(self,*args):
+        self.set(self.previous)
+        if self.num_threads is not None:
+            numba.set_num_threads(self.num_threads)
+
+    @staticmethod
+    def set(threads):
+        """
+        Set the number of threads of the kernels and return the previous setting
+        """
+        previous = kernel_threads.threads
+        kernel_threads.threads = threads
+        if threads is not None and threads > 1:
+            numba.set_num_threads(min(int(threads),numba.config.NUMBA_NUM_THREADS))
+        elif previous is not None and previous > 1:
+            numba.set_num_threads(numba.config.NUMBA_NUM_THREADS)
+        return previous
+
+    @staticmethod
+    def parallel():
+        """
+        Indicates whether the parallel variants of the kernels are called
+        """
+        threads = kernel_threads.threads
+        return current_process().name=="MainProcess" if threads is None else threads > 1
+
+
+class Kernel(object):
+
+    """
+    Kernel compiled as a serial and a parallel function, one of which is called 
+    according to kernel_threads
+    """
+
+    def __init__(self,f,**kwargs):
+        kwargs.setdefault("cache",True)
+        self.py_func = f
+        self.parallel = njit(f,parallel=True,**kwargs)
+        self.serial = njit(serial_copy(f),parallel=False,**kwargs)
+        self.__name__ = f.__name__
+        self.__doc__ = f.__doc__
+
+    def __call__(self,*args):
+        return (self.parallel if kernel_threads.parallel() else self.serial)(*args)
 
 def mpnjit(*args,**kwargs):
     """
-    Only apply Numba parallelism to a function if it is running on the main process (serial)
+    Compile a kernel with both serial and parallel Numba loops, see kernel_threads
+
+    The compiled kernels are cached on disk (cache=True unless specified), so that new 
+    interpreters and spawned worker processes load them instead of compiling them.
     """
-    kwargs["parallel"] = current_process().name=="MainProcess"
-    return njit(*args,**kwargs)
+    decorate = lambda f : Kernel(f,**kwargs)
+    return decorate(args[0]) if len(args) == 1 and callable(args[0]) else decorate
 
 
 @mpnjit
@@ -71,6 +162,20 @@ def cexp_hadamard_div(n,d,theta,v,Uv):
         Uv[k] = np.exp(-1j*theta*d[k])*v[k]
 
 
+@mpnjit
+def table_hadamard_mult(n,idx,offset,table,v,Uv):
+    for k in prange(1<<n):
+        Uv[k] = table[idx[k]-offset]*v[k]
+
+@mpnjit
+def table_hadamard_mult_block(n,idx,offset,table,V,UV):
+    B = V.shape[1]
+    for k in prange(1<<n):
+        tk = table[idx[k]-offset]
+        for b in range(B):
+            UV[k,b] = tk[b]*V[k,b]
+
+
 @mpnjit
 def projection_1d(n,v,x,y):
     s = 0
@@ -107,6 +212,211 @@ def apply_kron2( A, n, k, x, y ):
             j2 += 1
 
 
+@mpnjit
+def apply_kron2_block( A, n, k, X, Y ):
+    ldim = 1<<k
+    rdim = 1<<(n-k-1)
+    B = X.shape[1]
+    for i in prange(ldim*rdim):
+        j1 = 2*(i//rdim)*rdim + i%rdim
+        j2 = j1+rdim
+        for b in range(B):
+            x1 = X[j1,b]
+            x2 = X[j2,b]
+            Y[j1,b] = A[b,0,0]*x1 + A[b,0,1]*x2
+            Y[j2,b] = A[b,1,0]*x1 + A[b,1,1]*x2
+
+def apply_kron2_fused( A, n, t, g, v, u ):
+    """
+    Apply the n-fold Kronecker product of the 2x2 matrix A to v and store the result in u,
+    which may be the same array as v. The t lowest qubits are applied in a single pass over
+    tiles of 2**t consecutive elements and the remaining qubits in passes that each apply 
+    up to g qubits to tiles of the same size. Requires 1 <= t <= n.
+    """
+    apply_kron2_low(A,n,t,v,u)
+    apply_kron2_high(A,n,t,g,u,u)
+
+@mpnjit
+def apply_kron2_low( A, n, t, v, u ):
+    """
+    Apply the Kronecker product of the 2x2 matrix A on the t lowest qubits to v and store
+    the result in u, in a single pass over tiles of 2**t consecutive elements
+    """
+    a00, a01, a10, a11 = A[0,0], A[0,1], A[1,0], A[1,1]
+    T = 1<<t
+    for i in prange(1<<(n-t)):
+        base = i*T
+        for j in range(base,base+T,2):
+            x1 = v[j]
+            x2 = v[j+1]
+            u[j]   = a00*x1 + a01*x2
+            u[j+1] = a10*x1 + a11*x2
+        for q in range(1,t):
+            h = 1<<q
+            for j0 in range(base,base+T,2*h):
+                for j in range(j0,j0+h):
+                    x1 = u[j]
+                    x2 = u[j+h]
+                    u[j]   = a00*x1 + a01*x2
+                    u[j+h] = a10*x1 + a11*x2
+
+@mpnjit
+def apply_kron2_high( A, n, t, g, v, u ):
+    """
+    Apply the Kronecker product of the 2x2 matrix A on the n-t highest qubits to v and 
+    store the result in u, in passes that each apply up to g qubits to chunks of about 
+    2**t elements. The first pass reads v, so that u may differ from v. 
+    """
+    a00, a01, a10, a11 = A[0,0], A[0,1], A[1,0], A[1,1]
+    T = 1<<t
+    for q0 in range(t,n,g):
+        gq = min(g,n-q0)
+        L = 1<<q0
+        G = 1<<gq
+        C = min(L,max(1,T>>gq))
+        nchunks = L//C
+        for i in prange((1<<(n-q0-gq))*nchunks):
+            base = (i//nchunks)*L*G + (i%nchunks)*C
+            if q0 == t:
+                for m in range(G):
+                    for l in range(base+m*L,base+m*L+C):
+                        u[l] = v[l]
+            for r in range(gq):
+                h = L<<r
+                for m0 in range(0,G,2<<r):
+                    for m in range(m0,m0+(1<<r)):
+                        j1 = base + m*L
+                        j2 = j1 + h
+                        for l in range(C):
+                            x1 = u[j1+l]
+                            x2 = u[j2+l]
+                            u[j1+l] = a00*x1 + a01*x2
+                            u[j2+l] = a10*x1 + a11*x2
+
+@mpnjit
+def cexp_kron2_low( A, n, t, d, theta, first, v, u ):
+    """
+    Version of apply_kron2_low that also multiplies by exp(i*theta*d) elementwise, before 
+    the Kronecker product if first is True and after it otherwise, within the same pass
+    """
+    a00, a01, a10, a11 = A[0,0], A[0,1], A[1,0], A[1,1]
+    T = 1<<t
+    for i in prange(1<<(n-t)):
+        base = i*T
+        for j in range(base,base+T,2):
+            x1 = v[j]
+            x2 = v[j+1]
+            if first:
+                x1 = np.exp(1j*theta*d[j])*x1
+                x2 = np.exp(1j*theta*d[j+1])*x2
+            u[j]   = a00*x1 + a01*x2
+            u[j+1] = a10*x1 + a11*x2
+        for q in range(1,t):
+            h = 1<<q
+            for j0 in range(base,base+T,2*h):
+                for j in range(j0,j0+h):
+                    x1 = u[j]
+                    x2 = u[j+h]
+                    u[j]   = a00*x1 + a01*x2
+                    u[j+h] = a10*x1 + a11*x2
+        if not first:
+            for j in range(base,base+T):
+                u[j] = np.exp(1j*theta*d[j])*u[j]
+
+@mpnjit
+def table_kron2_low( A, n, t, idx, offset, table, first, v, u ):
+    """
+    Version of apply_kron2_low that also multiplies elementwise by a function of the diagonal 
+    tabulated as in table_hadamard_mult, before the Kronecker product if first is True and 
+    after it otherwise, within the same pass
+    """
+    a00, a01, a10, a11 = A[0,0], A[0,1], A[1,0], A[1,1]
+    T = 1<<t
+    for i in prange(1<<(n-t)):
+        base = i*T
+        for j in range(base,base+T,2):
+            x1 = v[j]
+            x2 = v[j+1]
+            if first:
+                x1 = table[idx[j]-offset]*x1
+                x2 = table[idx[j+1]-offset]*x2
+            u[j]   = a00*x1 + a01*x2
+            u[j+1] = a10*x1 + a11*x2
+        for q in range(1,t):
+            h = 1<<q
+            for j0 in range(base,base+T,2*h):
+                for j in range(j0,j0+h):
+                    x1 = u[j]
+                    x2 = u[j+h]
+                    u[j]   = a00*x1 + a01*x2
+                    u[j+h] = a10*x1 + a11*x2
+        if not first:
+            for j in range(base,base+T):
+                u[j] = table[idx[j]-offset]*u[j]
+
+@mpnjit
+def apply_kron2_fused_block( A, n, t, g, V, U ):
+    """
+    Block version of apply_kron2_fused where the vector in column b of V is multiplied 
+    by the n-fold Kronecker product of A[b] with itself
+    """
+    B = V.shape[1]
+    T = 1<<t
+    for i in prange(1<<(n-t)):
+        base = i*T
+        for j in range(base,base+T,2):
+            for b in range(B):
+                x1 = V[j,b]
+                x2 = V[j+1,b]
+                U[j,b]   = A[b,0,0]*x1 + A[b,0,1]*x2
+                U[j+1,b] = A[b,1,0]*x1 + A[b,1,1]*x2
+        for q in range(1,t):
+            h = 1<<q
+            for j0 in range(base,base+T,2*h):
+                for j in range(j0,j0+h):
+                    for b in range(B):
+                        x1 = U[j,b]
+                        x2 = U[j+h,b]
+                        U[j,b]   = A[b,0,0]*x1 + A[b,0,1]*x2
+                        U[j+h,b] = A[b,1,0]*x1 + A[b,1,1]*x2
+    for q0 in range(t,n,g):
+        gq = min(g,n-q0)
+        L = 1<<q0
+        G = 1<<gq
+        C = min(L,max(1,T>>gq))
+        nchunks = L//C
+        for i in prange((1<<(n-q0-gq))*nchunks):
+            base = (i//nchunks)*L*G + (i%nchunks)*C
+            for r in range(gq):
+                h = L<<r
+                for m0 in range(0,G,2<<r):
+                    for m in range(m0,m0+(1<<r)):
+                        j1 = base + m*L
+                        j2 = j1 + h
+                        for l in range(C):
+                            for b in range(B):
+                                x1 = U[j1+l,b]
+                                x2 = U[j2+l,b]
+                                U[j1+l,b] = A[b,0,0]*x1 + A[b,0,1]*x2
+                                U[j2+l,b] = A[b,1,0]*x1 + A[b,1,1]*x2
+
+@mpnjit
+def hadamard_mult_block(n,d,V,DV):
+    B = V.shape[1]
+    for j in prange(1<<n):
+        dj = d[j]
+        for b in range(B):
+            DV[j,b] = dj*V[j,b]
+
+@mpnjit
+def cexp_hadamard_mult_block(n,d,theta,V,UV):
+    B = V.shape[1]
+    for j in prange(1<<n):
+        dj = d[j]
+        for b in range(B):
+            UV[j,b] = np.exp(1j*theta[b]*dj)*V[j,b]
+
+
 @mpnjit
 def diag_inner_product(n,u,d,v):
     result = 0
@@ -121,43 +431,178 @@ def diag_conj_inner_product(n,u,d,v):
         result += np.conj(u[k]) * d[k] * v[k]
     return result
 
-@njit
+@njit(cache=True)
+def block_tiles(n):
+    """
+    Number of row tiles used to accumulate partial sums in the block reductions
+    """
+    return 1 << max(0,n-10)
+
+@mpnjit
+def conj_inner_product_block(n,U,V):
+    B = V.shape[1]
+    ntiles = block_tiles(n)
+    rows = (1<<n)//ntiles
+    partial = np.zeros((ntiles,B),dtype=np.complex128)
+    for t in prange(ntiles):
+        for j in range(t*rows,(t+1)*rows):
+            for b in range(B):
+                partial[t,b] += np.conj(U[j,b]) * V[j,b]
+    result = np.zeros(B,dtype=np.complex128)
+    for t in range(ntiles):
+        result += partial[t]
+    return result
+
+@mpnjit
+def diag_conj_inner_product_block(n,U,d,V):
+    B = V.shape[1]
+    ntiles = block_tiles(n)
+    rows = (1<<n)//ntiles
+    partial = np.zeros((ntiles,B),dtype=np.complex128)
+    for t in prange(ntiles):
+        for j in range(t*rows,(t+1)*rows):
+            dj = d[j]
+            for b in range(B):
+                partial[t,b] += np.conj(U[j,b]) * dj * V[j,b]
+    result = np.zeros(B,dtype=np.complex128)
+    for t in range(ntiles):
+        result += partial[t]
+    return result
+
+@njit(cache=True)
 def zspin(n,k,i):
     return 1 - 2 * ( (k>>(n-i-1)) & 1 )
 
+@njit(cache=True)
+def ising_low_energies(n,t,h,ei,ej,w):
+    """
+    Energies of the 2**t basis states of the t qubits stored in the lowest bits, 
+    including only the field terms of those qubits and the couplings among them
+    """
+    E = np.zeros(1<<t)
+    for lo in range(1<<t):
+        for q in range(n-t,n):
+            E[lo] += h[q] * zspin(t,lo,q-n+t)
+        for e in range(len(w)):
+            if ei[e] >= n-t and ej[e] >= n-t:
+                E[lo] += w[e] * zspin(t,lo,ei[e]-n+t) * zspin(t,lo,ej[e]-n+t)
+    return E
+
+@njit(cache=True)
+def ising_tile_energies(n,t,hi,h,ei,ej,w,elow,E):
+    """
+    Energies of the 2**t basis states whose indices share the high bits hi. The couplings 
+    between high and low qubits act as an external field on the low qubits, whose 
+    contribution is built by recursive doubling, one low qubit at a time. 
+    """
+    f = np.zeros(t)
+    c = 0.0
+    for q in range(n-t):
+        c += h[q] * zspin(n-t,hi,q)
+    for e in range(len(w)):
+        i, j = ei[e], ej[e]
+        if i < n-t and j < n-t:
+            c += w[e] * zspin(n-t,hi,i) * zspin(n-t,hi,j)
+        elif i < n-t:
+            f[n-1-j] += w[e] * zspin(n-t,hi,i)
+        elif j < n-t:
+            f[n-1-i] += w[e] * zspin(n-t,hi,j)
+    E[0] = c
+    for p in range(t):
+        E[0] += f[p]
+    for p in range(t):
+        h2 = 1<<p
+        for lo in range(h2):
+            E[lo|h2] = E[lo] - 2*f[p]
+    for lo in range(1<<t):
+        E[lo] += elow[lo]
+
 @mpnjit
-def ising_dense_h(n,h_v,c):
-    n = len(h_v)
-    for k in prange(1<<n):
-        for i,h in enumerate(h_v):
-            c[k] += h * zspin(n,k,i)
+def ising_mult(n,t,h,ei,ej,w,elow,v,Hv):
+    T = 1<<t
+    for hi in prange(1<<(n-t)):
+        E = np.empty(T)
+        ising_tile_energies(n,t,hi,h,ei,ej,w,elow,E)
+        base = hi*T
+        for lo in range(T):
+            Hv[base+lo] = E[lo]*v[base+lo]
 
-#@mpnjit
-def ising_sparse_h(n,h_rv,c):
-    p = len(h_rv)
-    for k in range(1<<n):
-        for i, h in h_rv:
-            c[k] += h * zspin(n,k,i)
+@mpnjit
+def ising_inner_product(n,t,h,ei,ej,w,elow,u,v):
+    T = 1<<t
+    result = 0j
+    for hi in prange(1<<(n-t)):
+        E = np.empty(T)
+        ising_tile_energies(n,t,hi,h,ei,ej,w,elow,E)
+        base = hi*T
+        lresult = 0j
+        for lo in range(T):
+            lresult += u[base+lo] * E[lo] * v[base+lo]
+        result += lresult
+    return result
 
 @mpnjit
-def ising_dense_J(n,J,c):
-    for k in prange(1<<n):
-        for i in range(n):
-            zi = zspin(n,k,i)
-            for j in range(i+1,n):
-                c[k] += J[i,j] * zi * zspin(n,k,j)
+def ising_conj_inner_product(n,t,h,ei,ej,w,elow,u,v):
+    T = 1<<t
+    result = 0j
+    for hi in prange(1<<(n-t)):
+        E = np.empty(T)
+        ising_tile_energies(n,t,hi,h,ei,ej,w,elow,E)
+        base = hi*T
+        lresult = 0j
+        for lo in range(T):
+            lresult += np.conj(u[base+lo]) * E[lo] * v[base+lo]
+        result += lresult
+    return result
 
 @mpnjit
-def ising_sparse_J(n,J_rc,c):
-    for k in prange(1<<n):
-        for i,j in J_rc:
-            c[k] += zspin(n,k,i) * zspin(n,k,j)
+def ising_cexp_mult(n,t,h,ei,ej,w,elow,theta,v,Uv):
+    T = 1<<t
+    for hi in prange(1<<(n-t)):
+        E = np.empty(T)
+        ising_tile_energies(n,t,hi,h,ei,ej,w,elow,E)
+        base = hi*T
+        for lo in range(T):
+            Uv[base+lo] = np.exp(1j*theta*E[lo])*v[base+lo]
 
 @mpnjit
-def ising_sparse_weighted_J(n,J_rcv,c):
-    for k in prange(1<<n):
-        for i,j,J in J_rcv:
-            c[k] += J * zspin(n,k,i) * zspin(n,k,j)
+def ising_table_mult(n,t,h,ei,ej,w,elow,offset,table,v,Uv):
+    """
+    Multiply by a function of integer-valued energies tabulated at E+offset
+    """
+    T = 1<<t
+    for hi in prange(1<<(n-t)):
+        E = np.empty(T)
+        ising_tile_energies(n,t,hi,h,ei,ej,w,elow,E)
+        base = hi*T
+        for lo in range(T):
+            Uv[base+lo] = table[int(np.rint(E[lo]))+offset]*v[base+lo]
+
+@mpnjit
+def ising_energies(n,t,h,ei,ej,w,elow,c):
+    """
+    Add the energy of every basis state to c, which may have an integer type if every
+    coefficient is an integer
+    """
+    T = 1<<t
+    for hi in prange(1<<(n-t)):
+        E = np.empty(T)
+        ising_tile_energies(n,t,hi,h,ei,ej,w,elow,E)
+        base = hi*T
+        for lo in range(T):
+            c[base+lo] += E[lo]
+
+@mpnjit
+def ising_extrema(n,t,h,ei,ej,w,elow):
+    T = 1<<t
+    lo_min = np.zeros(1<<(n-t))
+    lo_max = np.zeros(1<<(n-t))
+    for hi in prange(1<<(n-t)):
+        E = np.empty(T)
+        ising_tile_energies(n,t,hi,h,ei,ej,w,elow,E)
+        lo_min[hi] = E.min()
+        lo_max[hi] = E.max()
+    return lo_min.min(), lo_max.max()
 
 
 @mpnjit
@@ -187,6 +632,66 @@ def sum_sigma_x_conj_inner_product(n,u,v):
         result += np.conj(u[j])*lresult
     return result
 
+@mpnjit
+def sum_sigma_x_conj_inner_product_block(n,U,V):
+    B = V.shape[1]
+    ntiles = block_tiles(n)
+    rows = (1<<n)//ntiles
+    partial = np.zeros((ntiles,B),dtype=np.complex128)
+    for t in prange(ntiles):
+        for j in range(t*rows,(t+1)*rows):
+            for k in range(n):
+                jk = j^(1<<k)
+                for b in range(B):
+                    partial[t,b] += np.conj(U[j,b]) * V[jk,b]
+    result = np.zeros(B,dtype=np.complex128)
+    for t in range(ntiles):
+        result += partial[t]
+    return result
+
+HADAMARD = np.array(((1.0,1.0),(1.0,-1.0)))
+
+def fwht(n,v,u,t=12,g=6):
+    """
+    Unnormalized fast Walsh-Hadamard transform u = H v, where H is the n-fold Kronecker
+    product of ((1,1),(1,-1)). The transform is computed in-place when u is v.
+
+    Uses the cache-blocked butterfly kernels of apply_kron2_fused, which apply the t lowest
+    qubits in a single pass over tiles of 2**t elements and the remaining qubits in passes
+    of g qubits at a time, so that the number of passes over the full vector is 
+    1 + ceil((n-t)/g) rather than n.
+    """
+    apply_kron2_fused(HADAMARD,n,min(t,n),g,v,u)
+
+@mpnjit
+def hamming_weights(n):
+    w = np.zeros(1<<n,dtype=np.uint8)
+    for j in prange(1<<n):
+        c = 0
+        for b in range(n):
+            c += (j>>b) & 1
+        w[j] = c
+    return w
+
+@mpnjit
+def walsh_spectrum_mult(n,w,v):
+    """
+    Multiply a Walsh-Hadamard transformed vector in-place by the normalized spectrum
+    (n-2*w[j])/2**n of the sum of Pauli X operators 
+    """
+    scale = 1.0/(1<<n)
+    for j in prange(1<<n):
+        v[j] *= (n-2*w[j])*scale
+
+@mpnjit
+def walsh_spectrum_table_mult(n,w,table,v):
+    """
+    Multiply a Walsh-Hadamard transformed vector in-place by a function of the Hamming 
+    weight, tabulated for weights 0,...,n
+    """
+    for j in prange(1<<n):
+        v[j] *= table[w[j]]
+
 @mpnjit
 def sum_sigma_y_mult(n,v,Dv):
     for j in prange(1<<n):
@@ -220,19 +725,140 @@ def sum_sigma_y_conj_inner_product(n,u,v):
         result += np.conj(u[j])*lresult
     return result
 
+@mpnjit
+def sum_sigma_x_mult_block(n,V,DV):
+    B = V.shape[1]
+    for j in prange(1<<n):
+        for b in range(B):
+            DV[j,b] = 0
+        for k in range(n):
+            jk = j^(1<<k)
+            for b in range(B):
+                DV[j,b] += V[jk,b]
 
+@mpnjit
+def sum_sigma_y_mult_block(n,V,DV):
+    B = V.shape[1]
+    for j in prange(1<<n):
+        for b in range(B):
+            DV[j,b] = 0
+        for l in range(n):
+            k = j ^ (1<<l)
+            s = 1j if j>k else -1j
+            for b in range(B):
+                DV[j,b] += s*V[k,b]
 
 
+# Whole-circuit kernels for QAOA circuits with a diagonal phase separator and the
+# transverse field mixer. Stage k applies exp(i*theta[k]*A_k), where A_k is the diagonal 
+# values[idx] for even k and the sum of Pauli X operators for odd k. These are serial, 
+# since they target qubit counts for which threading overhead exceeds the work per stage.
 
+@njit(cache=True)
+def qaoa_stage(n,k,idx,values,theta,v):
+    """
+    Apply the propagator of stage k with control theta to v in-place
+    """
+    if k % 2 == 0:
+        table = np.exp(1j*theta*values)
+        for j in range(1<<n):
+            v[j] *= table[idx[j]]
+    else:
+        c = np.cos(theta)
+        s = 1j*np.sin(theta)
+        for q in range(n):
+            h = 1<<q
+            for j0 in range(0,1<<n,2*h):
+                for j in range(j0,j0+h):
+                    x1 = v[j]
+                    x2 = v[j+h]
+                    v[j]   = c*x1 + s*x2
+                    v[j+h] = s*x1 + c*x2
+
+@njit(cache=True)
+def qaoa_generator(n,k,idx,values,v,u):
+    """
+    Apply the Hermitian operator that generates stage k to v and store the result in u
+    """
+    if k % 2 == 0:
+        for j in range(1<<n):
+            u[j] = values[idx[j]]*v[j]
+    else:
+        for j in range(1<<n):
+            u[j] = 0
+            for q in range(n):
+                u[j] += v[j^(1<<q)]
+
+@njit(cache=True)
+def qaoa_generator_conj_inner_product(n,k,idx,values,u,v):
+    result = 0j
+    if k % 2 == 0:
+        for j in range(1<<n):
+            result += np.conj(u[j]) * values[idx[j]] * v[j]
+    else:
+        for j in range(1<<n):
+            lresult = 0j
+            for q in range(n):
+                lresult += v[j^(1<<q)]
+            result += np.conj(u[j]) * lresult
+    return result
 
+@njit(cache=True)
+def qaoa_value(n,idx,values,theta,psi0,psi):
+    """
+    Objective function of the circuit, propagating the state in psi
+    """
+    psi[:] = psi0
+    for k in range(len(theta)):
+        qaoa_stage(n,k,idx,values,theta[k],psi)
+    result = 0.0
+    for j in range(1<<n):
+        result += values[idx[j]] * (psi[j].real**2 + psi[j].imag**2)
+    return result
 
-
-
-
-
-
-
-
-
-
-
+@njit(cache=True)
+def qaoa_gradient(n,idx,values,theta,psi0,Psi,lam,grad):
+    """
+    Gradient of the objective function, stored in grad. The state after every stage is
+    stored in the rows of Psi. Returns the objective function.
+    """
+    L = len(theta)
+    Psi[0] = psi0
+    for k in range(L):
+        Psi[k+1] = Psi[k]
+        qaoa_stage(n,k,idx,values,theta[k],Psi[k+1])
+    qaoa_generator(n,0,idx,values,Psi[L],lam)
+    value = qaoa_generator_conj_inner_product(n,0,idx,values,Psi[L],Psi[L]).real
+    for k in range(L-1,-1,-1):
+        grad[k] = -2 * qaoa_generator_conj_inner_product(n,k,idx,values,lam,Psi[k+1]).imag
+        if k > 0:
+            qaoa_stage(n,k,idx,values,-theta[k],lam)
+    return value
+
+@njit(cache=True)
+def qaoa_hess_vec(n,idx,values,theta,dtheta,psi0,Psi,dPsi,lam,dlam,work,hv):
+    """
+    Action of the Hessian of the objective function on dtheta, stored in hv. The state 
+    and state sensitivity after every stage are stored in the rows of Psi and dPsi.
+    """
+    L = len(theta)
+    Psi[0] = psi0
+    dPsi[0] = 0
+    for k in range(L):
+        qaoa_generator(n,k,idx,values,Psi[k],work)
+        for j in range(1<<n):
+            dPsi[k+1,j] = 1j*dtheta[k]*work[j] + dPsi[k,j]
+        Psi[k+1] = Psi[k]
+        qaoa_stage(n,k,idx,values,theta[k],Psi[k+1])
+        qaoa_stage(n,k,idx,values,theta[k],dPsi[k+1])
+    qaoa_generator(n,0,idx,values,Psi[L],lam)
+    qaoa_generator(n,0,idx,values,dPsi[L],dlam)
+    for k in range(L-1,-1,-1):
+        hv[k] = -2 * ( qaoa_generator_conj_inner_product(n,k,idx,values,dlam,Psi[k+1]) + \
+                       qaoa_generator_conj_inner_product(n,k,idx,values,lam,dPsi[k+1]) ).imag
+        if k > 0:
+            qaoa_stage(n,k,idx,values,-theta[k],lam)
+            qaoa_stage(n,k,idx,values,-theta[k],dlam)
+            qaoa_generator(n,k,idx,values,lam,work)
+            for j in range(1<<n):
+                dlam[j] -= 1j*dtheta[k]*work[j]
@@ -37,7 +37,8 @@ class QueueLogger(object):
         buffersize : unsigned int
             Number of results to collect from the queue before writing them to file
         total : unsigned int
-            Number of items expected in the queue. Used for reporting progress.
+            Number of items expected in the queue. Used for reporting progress. If None,
+            the number of items read is reported.
         Example
         -------
         
@@ -85,7 +86,7 @@ class QueueLogger(object):
                 if len(self.buffer) >= self.buffersize:
                     self.progress += len(self.buffer)  
                     self.write_buffer()
-                    print("{:.2%}".format(self.progress/self.total))
+                    print("{:.2%}".format(self.progress/self.total) if self.total else self.progress)
 
     def write_buffer(self):
          with open(self.filename,'a') as csvfile:
@@ -0,0 +1,345 @@
+import numpy as np
+import os
+
+def npy_header(dtype,shape,size=128):
+    """
+    Header of a .npy file of the given type and shape padded to size bytes, so that it can
+    be rewritten in place when rows are appended to the file
+    """
+    import struct
+    from numpy.lib import format
+    header = repr({ 'descr' : format.dtype_to_descr(np.dtype(dtype)), 'fortran_order' : False, 'shape' : tuple(shape) })
+    header = header.ljust(size-len(format.MAGIC_PREFIX)-5) + '\n'
+    assert( len(header) == size-len(format.MAGIC_PREFIX)-4 )
+    return format.MAGIC_PREFIX + bytes((1,0)) + struct.pack('<H',len(header)) + header.encode('latin1')
+
+def column_name(quantity):
+    """
+    Name of the column of a quantity, as used in the names of the shard files
+    """
+    return quantity.lower().replace(' ','_')
+
+def chunk_digest(X):
+    """
+    SHA-1 digest of an array of controls, recorded in the manifest to check that a resumed
+    run regenerates the same controls
+    """
+    from hashlib import sha1
+    return sha1(np.ascontiguousarray(X,dtype=float).tobytes()).hexdigest()
+
+def read_manifest(path):
+    """
+    Manifest of the directory path written by a ShardWriter, or None if it has none
+
+    The manifest is the dict stored in manifest.json. Its keys are
+
+        "quantities" : names of the columns other than the index
+        "shards"     : list of [shard,rows], the number of rows of every shard that are
+                       complete. Rows past those may be left by a run that stopped.
+        "completed"  : identifiers of the chunks that are written, as a sorted list of
+                       ranges [first,last+1)
+        "digests"    : digests of the controls of the written chunks keyed by chunk 
+                       identifier, if given with the results (see chunk_digest)
+
+    along with the metadata of the run, such as "chunk_size" and "rng_state".
+    """
+    import json
+    filename = os.path.join(path,"manifest.json")
+    if not os.path.exists(filename):
+        return None
+    with open(filename,'r') as f:
+        return json.load(f)
+
+def merge_ranges(ranges,ids):
+    """
+    Sorted list of the ranges [first,last+1) of consecutive integers in the union of the
+    ranges and the integers ids
+    """
+    merged = list()
+    for first, last in sorted(list(ranges) + [[int(k),int(k)+1] for k in ids]):
+        if len(merged) and first <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1],last)
+        else:
+            merged.append([first,last])
+    return merged
+
+def shard_files(path,name):
+    """
+    Sorted list of the shard files of the named column in the directory path
+    """
+    prefix = name + '.'
+    return sorted(os.path.join(path,f) for f in os.listdir(path) if f.startswith(prefix) and f.endswith('.npy') \
+                  and f[len(prefix):-4].isdigit())
+
+def load_shards(path,mmap_mode='r',concatenate=True):
+    """
+    Read the columns written by a ShardWriter. Only the rows recorded in the manifest are
+    read, so the rows of chunks that were not completed by a run that stopped are skipped.
+
+    Parameters
+    ----------
+    path : string
+        Directory of the shards
+    mmap_mode : string or None
+        Memory-map the shards with this mode instead of reading them, see numpy.load
+    concatenate : bool
+        Return every column as one array, which is a copy if the column has several shards.
+        If False, return the list of the arrays of the shards of every column.
+
+    Returns
+    -------
+    columns : dict
+        Arrays of the columns keyed by name
+    """
+    manifest = read_manifest(path)
+    rows = None if manifest is None else dict(manifest["shards"])
+    names = { f.split('.')[0] for f in os.listdir(path) if f.endswith('.npy') }
+    columns = dict()
+    for name in names:
+        shards = list()
+        for f in shard_files(path,name):
+            shard = int(f.split('.')[-2])
+            if rows is None:
+                shards.append(np.load(f,mmap_mode=mmap_mode))
+            elif shard in rows:
+                shards.append(np.load(f,mmap_mode=mmap_mode)[:rows[shard]])
+        if not len(shards):
+            continue
+        if concatenate:
+            columns[name] = shards[0] if len(shards) == 1 else np.concatenate(shards)
+        else:
+            columns[name] = shards
+    return columns
+
+
+class ShardWriter(object):
+    """
+    Records results from a multiprocessing.Queue as columns of fixed-width NumPy arrays
+
+    Every item in the queue is a triple (chunk,index,results), where chunk identifies a 
+    chunk of samples, index is the array of the indices of its samples and results is a
+    dict of arrays with one row per sample keyed by quantity, or a quadruple that adds the
+    digest of the controls of the chunk, which is recorded in the manifest. Each column is appended to
+    its own .npy file in the directory path, named after the column and the shard number,
+    such as value.00000.npy. The files are kept open and their headers are rewritten
+    whenever rows are appended, so they can be loaded, or memory-mapped, at any time with
+    load_shards. The rows are in the order in which the chunks are read, given by the
+    index column.
+
+    After every write, the manifest of the directory (see read_manifest) is replaced to
+    record the rows of the shard and the chunks written. A writer created for a directory
+    that has a manifest writes a new shard and adds to the manifest, so a run that stopped
+    can be resumed by skipping the completed chunks.
+
+    Attributes
+    ----------
+    path : string
+        Directory of the shards
+    shard : unsigned int
+        Number of the shard written by this writer
+    buffersize : unsigned int
+        Number of rows to collect before writing them
+    interval : float
+        Maximum time in seconds between the arrival of a result and its writing
+    rows : unsigned int
+        Number of rows written
+    manifest : dict
+        Contents of the manifest
+    """
+
+    def __init__(self,path,quantities,buffersize=1024,interval=60.0,total=None,shard=None,metadata=None):
+        """
+        Create a ShardWriter object that will read from a multiprocessing.Queue in a
+        watcher process until it reads None, or that is given results with add() and
+        closed with close().
+
+        Parameters
+        ----------
+        path : string
+            Directory of the shards, which is created if needed
+        quantities : list of strings
+            Names of the quantities to be recorded
+        buffersize : unsigned int
+            Number of rows to collect before writing them
+        interval : float
+            Maximum time in seconds between the arrival of a result and its writing
+        total : unsigned int
+            Number of rows expected. Used for reporting progress.
+        shard : unsigned int
+            Number of the shard to write, by default one more than the last shard in path
+        metadata : dict
+            Entries stored in the manifest. Entries that are already in the manifest of
+            path must have the same values.
+
+        Raises
+        ------
+        ValueError
+            If the manifest of path records other quantities or metadata
+
+        Example
+        -------
+
+        >>> import multiprocessing as mp
+        >>> writer = ShardWriter('output',["Value"])
+        >>> qresults = mp.Queue()
+        >>> watcher = mp.Process(target=writer.read,args=(qresults,))
+        >>> watcher.start()
+
+        # Run some processes that write to qresults
+
+        >>> qresults.put(None)
+        >>> watcher.join()
+        >>> columns = load_shards('output')
+
+        """
+        os.makedirs(path,exist_ok=True)
+        self.path = path
+        self.names = ["index"] + [column_name(q) for q in quantities]
+        self.buffersize = buffersize
+        self.interval = interval
+        self.total = total
+        metadata = dict() if metadata is None else metadata
+
+        self.manifest = read_manifest(path)
+        if self.manifest is None:
+            self.manifest = { "quantities" : self.names[1:], "shards" : list(), "completed" : list(), 
+                              "digests" : dict() }
+        elif self.manifest["quantities"] != self.names[1:]:
+            raise ValueError("The results in {0} are of the quantities {1}".format(path,self.manifest["quantities"]))
+        for key, value in metadata.items():
+            if key in self.manifest and self.manifest[key] != value:
+                raise ValueError("The results in {0} were computed with {1} = {2}".format(path,key,self.manifest[key]))
+            self.manifest[key] = value
+
+        if shard is None:
+            shards = [int(f.split('.')[-2]) for f in shard_files(path,"index")]
+            shard = max(shards)+1 if len(shards) else 0
+        self.shard = shard
+        self.rows = 0
+        self.files = dict()
+        self.dtypes = dict()
+        self.buffer = list()
+        self.deadline = None
+
+    def shard_filename(self,name):
+        return os.path.join(self.path,"{0}.{1:05d}.npy".format(name,self.shard))
+
+    def completed(self):
+        """
+        Set of the identifiers of the chunks written to the directory
+        """
+        return { k for first, last in self.manifest["completed"] for k in range(first,last) }
+
+    def digest(self,chunk):
+        """
+        Digest of the controls of a written chunk, or None if it was not recorded
+        """
+        return self.manifest.get("digests",dict()).get(str(chunk))
+
+    def read(self,q):
+        """
+        Read results from a queue and write them when the buffer holds buffersize rows or
+        its oldest result arrived interval seconds ago, until None is read
+
+        Parameters
+        ----------
+        q : multiprocessing.Queue
+
+        """
+        import queue
+        from time import monotonic
+
+        print("\n\nCompute Progress:")
+        print("0.00%")
+
+        try:
+            while True:
+                try:
+                    timeout = None if self.deadline is None else max(0.0,self.deadline-monotonic())
+                    item = q.get(timeout=timeout)
+                except queue.Empty:
+                    item = False
+                if item is None:
+                    break
+                if self.add(item):
+                    print("{:.2%}".format(self.rows/self.total) if self.total else self.rows)
+        finally:
+            self.close()
+
+    def add(self,item=False):
+        """
+        Add the results (chunk,index,results[,digest]) of a chunk to the buffer and write the buffer
+        if it holds buffersize rows or its oldest result arrived interval seconds ago. 
+        Returns whether the buffer was written.
+        """
+        from time import monotonic
+        if item is not False:
+            self.buffer.append(item)
+            if self.deadline is None:
+                self.deadline = monotonic() + self.interval
+        buffered = sum(len(item[1]) for item in self.buffer)
+        if buffered >= self.buffersize or (self.deadline is not None and monotonic() >= self.deadline):
+            self.write_buffer()
+            return True
+        return False
+
+    def close(self):
+        """
+        Write the buffer and close the files
+        """
+        self.write_buffer()
+        for f in self.files.values():
+            f.close()
+        self.files = dict()
+
+    def write_buffer(self):
+        """
+        Append the buffered rows to the column files, update their headers and record them
+        in the manifest
+        """
+        self.deadline = None
+        if not len(self.buffer):
+            return
+        columns = { "index" : np.concatenate([item[1] for item in self.buffer]) }
+        for name in self.names[1:]:
+            columns[name] = np.concatenate([item[2][name] for item in self.buffer])
+        chunks = [int(item[0]) for item in self.buffer]
+        digests = { str(int(item[0])) : item[3] for item in self.buffer if len(item) > 3 }
+        self.buffer = list()
+        rows = self.rows + len(columns["index"])
+        for name, X in columns.items():
+            if name not in self.files:
+                self.files[name] = open(self.shard_filename(name),'wb')
+                self.dtypes[name] = (X.dtype,X.shape[1:])
+            dtype, shape = self.dtypes[name]
+            assert( X.shape[1:] == shape )
+            f = self.files[name]
+            f.seek(0,os.SEEK_END)
+            if f.tell() == 0:
+                f.write(npy_header(dtype,(0,)+shape))
+            f.write(np.ascontiguousarray(X,dtype=dtype).tobytes())
+            f.seek(0)
+            f.write(npy_header(dtype,(rows,)+shape))
+            f.flush()
+        self.rows = rows
+        shards = dict(self.manifest["shards"])
+        shards[self.shard] = rows
+        self.manifest["shards"] = sorted([k, n] for k, n in shards.items())
+        self.manifest["completed"] = merge_ranges(self.manifest["completed"],chunks)
+        if len(digests):
+            self.manifest.setdefault("digests",dict()).update(digests)
+        self.write_manifest()
+
+    def write_manifest(self):
+        """
+        Replace the manifest of the directory, atomically, after the shards are written to disk
+        """
+        import json
+        for f in self.files.values():
+            os.fsync(f.fileno())
+        filename = os.path.join(self.path,"manifest.json")
+        with open(filename + ".tmp",'w') as f:
+            json.dump(self.manifest,f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(filename + ".tmp",filename)
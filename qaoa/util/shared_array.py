@@ -0,0 +1,114 @@
+import numpy as np
+
+class SharedArray(object):
+
+    """
+    Array stored in a multiprocessing.shared_memory block or in a .npy file that is
+    pickled by reference
+
+    Unpickling a SharedArray, as done by worker processes that receive it, attaches to
+    the same block or maps the same file instead of copying the data, so every process
+    reads the one copy held by the operating system. The array is writable in every
+    process, but must be treated as read-only once shared: writes to a shared memory
+    block are seen by every process and writes to a mapped file are private to the
+    process that makes them.
+
+    The process that creates a shared memory block owns it and must release it with
+    unlink() when the workers are done. Files are left in place and may be mapped by
+    later runs.
+
+    >>> S = SharedArray.copy(d)
+    >>> S.array        # View of the block, also in worker processes
+    >>> S.unlink()
+    """
+
+    def __init__(self,shape,dtype,name=None,filename=None):
+        """
+        Attach to the shared memory block with the given name or map the given file. Use
+        SharedArray.empty or SharedArray.copy to create a new array.
+        """
+        assert( (name is None) != (filename is None) )
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.name = name
+        self.filename = filename
+        self.owner = False
+        self.attach()
+
+    def attach(self):
+        """
+        Internally-used method that creates the view of the block or of the file
+        """
+        if self.name is not None:
+            from multiprocessing.shared_memory import SharedMemory
+            self.shm = SharedMemory(self.name)
+            self.array = np.ndarray(self.shape,self.dtype,buffer=self.shm.buf)
+        else:
+            # Copy-on-write mapping, so that the array is writable and the kernels need no
+            # read-only specializations. The pages are shared as long as they are not written
+            self.shm = None
+            self.array = np.asarray(np.load(self.filename,mmap_mode='c'))
+            assert( self.array.shape == self.shape and self.array.dtype == self.dtype )
+
+    @classmethod
+    def empty(cls,shape,dtype=float):
+        """
+        Create an uninitialized array in a new shared memory block owned by this process
+        """
+        from multiprocessing.shared_memory import SharedMemory
+        dtype = np.dtype(dtype)
+        shape = (shape,) if np.isscalar(shape) else tuple(shape)
+        S = cls.__new__(cls)
+        S.shm = SharedMemory(create=True,size=max(1,int(np.prod(shape))*dtype.itemsize))
+        S.shape, S.dtype, S.name, S.filename = shape, dtype, S.shm.name, None
+        S.array = np.ndarray(shape,dtype,buffer=S.shm.buf)
+        S.owner = True
+        return S
+
+    @classmethod
+    def copy(cls,a,filename=None):
+        """
+        Create a shared copy of the array a in a new shared memory block or, if a filename
+        is given, write it to that .npy file and map it
+        """
+        if filename is None:
+            S = cls.empty(a.shape,a.dtype)
+            S.array[...] = a
+            return S
+        with open(filename,'wb') as f:
+            np.save(f,a)
+        return cls(a.shape,a.dtype,filename=filename)
+
+    def __getstate__(self):
+        return { "shape" : self.shape, "dtype" : self.dtype, "name" : self.name, "filename" : self.filename }
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self.owner = False
+        self.attach()
+
+    def __deepcopy__(self,memo):
+        return self
+
+    def close(self):
+        """
+        Detach this process from the shared memory block. The block stays mapped while other
+        views of the array are alive.
+        """
+        if self.shm is not None:
+            self.array = None
+            try:
+                self.shm.close()
+                self.shm = None
+            except BufferError:
+                pass
+
+    def unlink(self):
+        """
+        Free the shared memory block if this process created it, once every process has
+        detached from it, and detach this process
+        """
+        if self.owner:
+            self.shm.unlink()
+            self.owner = False
+        self.close()
@@ -36,7 +36,7 @@ class SineInterp(object):
         self.dim = len(obj) # Get number of circuit stages (dimension of optimization space)
         self.theta = np.array([ (np.pi/2)*(np.array(k)+1)/(self.ni+1) for k in \
                                 itertools.product(range(ni),repeat=self.dim) ])
-        self.F = self.to_ncube(np.array([obj.value(theta) for theta in self.theta]))
+        self.F = self.to_ncube(obj.value_batch(self.theta))
         from scipy.fft import idstn
         self.Fhat = idstn(self.F,type=1)
 
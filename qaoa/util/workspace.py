@@ -0,0 +1,74 @@
+import numpy as np
+
+def aligned_zeros(num_vectors,N,dtype=complex,alignment=64):
+    """
+    Allocate num_vectors contiguous vectors of length N with every vector starting on an
+    alignment-byte boundary
+
+    The vectors are the rows of one array. Rows shorter than the alignment are padded,
+    so the returned array is a view whose row stride may exceed its row length.
+
+    Returns
+    -------
+    V : numpy.ndarray
+        Zero array of shape (num_vectors,N)
+    """
+    dtype = np.dtype(dtype)
+    assert( alignment % dtype.itemsize == 0 )
+    stride = -(-N*dtype.itemsize//alignment)*alignment//dtype.itemsize
+    buf = np.zeros(num_vectors*stride*dtype.itemsize+alignment,dtype=np.uint8)
+    offset = -buf.ctypes.data % alignment
+    V = buf[offset:offset+num_vectors*stride*dtype.itemsize].view(dtype)
+    return V.reshape(num_vectors,stride)[:,:N]
+
+def is_aligned(v,alignment=64):
+    """
+    Indicates whether the first element of v is on an alignment-byte boundary
+    """
+    return v.ctypes.data % alignment == 0
+
+
+class Workspace(object):
+
+    """
+    Arena of scratch vectors shared by every operator and circuit stage with the same
+    number of qubits and data type
+
+    A scratch vector only holds intermediate results within a single apply or derivative
+    computation, so one vector per user slot is enough for any number of circuits. The
+    slots in use are
+
+        "stage"     : UnitaryStage.work
+        "kronecker" : Kronecker.work
+
+    Users of the same slot must never hold their scratch vector across a call to
+    another user of that slot. The arena is not shared between processes, but is not
+    safe to use from several threads.
+    """
+
+    arena = dict()
+
+    @classmethod
+    def scratch(cls,nq,dtype=complex,slot="stage"):
+        """
+        Return the aligned scratch vector of length 2**nq for the given slot, allocating
+        it on first use
+        """
+        key = (nq,np.dtype(dtype),slot)
+        if key not in cls.arena:
+            cls.arena[key] = aligned_zeros(1,1<<nq,dtype)[0]
+        return cls.arena[key]
+
+    @classmethod
+    def nbytes(cls):
+        """
+        Total size of the scratch vectors in the arena
+        """
+        return sum(v.nbytes for v in cls.arena.values())
+
+    @classmethod
+    def release(cls):
+        """
+        Drop every scratch vector. Objects that still hold one keep it alive.
+        """
+        cls.arena.clear()
@@ -0,0 +1,39 @@
+import qaoa
+import numpy as np
+
+
+def check_batch_evaluation(obj,B,tol):
+    """
+    Compare batched objective values and gradients against evaluating
+    the circuit at one control vector at a time
+    """
+    theta = np.random.rand(B,obj.num_stages)*np.pi
+    values = obj.value_batch(theta,batch_size=B//2+1)
+    gradients = obj.gradient_batch(theta,batch_size=B//2+1)
+    for b in range(B):
+        assert( np.abs(values[b]-obj.value(theta[b])) < tol )
+        assert( np.linalg.norm(gradients[b]-obj.gradient(theta[b])) < tol )
+
+def test_batch_evaluation():
+    obj = qaoa.circuit.load_maxcut(nvert=6,nlayers=3)
+    check_batch_evaluation(obj,7,1e-10)
+
+    # The default batch size fits the workspace in batch_memory bytes, and the workspace
+    # of the first batch is reused by the smaller last batch
+    obj = qaoa.circuit.load_maxcut(nvert=6,nlayers=3)
+    obj.batch_memory = 6*obj.psi0.nbytes
+    assert( obj.default_batch_size(2) == 3 and obj.default_batch_size(obj.num_stages+2) == 1 )
+    theta = np.random.rand(7,obj.num_stages)*np.pi
+    values = obj.value_batch(theta)
+    work = obj.batch_work
+    assert( work.nbytes == obj.batch_memory )
+    obj.value_batch(theta[:1])
+    assert( obj.batch_work is work )
+    gradients = obj.gradient_batch(theta)
+    assert( obj.batch_work.nbytes <= (obj.num_stages+2)*obj.psi0.nbytes )
+    for b in range(len(theta)):
+        assert( np.abs(values[b]-obj.value(theta[b])) < 1e-10 )
+        assert( np.linalg.norm(gradients[b]-obj.gradient(theta[b])) < 1e-10 )
+
+if __name__ == '__main__':
+    test_batch_evaluation()
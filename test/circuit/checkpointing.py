@@ -0,0 +1,78 @@
+import qaoa
+import numpy as np
+from numpy.linalg import norm
+
+
+def check_checkpointing(obj,ref,tol):
+    """
+    Compare a checkpointed circuit with one that stores every state
+    """
+    L = ref.num_stages
+    for k in range(2):
+        theta = np.random.rand(L)*np.pi
+        dtheta = np.random.rand(L)
+        assert( np.abs(obj.value(theta)-ref.value(theta)) < tol )
+        assert( norm(obj.gradient(theta)-ref.gradient(theta)) < tol )
+        value, grad = obj.value_and_gradient(theta)
+        assert( np.abs(value-ref.value(theta)) < tol )
+        assert( norm(grad-ref.gradient(theta)) < tol )
+        assert( norm(obj.hess_vec(theta,dtheta)-ref.hess_vec(theta,dtheta)) < tol )
+        assert( norm(obj.gradient(theta)-ref.gradient(theta)) < tol )
+
+def test_checkpointing():
+    nq, p = 6, 5
+    tol = 1e-10
+    C = qaoa.operators.IsingHamiltonian(graph=qaoa.util.graph.load(3,nq))
+    ref = qaoa.circuit.QAOACircuit(p,C)
+    assert( ref.memory_usage()['recomputed_stages'] == 0 )
+
+    for checkpoints in ("sqrt",7,6,10,100):
+        obj = qaoa.circuit.QAOACircuit(p,C,checkpoints=checkpoints)
+        usage = obj.memory_usage()
+        if checkpoints != "sqrt":
+            assert( usage['stored_states'] <= checkpoints )
+        assert( usage['num_checkpoints']*usage['segment_length'] < 2*p )
+        assert( (usage['segment_length']+usage['num_checkpoints'])*usage['segment_length'] >= 2*p )
+        check_checkpointing(obj,ref,tol)
+        assert( obj.memory_usage()['bytes'] < ref.memory_usage()['bytes'] )
+
+    assert( qaoa.circuit.QAOACircuit(p,C,checkpoints=100).memory_usage()['recomputed_stages'] == 0 )
+
+    D = qaoa.operators.SumSigmaXOperator(nq,backend="walsh")
+    check_checkpointing(qaoa.circuit.QAOACircuit(p,C,D,checkpoints="sqrt"),qaoa.circuit.QAOACircuit(p,C,D),tol)
+
+    try:
+        qaoa.circuit.QAOACircuit(p,C,checkpoints=5)
+        assert(False)
+    except ValueError:
+        pass
+
+def test_uncompute():
+    nq, p = 6, 5
+    tol = 1e-10
+    C = qaoa.operators.IsingHamiltonian(graph=qaoa.util.graph.load(3,nq))
+    for D in (None,qaoa.operators.SumSigmaXOperator(nq,backend="walsh")):
+        obj = qaoa.circuit.QAOACircuit(p,C,D,checkpoints="uncompute")
+        assert( obj.memory_usage()['vectors'] == 4 )
+        check_checkpointing(obj,qaoa.circuit.QAOACircuit(p,C,D),tol)
+        assert( obj.drift < obj.drift_tolerance )
+
+    # The memory does not depend on the depth
+    p = 100
+    obj = qaoa.circuit.QAOACircuit(p,C,checkpoints="uncompute")
+    ref = qaoa.circuit.QAOACircuit(p,C,checkpoints="sqrt")
+    theta = np.random.rand(2*p)
+    assert( obj.memory_usage()['vectors'] == 4 )
+    assert( norm(obj.gradient(theta)-ref.gradient(theta)) < tol )
+    assert( obj.drift < obj.drift_tolerance )
+
+    import warnings
+    obj.drift_tolerance = 0
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter("always")
+        obj.gradient(theta)
+        assert( len(w) == 1 and issubclass(w[0].category,RuntimeWarning) )
+
+if __name__ == '__main__':
+    test_checkpointing()
+    test_uncompute()
@@ -0,0 +1,45 @@
+import qaoa
+import numpy as np
+from numpy.linalg import norm
+
+
+def check_compiled_circuit(obj,ref,tol):
+    """
+    Compare the compiled evaluation of a QAOACircuit with the evaluation by its stages
+    """
+    p = ref.num_stages//2
+    for k in range(3):
+        theta = np.random.rand(2*p)*np.pi
+        dtheta = np.random.rand(2*p)
+        assert( np.abs(obj.value(theta)-ref.value(theta)) < tol )
+        assert( norm(obj.gradient(theta)-ref.gradient(theta)) < tol )
+        value, grad = obj.value_and_gradient(theta)
+        assert( np.abs(value-ref.value(theta)) < tol )
+        assert( norm(grad-ref.gradient(theta)) < tol )
+        assert( norm(obj.hess_vec(theta,dtheta)-ref.hess_vec(theta,dtheta)) < tol )
+    obj.reset_count()
+    assert( norm(obj.hessian(theta)-ref.hessian(theta)) < tol )
+    assert( obj.count["hess_vec"] == 2*p )
+
+def test_compiled_circuit():
+    nq, p = 8, 3
+    tol = 1e-10
+    G = qaoa.util.graph.load(3,nq)
+    for C in (qaoa.operators.IsingHamiltonian(graph=G), qaoa.operators.IsingHamiltonian(graph=G,compact=True),
+              qaoa.operators.DiagonalOperator(np.random.randn(1<<nq))):
+        obj = qaoa.circuit.QAOACircuit(p,C,compiled=True)
+        ref = qaoa.circuit.QAOACircuit(p,C,fuse_layers=False)
+        check_compiled_circuit(obj,ref,tol)
+
+    C = qaoa.operators.IsingHamiltonian(graph=G)
+    obj = qaoa.circuit.QAOACircuit(p,C,dtype=np.complex64,compiled=True)
+    check_compiled_circuit(obj,qaoa.circuit.QAOACircuit(p,C),1e-4)
+
+    try:
+        qaoa.circuit.QAOACircuit(p,C,qaoa.operators.SumSigmaXOperator(nq,backend="walsh"),compiled=True)
+        assert(False)
+    except ValueError:
+        pass
+
+if __name__ == '__main__':
+    test_compiled_circuit()
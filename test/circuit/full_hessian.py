@@ -0,0 +1,41 @@
+import qaoa
+import numpy as np
+from numpy.linalg import norm
+
+
+def check_full_hessian(obj,tol,batch_sizes=(None,1,3)):
+    """
+    Compare the Hessian computed from blocks of state sensitivities with the one 
+    assembled from a Hessian-vector product per control
+    """
+    L = obj.num_stages
+    theta = np.random.rand(L)*np.pi
+    H = np.array([obj.hess_vec(theta,e) for e in np.eye(L)])
+    for batch_size in batch_sizes:
+        Hb = obj.hessian(theta,batch_size)
+        assert( norm(Hb-H) < tol*norm(H) )
+
+def test_full_hessian():
+    nq, p = 6, 3
+    tol = 1e-10
+    G = qaoa.util.graph.load(3,nq)
+    C = qaoa.operators.IsingHamiltonian(graph=G)
+    Cm = qaoa.operators.MatrixFreeIsingHamiltonian(graph=G)
+    W = qaoa.operators.SumSigmaXOperator(nq,backend="walsh")
+    for obj in (qaoa.circuit.QAOACircuit(p,C), qaoa.circuit.QAOACircuit(p,C,W),
+                qaoa.circuit.QAOACircuit(p,Cm,fuse_layers=False),
+                qaoa.circuit.QAOACircuit(1,C), qaoa.circuit.QAOACircuit(p,C,checkpoints="sqrt")):
+        check_full_hessian(obj,tol)
+    check_full_hessian(qaoa.circuit.QAOACircuit(p,C,dtype=np.complex64),1e-4,(None,2))
+
+    # The Hessian is the same whether or not the circuit states are already computed
+    obj = qaoa.circuit.QAOACircuit(p,C)
+    theta = np.random.rand(2*p)
+    H = obj.hessian(theta)
+    assert( norm(H-H.T) == 0 )
+    obj.gradient(theta+1)
+    assert( norm(obj.hessian(theta)-H) < tol*norm(H) )
+    assert( obj.count['hessian'] == 2 and obj.count['hess_vec'] == 0 )
+
+if __name__ == '__main__':
+    test_full_hessian()
@@ -0,0 +1,71 @@
+import qaoa
+import numpy as np
+from numpy.linalg import norm
+
+
+def check_layer_propagator(C,tol,tile_bits=None):
+    """
+    Compare a fused layer and its adjoint with the product of the matrices of its two
+    half-steps
+    """
+    nq = C.num_qubits()
+    D = qaoa.operators.SumSigmaXOperator(nq,tile_bits=tile_bits)
+    U = qaoa.operators.QAOALayerPropagator(C.propagator(0.3),D.propagator(-0.8))
+    M = U.as_matrix()
+    v = np.random.randn(1<<nq) + 1j * np.random.randn(1<<nq)
+    u = np.zeros(1<<nq,dtype=complex)
+    U.apply(v,u)
+    assert( norm(u-M@v) < tol*norm(v) )
+    U.apply_adjoint(v,u)
+    assert( norm(u-M.conj().T@v) < tol*norm(v) )
+    u[:] = v
+    U.apply(u,u)
+    U.apply_adjoint(u,u)
+    assert( norm(u-v) < tol*norm(v) )
+
+def check_fused_layers(C,p,tol,tile_bits=None):
+    """
+    Compare a QAOACircuit that applies fused layers with one that applies every stage
+    separately, including the Hessian-vector products computed by the stages after the
+    fused sweeps
+    """
+    obj = qaoa.circuit.QAOACircuit(p,C,qaoa.operators.SumSigmaXOperator(C.num_qubits(),tile_bits=tile_bits))
+    ref = qaoa.circuit.QAOACircuit(p,C,fuse_layers=False)
+    assert( obj.fused and not ref.fused )
+    theta = np.random.rand(2*p)*np.pi
+    dtheta = np.random.rand(2*p)
+    for k in range(3):
+        assert( np.abs(obj.value(theta)-ref.value(theta)) < tol )
+        assert( norm(obj.gradient(theta)-ref.gradient(theta)) < tol )
+        value, grad = obj.value_and_gradient(theta)
+        assert( np.abs(value-ref.value(theta)) < tol )
+        assert( norm(grad-ref.gradient(theta)) < tol )
+        assert( norm(obj.hess_vec(theta,dtheta)-ref.hess_vec(theta,dtheta)) < tol )
+        assert( norm(obj.gradient(theta)-ref.gradient(theta)) < tol )
+        # Change the controls of one layer only so that earlier states are reused
+        theta[2*(k%p)+1] += 0.1
+
+def test_fused_layers():
+    nq = 8
+    tol = 1e-10
+    G = qaoa.util.graph.load(3,nq)
+    C = qaoa.operators.IsingHamiltonian(graph=G)
+    Cw = qaoa.operators.DiagonalOperator(np.random.randn(1<<nq))
+    # Disable the tabulated phases, as for diagonals with too many distinct values
+    Cw._levels = None
+    assert( C.spectrum_levels() is not None and Cw.spectrum_levels() is None )
+
+    # Tiles smaller than the state exercise the passes over the high qubits
+    for tile_bits in (3,None):
+        for A in (C,Cw):
+            check_layer_propagator(A,tol,tile_bits)
+            check_fused_layers(A,3,tol,tile_bits)
+    assert( qaoa.operators.SumSigmaXOperator(nq,tile_bits=3).propagator().tiling() == (3,6) )
+    check_fused_layers(C,1,tol)
+
+    D = qaoa.operators.SumSigmaXOperator(nq,backend="walsh")
+    assert( not qaoa.circuit.QAOACircuit(2,C,D).fused )
+    assert( not qaoa.circuit.QAOACircuit(2,qaoa.operators.MatrixFreeIsingHamiltonian(graph=G)).fused )
+
+if __name__ == '__main__':
+    test_fused_layers()
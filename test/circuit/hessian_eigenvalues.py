@@ -0,0 +1,57 @@
+import qaoa
+import numpy as np
+from scipy.optimize import minimize
+
+
+def check_extreme_eigs(obj,theta,tol):
+    """
+    Compare the Lanczos estimates of the smallest Hessian eigenvalues with those of the 
+    dense Hessian
+    """
+    L = obj.num_stages
+    E = np.linalg.eigvalsh(obj.hessian(theta))
+    scale = np.abs(E).max()
+
+    # Converged estimates of the smallest eigenvalues
+    eigs, residuals = obj.hess_extreme_eigs(theta,3,tol=1e-10,stop_on_sign=False)
+    assert( len(eigs) == 3 and np.all(np.diff(eigs) >= 0) )
+    assert( np.all(np.abs(eigs-E[:3]) < tol*scale) )
+    assert( np.all(residuals < tol*scale) )
+
+    # The smallest Ritz value is an upper bound of the smallest eigenvalue with the same sign
+    obj.reset_count()
+    eigs, residuals = obj.hess_extreme_eigs(theta,1)
+    assert( eigs[0] >= E[0]-tol*scale and np.sign(eigs[0]) == np.sign(E[0]) )
+    assert( 0 < obj.count['hess_vec'] <= L )
+    return obj.count['hess_vec']
+
+def test_hess_extreme_eigs():
+    nq, p = 6, 4
+    tol = 1e-6
+    C = qaoa.operators.IsingHamiltonian(graph=qaoa.util.graph.load(3,nq))
+    obj = qaoa.circuit.QAOACircuit(p,C)
+
+    # A random point is almost surely a saddle point, identified after a few products
+    theta = np.random.rand(2*p)*np.pi
+    if np.linalg.eigvalsh(obj.hessian(theta))[0] < 0:
+        assert( check_extreme_eigs(obj,theta,tol) < 2*p )
+
+    result = minimize(obj.value_and_gradient,theta,jac=True,method="BFGS",options={'gtol':1e-8})
+    check_extreme_eigs(obj,result.x,tol)
+
+    check_extreme_eigs(qaoa.circuit.QAOACircuit(p,C,checkpoints="sqrt"),theta,tol)
+
+    # A positive Ritz value with a small residual does not end the iteration, even if the
+    # starting vector is almost orthogonal to the eigenvector of the negative eigenvalue
+    while np.linalg.eigvalsh(obj.hessian(theta))[0] >= 0:
+        theta = np.random.rand(2*p)*np.pi
+    E, V = np.linalg.eigh(obj.hessian(theta))
+    eigs, residuals = obj.hess_extreme_eigs(theta,1,v0=V[:,-1]+1e-3*V[:,0])
+    assert( eigs[0] < 0 )
+
+    # At most maxiter products are computed
+    eigs, residuals = obj.hess_extreme_eigs(theta,2,maxiter=1,stop_on_sign=False)
+    assert( len(eigs) == 1 )
+
+if __name__ == '__main__':
+    test_hess_extreme_eigs()
@@ -0,0 +1,63 @@
+import qaoa
+import numpy as np
+from numpy.linalg import norm
+
+
+def state_jacobian(obj,theta,h=1e-5):
+    """
+    Central finite differences of the final state of a circuit with respect to the controls
+    """
+    def state(x):
+        obj.set_control(x)
+        return np.copy(obj.stage[-2].psi())
+    L = len(theta)
+    return state(theta), np.array([(state(theta+h*e)-state(theta-h*e))/(2*h) for e in np.eye(L)]).T
+
+def check_metric_tensor(obj,tol,batch_sizes=(None,1,3)):
+    """
+    Compare the metric tensor with the one computed from the finite difference Jacobian
+    of the final state
+    """
+    L = obj.num_stages
+    theta = np.random.rand(L)*np.pi
+    psi, J = state_jacobian(obj,theta)
+    Jpsi = J.conj().T @ psi
+    Gfd = np.real(J.conj().T @ J - np.outer(Jpsi,Jpsi.conj()))
+    for batch_size in batch_sizes:
+        G = obj.metric_tensor(theta,batch_size)
+        assert( norm(G-G.T) == 0 )
+        assert( norm(G-Gfd) < tol*norm(Gfd) )
+    return theta, G
+
+def test_metric_tensor():
+    nq, p = 6, 3
+    tol = 1e-7
+    C = qaoa.operators.IsingHamiltonian(graph=qaoa.util.graph.load(3,nq))
+    W = qaoa.operators.SumSigmaXOperator(nq,backend="walsh")
+    for obj in (qaoa.circuit.QAOACircuit(p,C), qaoa.circuit.QAOACircuit(p,C,W),
+                qaoa.circuit.QAOACircuit(1,C)):
+        theta, G = check_metric_tensor(obj,tol)
+        assert( np.all(np.linalg.eigvalsh(G) > -tol*norm(G)) )
+
+        # The natural gradient solves the metric system
+        x = obj.natural_gradient(theta)
+        assert( norm(G@x-obj.gradient(theta)) < 1e-8*norm(G)*norm(x) )
+        x = obj.natural_gradient(theta,0.5)
+        assert( norm(G@x+0.5*x-obj.gradient(theta)) < 1e-8*norm(G)*norm(x) )
+
+    # A mixer stage applied to the uniform superposition only changes its phase
+    D = qaoa.operators.SumSigmaXOperator(nq)
+    obj = qaoa.circuit.QuantumCircuit([D,C,D],C)
+    theta, G = check_metric_tensor(obj,tol)
+    assert( norm(G[0]) < tol )
+    x = obj.natural_gradient(theta)
+    assert( np.all(np.isfinite(x)) and np.abs(x[0]) < tol*norm(x) )
+
+    try:
+        qaoa.circuit.QAOACircuit(p,C,checkpoints="sqrt").metric_tensor(np.zeros(2*p))
+        assert(False)
+    except ValueError:
+        pass
+
+if __name__ == '__main__':
+    test_metric_tensor()
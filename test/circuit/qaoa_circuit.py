@@ -48,8 +48,8 @@ if __name__ == '__main__':
     opts = { 'gtol' : np.sqrt(np.finfo(float).eps), 'disp':True }
 
     # Compute a local minimizer 
-    result = minimize( obj.value, theta, method="trust-exact", 
-                       jac=obj.gradient, hess=obj.hessian, options=opts )
+    result = minimize( obj.value_and_gradient, theta, method="trust-exact", 
+                       jac=True, hess=obj.hessian, options=opts )
     H = result["hess"]
 
     E,V = np.linalg.eig(H)
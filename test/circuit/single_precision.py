@@ -0,0 +1,41 @@
+import qaoa
+import numpy as np
+
+
+def check_single_precision(obj,obj32,tol):
+    """
+    Compare the values, gradients and Hessian-vector products of a single precision
+    circuit with those of the same circuit in double precision
+    """
+    theta = np.random.rand(obj.num_stages)*np.pi
+    dtheta = np.random.rand(obj.num_stages)
+    assert( obj32.work.dtype == np.complex64 )
+    assert( np.abs(obj.value(theta)-obj32.value(theta)) < tol )
+    assert( np.linalg.norm(obj.gradient(theta)-obj32.gradient(theta)) < tol )
+    assert( np.linalg.norm(obj.hess_vec(theta,dtheta)-obj32.hess_vec(theta,dtheta)) < tol )
+    thetas = np.random.rand(3,obj.num_stages)*np.pi
+    assert( np.linalg.norm(obj.value_batch(thetas)-obj32.value_batch(thetas)) < tol )
+    assert( np.linalg.norm(obj.gradient_batch(thetas)-obj32.gradient_batch(thetas)) < tol )
+
+def test_single_precision():
+    tol = 1e-4
+    for compact in (False,True):
+        obj = qaoa.circuit.load_maxcut(nvert=8,nlayers=2,compact=compact)
+        obj32 = qaoa.circuit.load_maxcut(nvert=8,nlayers=2,compact=compact,dtype=np.complex64)
+        assert( obj32.A[-1].data.dtype == (np.int8 if compact else np.float32) )
+        check_single_precision(obj,obj32,tol)
+
+    C = qaoa.operators.MatrixFreeIsingHamiltonian(graph=qaoa.util.graph.load(3,8))
+    D = qaoa.operators.SumSigmaXOperator(8,backend="walsh")
+    obj = qaoa.circuit.QAOACircuit(2,C,D)
+    obj32 = qaoa.circuit.QAOACircuit(2,C,D,dtype=np.complex64)
+    check_single_precision(obj,obj32,tol)
+
+    try:
+        qaoa.circuit.QAOACircuit(1,C,dtype=float)
+        assert(False)
+    except TypeError:
+        pass
+
+if __name__ == '__main__':
+    test_single_precision()
@@ -0,0 +1,71 @@
+import qaoa
+import numpy as np
+from numpy.linalg import norm
+from qaoa.util import Workspace, aligned_zeros
+
+
+def check_layout(obj,ref,tol):
+    """
+    Compare a circuit with contiguous stage vectors with one that stores them as the
+    columns of one array
+    """
+    for stage in obj.stage[1:-1]:
+        for v in (stage._psi,stage._lam,stage._dpsi,stage._dlam):
+            assert( v.flags['C_CONTIGUOUS'] and v.ctypes.data % 64 == 0 )
+    theta = np.random.rand(obj.num_stages)*np.pi
+    dtheta = np.random.rand(obj.num_stages)
+    assert( np.abs(obj.value(theta)-ref.value(theta)) < tol )
+    assert( norm(obj.gradient(theta)-ref.gradient(theta)) < tol )
+    assert( norm(obj.hess_vec(theta,dtheta)-ref.hess_vec(theta,dtheta)) < tol )
+
+def test_aligned_zeros():
+    for dtype in (np.complex64,np.complex128):
+        for nq in range(5):
+            V = aligned_zeros(3,1<<nq,dtype)
+            assert( V.shape == (3,1<<nq) and V.dtype == dtype and not V.any() )
+            assert( all(v.ctypes.data % 64 == 0 and v.flags['C_CONTIGUOUS'] for v in V) )
+
+def test_state_layout():
+    nq, p = 6, 3
+    tol = 1e-10
+    C = qaoa.operators.IsingHamiltonian(graph=qaoa.util.graph.load(3,nq))
+    W = qaoa.operators.SumSigmaXOperator(nq,backend="walsh")
+    for D in (None,W):
+        for fuse_layers in (True,False):
+            check_layout(qaoa.circuit.QAOACircuit(p,C,D,fuse_layers=fuse_layers),
+                         qaoa.circuit.QAOACircuit(p,C,D,fuse_layers=fuse_layers,layout="strided"),tol)
+
+    # Circuits on the same number of qubits share the scratch vectors of their stages,
+    # and interleaved evaluations do not interfere
+    obj1 = qaoa.circuit.QAOACircuit(p,C,fuse_layers=False)
+    obj2 = qaoa.circuit.QAOACircuit(p+1,C,fuse_layers=False)
+    assert( obj1.stage[1].work is obj2.stage[-2].work )
+    assert( obj1.stage[1].work is Workspace.scratch(nq,complex,"stage") )
+    theta1, theta2 = np.random.rand(2*p), np.random.rand(2*p+2)
+    dtheta1, dtheta2 = np.random.rand(2*p), np.random.rand(2*p+2)
+    hv1 = obj1.hess_vec(theta1,dtheta1)
+    hv2 = obj2.hess_vec(theta2,dtheta2)
+    obj1.set_control(theta1+1)
+    obj2.set_control(theta2+1)
+    assert( norm(obj1.hess_vec(theta1,dtheta1)-hv1) < tol )
+    assert( norm(obj2.hess_vec(theta2,dtheta2)-hv2) < tol )
+
+    # So do the Kronecker products
+    Y = qaoa.operators.SumSigmaYOperator(nq)
+    U1, U2 = Y.propagator(0.3), Y.propagator(-1.1)
+    v = np.random.randn(1<<nq) + 1j*np.random.randn(1<<nq)
+    u1, u2 = np.zeros_like(v), np.zeros_like(v)
+    assert( U1.kronecker.vector_work(v) is U2.kronecker.vector_work(v) )
+    U1.apply(v,u1)
+    U2.apply(u1,u2)
+    assert( norm(u2-U2.as_matrix()@U1.as_matrix()@v) < tol*norm(v) )
+
+    try:
+        qaoa.circuit.QAOACircuit(p,C,layout="blocked")
+        assert(False)
+    except ValueError:
+        pass
+
+if __name__ == '__main__':
+    test_aligned_zeros()
+    test_state_layout()
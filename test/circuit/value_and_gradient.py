@@ -0,0 +1,39 @@
+import qaoa
+import numpy as np
+from scipy.optimize import minimize
+
+
+class CountingHamiltonian(qaoa.operators.DiagonalOperator):
+    """
+    DiagonalOperator that counts its applications
+    """
+    def __init__(self,d):
+        super().__init__(d)
+        self.num_apply = 0
+
+    def apply(self,v,Hv):
+        self.num_apply += 1
+        super().apply(v,Hv)
+
+def test_value_and_gradient():
+    nq, p = 6, 3
+    tol = 1e-12
+    obj = qaoa.circuit.load_maxcut(nvert=nq,nlayers=p)
+    C = CountingHamiltonian(np.copy(obj.A[-1].data))
+    objc = qaoa.circuit.QAOACircuit(p,C)
+
+    for k in range(3):
+        theta = np.random.rand(2*p)*np.pi
+        value, gradient = objc.value_and_gradient(theta)
+        assert( C.num_apply == k+1 )
+        assert( np.abs(value-obj.value(theta)) < tol )
+        assert( np.linalg.norm(gradient-obj.gradient(theta)) < tol )
+
+    theta = np.random.rand(2*p)*np.pi
+    res = minimize(objc.value_and_gradient,theta,jac=True,method="BFGS")
+    ref = minimize(obj.value,theta,jac=obj.gradient,method="BFGS")
+    assert( np.abs(res.fun-ref.fun) < 1e-8 )
+    assert( objc.count["gradient"] == objc.count["value"] )
+
+if __name__ == '__main__':
+    test_value_and_gradient()
@@ -0,0 +1,63 @@
+import qaoa
+import numpy as np
+
+
+def check_apply_block(A,B,tol,adjoint=False):
+    """
+    Compare the block application of an operator with column-by-column application
+    for both supported block layouts
+    """
+    m = len(A)
+    V = np.random.randn(m,B) + 1j*np.random.randn(m,B)
+    AV = np.zeros((m,B),dtype=complex)
+    Av = np.zeros(m,dtype=complex)
+    apply, apply_block = (A.apply_adjoint, A.apply_adjoint_block) if adjoint else \
+                         (A.apply, A.apply_block)
+    apply_block(V,AV)
+    for b in range(B):
+        apply(np.copy(V[:,b]),Av)
+        assert( np.linalg.norm(AV[:,b]-Av) < tol*np.linalg.norm(V[:,b]) )
+    VT = np.copy(V.T)
+    AVT = np.zeros((B,m),dtype=complex)
+    apply_block(VT,AVT)
+    assert( np.linalg.norm(AVT-AV.T) < tol*np.linalg.norm(V) )
+
+def check_propagator_apply_block(U,B,tol):
+    """
+    Compare the block application of a propagator with a different control for
+    every vector against applying it one vector at a time
+    """
+    m = len(U)
+    theta = np.random.rand(B)*np.pi
+    V = np.random.randn(m,B) + 1j*np.random.randn(m,B)
+    UV = np.zeros((m,B),dtype=complex)
+    Uv = np.zeros(m,dtype=complex)
+    for adjoint in (False,True):
+        if adjoint:
+            U.apply_adjoint_block(V,UV,theta)
+        else:
+            U.apply_block(V,UV,theta)
+        for b in range(B):
+            U.set_control(theta[b])
+            if adjoint:
+                U.apply_adjoint(np.copy(V[:,b]),Uv)
+            else:
+                U.apply(np.copy(V[:,b]),Uv)
+            assert( np.linalg.norm(UV[:,b]-Uv) < tol*np.linalg.norm(V[:,b]) )
+
+def test_apply_block():
+    nq = 6
+    B = 5
+    tol = 1e-10
+    C = qaoa.operators.DiagonalOperator(np.random.randn(1<<nq))
+    X = qaoa.operators.SumSigmaXOperator(nq)
+    Y = qaoa.operators.SumSigmaYOperator(nq)
+    K = qaoa.operators.Kronecker(np.random.randn(2,2),nq,dtype=complex)
+    for A in (C,X,Y,K):
+        check_apply_block(A,B,tol)
+    check_apply_block(K,B,tol,adjoint=True)
+    for A in (C,X):
+        check_propagator_apply_block(A.propagator(),B,tol)
+
+if __name__ == '__main__':
+    test_apply_block()
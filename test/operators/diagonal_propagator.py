@@ -10,9 +10,32 @@ def check_DiagonalPropagator_apply(num_qubits,tol):
     Ud = D.propagator(theta = np.random.rand(1)*np.pi/2)
     assert( Ud.check_apply(v,tol) )
 
+def check_DiagonalPropagator_levels(d,tol):
+    m = len(d)
+    v = np.random.randn(m) + 1j*np.random.randn(m)
+    u = np.zeros(m,dtype=complex)
+    D = qaoa.operators.DiagonalOperator(d)
+    theta = np.random.rand()*np.pi
+    Ud = D.propagator(theta)
+    assert( Ud.levels is not None )
+    Ud.apply(v,u)
+    assert( np.linalg.norm(u-np.exp(1j*theta*d)*v) < tol )
+    Ud.apply_adjoint(v,u)
+    assert( np.linalg.norm(u-np.exp(-1j*theta*d)*v) < tol )
+    V = np.random.randn(m,3) + 1j*np.random.randn(m,3)
+    U = np.zeros((m,3),dtype=complex)
+    theta = np.random.rand(3)*np.pi
+    Ud.apply_block(V,U,theta)
+    assert( np.linalg.norm(U-np.exp(1j*np.outer(d,theta))*V) < tol )
+
 def test_DiagonalPropagator():
     check_DiagonalPropagator_apply(8,1e-8)
 
+def test_DiagonalPropagator_levels():
+    m = 1 << 8
+    check_DiagonalPropagator_levels(np.random.randint(-5,7,m).astype(float),1e-10)
+    check_DiagonalPropagator_levels(np.random.choice([-0.5,0.25,1.75],m),1e-10)
+
 if __name__ == '__main__':
     test_DiagonalPropagator()
-
+    test_DiagonalPropagator_levels()
@@ -22,5 +22,66 @@ def test_IsingHamiltonian():
     assert( np.abs(norm(u)-norm(v))<tol )
     assert( norm(u-exact) < tol )
 
+def test_IsingHamiltonian_compact():
+
+    nq = 6
+    G = nx.random_regular_graph(3,nq)
+    h = np.random.randint(-3,4,nq)
+    J = np.triu(np.random.randint(-2,3,(nq,nq)),1)
+    Jw = [(i,j,float(J[i,j])) for i in range(nq) for j in range(i+1,nq)]
+
+    for kwargs in ({'graph' : G}, {'h' : h, 'J' : J}, {'nq' : nq, 'J' : Jw}):
+        C = qaoa.operators.IsingHamiltonian(**kwargs)
+        Cc = qaoa.operators.IsingHamiltonian(compact=True,**kwargs)
+        assert( Cc.data.dtype == np.int8 )
+        assert( np.all(Cc.data == C.data) )
+
+        v = np.random.randn(1<<nq) + 1j * np.random.randn(1<<nq)
+        u = np.zeros(1<<nq,dtype=complex)
+        uc = np.zeros(1<<nq,dtype=complex)
+        C.apply(v,u)
+        Cc.apply(v,uc)
+        assert( np.linalg.norm(u-uc) < 1e-12 )
+        assert( np.abs(C.expectation(v)-Cc.expectation(v)) < 1e-10 )
+        Uc = Cc.propagator(0.7)
+        Uc.apply(v,uc)
+        assert( np.linalg.norm(np.exp(0.7j*C.data)*v-uc) < 1e-10 )
+
+    try:
+        qaoa.operators.IsingHamiltonian(h=np.array((0.5,1.0)),compact=True)
+        assert(False)
+    except ValueError:
+        pass
+
+def reference_energies(nq,h,ei,ej,w):
+    z = 1-2*((np.arange(1<<nq)[:,None]>>(nq-1-np.arange(nq)))&1)
+    return z@h + sum(w[e]*z[:,ei[e]]*z[:,ej[e]] for e in range(len(w)))
+
+def test_IsingHamiltonian_build():
+
+    nq = 7
+    G = nx.random_regular_graph(4,nq)
+    h = np.random.randn(nq)
+    J = np.triu(np.random.randn(nq,nq),1)
+    hs = [(1,0.5),(4,-2.0)]
+    Js = [(0,3),(2,6),(1,5)]
+    Jw = [(0,3,0.25),(2,6,-1.0),(1,5,0.75)]
+
+    # Tiles smaller than the state exercise the couplings between tiles
+    for tile_bits in (3,None):
+        for kwargs in ({'graph' : G}, {'h' : h, 'J' : J}, {'h' : h}, {'J' : J}, {'nq' : nq, 'h' : hs},
+                       {'nq' : nq, 'h' : hs, 'J' : Js}, {'nq' : nq, 'J' : Jw}, {'h' : h, 'graph' : G}):
+            C = qaoa.operators.IsingHamiltonian(**kwargs,tile_bits=tile_bits)
+            assert( C.tile_bits == (3 if tile_bits else nq) )
+            exact = reference_energies(nq,C.h,C.ei,C.ej,C.w)
+            assert( np.linalg.norm(C.data-exact) < 1e-10 )
+
+    C = qaoa.operators.IsingHamiltonian(J=np.array(((0,3,-1),(0,0,-2),(0,0,0))))
+    assert( np.all(C.data == (0,6,-2,-4,-4,-2,6,0)) )
+    C = qaoa.operators.IsingHamiltonian(nq=4,h=[(0,1),(3,-1)])
+    assert( np.all(C.data == (0,2,0,2,0,2,0,2,-2,0,-2,0,-2,0,-2,0)) )
+
 if __name__ == '__main__':
     test_IsingHamiltonian()
+    test_IsingHamiltonian_compact()
+    test_IsingHamiltonian_build()
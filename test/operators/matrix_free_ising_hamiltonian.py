@@ -0,0 +1,65 @@
+import qaoa
+import numpy as np
+import networkx as nx
+from numpy.linalg import norm
+from copy import deepcopy
+
+def check_matrix_free(C,Cm,tol):
+    """
+    Compare a MatrixFreeIsingHamiltonian with the stored IsingHamiltonian it represents
+    """
+    m = len(C)
+    v = np.random.randn(m) + 1j * np.random.randn(m)
+    u = np.random.randn(m) + 1j * np.random.randn(m)
+    Cv = np.zeros(m,dtype=complex)
+    Cmv = np.zeros(m,dtype=complex)
+
+    assert( norm(Cm.diagonal()-C.data) < tol )
+    C.apply(v,Cv)
+    Cm.apply(v,Cmv)
+    assert( norm(Cv-Cmv) < tol*norm(v) )
+    assert( np.abs(C.conj_inner_product(u,v)-Cm.conj_inner_product(u,v)) < tol*norm(u)*norm(v) )
+    assert( np.abs(C.inner_product(u,v)-Cm.inner_product(u,v)) < tol*norm(u)*norm(v) )
+    assert( np.abs(C.true_minimum()-Cm.true_minimum()) < tol )
+    assert( np.abs(C.true_maximum()-Cm.true_maximum()) < tol )
+    assert( C.min_state() == Cm.min_state() )
+
+    for theta in (0.7,-1.3):
+        U = C.propagator(theta)
+        Um = Cm.propagator(theta)
+        U.apply(v,Cv)
+        Um.apply(v,Cmv)
+        assert( norm(Cv-Cmv) < tol*norm(v) )
+        U.apply_adjoint(v,Cv)
+        Um.apply_adjoint(v,Cmv)
+        assert( norm(Cv-Cmv) < tol*norm(v) )
+
+def test_MatrixFreeIsingHamiltonian():
+
+    nq = 8
+    tol = 1e-10
+    G = nx.random_regular_graph(3,nq)
+    h = np.random.randn(nq)
+    J = np.triu(np.random.randn(nq,nq),1)
+    hi = np.random.randint(-3,4,nq)
+    Ji = [(i,j,int(k)) for i in range(nq) for j in range(i+1,nq) for k in [np.random.randint(-2,3)] if k]
+
+    # Use tiles smaller than the state so that the tiled kernels are exercised
+    for kwargs in ({'graph' : G}, {'h' : h, 'J' : J}, {'nq' : nq, 'h' : hi, 'J' : Ji}):
+        C = qaoa.operators.IsingHamiltonian(**kwargs)
+        Cm = qaoa.operators.MatrixFreeIsingHamiltonian(**kwargs,tile_bits=3)
+        assert( Cm.tile() == 3 and deepcopy(Cm).tile() == 3 )
+        check_matrix_free(C,Cm,tol)
+
+    C = qaoa.operators.MatrixFreeIsingHamiltonian(graph=G)
+    assert( C.propagator().offset is not None )
+    D = qaoa.operators.SumSigmaXOperator(nq)
+    p = 3
+    theta = np.random.randn(2*p)
+    obj = qaoa.circuit.QAOACircuit(p,qaoa.operators.IsingHamiltonian(graph=G),D)
+    objm = qaoa.circuit.QAOACircuit(p,C,D)
+    assert( np.abs(obj.value(theta)-objm.value(theta)) < tol )
+    assert( norm(obj.gradient(theta)-objm.gradient(theta)) < tol )
+
+if __name__ == '__main__':
+    test_MatrixFreeIsingHamiltonian()
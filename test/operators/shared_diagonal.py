@@ -0,0 +1,66 @@
+import qaoa
+import numpy as np
+import os
+import pickle
+import tempfile
+from multiprocessing import get_context
+
+
+def circuit_value(obj,theta):
+    return obj.value(theta)
+
+def check_shared_diagonal(C,filename,tol):
+    """
+    Compare an operator and the circuits built with it before and after moving its
+    diagonal to shared memory or to a file, in this process and in a spawned worker
+    """
+    N = C.length
+    d = np.copy(C.data)
+    levels = C.spectrum_levels()
+    # The index of an integer diagonal is the diagonal itself
+    own_index = levels is not None and levels[0] is C.data
+    p = 2
+    theta = np.random.rand(2*p)
+    ref = qaoa.circuit.QAOACircuit(p,C).value(theta)
+
+    assert( C.share(filename) is C and C.shared is not None )
+    assert( np.array_equal(C.data,d) and C.data is C.shared[0].array )
+    if levels is not None:
+        assert( own_index == (C.shared[1] is None) )
+        assert( np.array_equal(C.spectrum_levels()[0],levels[0]) )
+    if filename is not None:
+        assert( os.path.exists(filename) )
+
+    # Only the handles of the shared arrays are pickled
+    C1 = pickle.loads(pickle.dumps(C))
+    assert( len(pickle.dumps(C)) < N and np.array_equal(C1.data,d) )
+    obj = qaoa.circuit.QAOACircuit(p,C)
+    assert( np.abs(obj.value(theta)-ref) < tol )
+    # The compiled circuit does not pickle its phases, which are built from C on first use
+    compiled = qaoa.circuit.QAOACircuit(p,C,compiled=True)
+    assert( np.abs(compiled.value(theta)-ref) < tol )
+    assert( len(pickle.dumps(compiled)) < len(pickle.dumps(obj)) + N )
+    with get_context("spawn").Pool(1) as pool:
+        assert( np.abs(pool.apply(circuit_value,(obj,theta))-ref) < tol )
+        assert( np.abs(pool.apply(circuit_value,(compiled,theta))-ref) < tol )
+
+    C1.release()
+    C.release()
+    assert( C.shared is None and np.array_equal(C.data,d) )
+    assert( np.abs(obj.value(theta+1)-qaoa.circuit.QAOACircuit(p,C).value(theta+1)) < tol )
+
+def test_shared_diagonal():
+    nq = 12
+    tol = 1e-12
+    G = qaoa.util.graph.load(3,nq)
+    Cw = qaoa.operators.DiagonalOperator(np.random.randn(1<<nq))
+    Cw._levels = None
+    with tempfile.TemporaryDirectory() as path:
+        for C, name in [(qaoa.operators.IsingHamiltonian(graph=G),"ising.npy"),
+                        (qaoa.operators.IsingHamiltonian(graph=G,compact=True),"compact.npy"),
+                        (Cw,"random.npy")]:
+            check_shared_diagonal(C,None,tol)
+            check_shared_diagonal(C,os.path.join(path,name),tol)
+
+if __name__ == '__main__':
+    test_shared_diagonal()
@@ -6,12 +6,34 @@ def test_SumSigmaXOperator_apply():
     m = 1<<nq
     v = np.random.randn(m)
     Xv = np.random.randn(m)
-    X = qaoa.operators.SumSigmaXOperator(m)
+    X = qaoa.operators.SumSigmaXOperator(nq)
     X.apply(v,Xv)
     err = Xv - X.as_matrix() @ v
     assert(np.linalg.norm(err)<1e-8)      
 
+def test_SumSigmaXOperator_walsh():
+    nq = 8
+    m = 1<<nq
+    u = np.random.randn(m) + 1j*np.random.randn(m)
+    v = np.random.randn(m) + 1j*np.random.randn(m)
+    Xv = np.zeros(m,dtype=complex)
+    X = qaoa.operators.SumSigmaXOperator(nq,backend="walsh")
+    X.apply(v,Xv)
+    M = X.as_matrix()
+    assert(np.linalg.norm(Xv - M @ v)<1e-8)
+    assert(np.abs(X.conj_inner_product(u,v) - u.conj() @ M @ v)<1e-8)
+    assert(np.abs(X.inner_product(u,v) - u @ M @ v)<1e-8)
+
+    # Blocks are applied with the stencil kernels, which give the same results
+    V = np.random.randn(m,3) + 1j*np.random.randn(m,3)
+    XV = np.zeros((m,3),dtype=complex)
+    X.apply_block(V,XV)
+    assert(np.linalg.norm(XV - M @ V)<1e-8)
+    U = X.propagator(0.4)
+    U.apply_block(V,XV)
+    assert(np.linalg.norm(XV - U.as_matrix() @ V)<1e-8)
+
 if __name__ == '__main__':
 
     test_SumSigmaXOperator_apply()
-
+    test_SumSigmaXOperator_walsh()
@@ -0,0 +1,43 @@
+import qaoa
+import numpy as np
+
+
+def check_SumSigmaXPropagator_apply(num_qubits,tile_bits,group_bits,tol,backend="stencil"):
+    m = 1 << num_qubits
+    X = qaoa.operators.SumSigmaXOperator(num_qubits,backend)
+    Ux = X.propagator(theta=np.random.rand()*np.pi)
+    Ux.tile_bits = tile_bits
+    Ux.group_bits = group_bits
+    M = Ux.as_matrix()
+    v = np.random.randn(m) + 1j*np.random.randn(m)
+    u = np.zeros(m,dtype=complex)
+
+    # Out-of-place
+    Ux.apply(v,u)
+    assert( np.linalg.norm(u-M@v) < tol*np.linalg.norm(v) )
+    Ux.apply_adjoint(v,u)
+    assert( np.linalg.norm(u-M.conj().T@v) < tol*np.linalg.norm(v) )
+
+    # In-place
+    u[:] = v
+    Ux.apply(u,u)
+    assert( np.linalg.norm(u-M@v) < tol*np.linalg.norm(v) )
+
+    # Block with a different control for each vector
+    B = 3
+    theta = np.random.rand(B)*np.pi
+    V = np.random.randn(m,B) + 1j*np.random.randn(m,B)
+    U = np.zeros((m,B),dtype=complex)
+    Ux.apply_block(V,U,theta)
+    for b in range(B):
+        Ux.set_control(theta[b])
+        assert( np.linalg.norm(U[:,b]-Ux.as_matrix()@V[:,b]) < tol*np.linalg.norm(V[:,b]) )
+
+def test_SumSigmaXPropagator():
+    check_SumSigmaXPropagator_apply(7,12,6,1e-10)
+    check_SumSigmaXPropagator_apply(7,2,2,1e-10)
+    check_SumSigmaXPropagator_apply(7,3,3,1e-10)
+    check_SumSigmaXPropagator_apply(7,3,3,1e-10,"walsh")
+
+if __name__ == '__main__':
+    test_SumSigmaXPropagator()
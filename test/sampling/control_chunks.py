@@ -0,0 +1,40 @@
+import numpy as np
+from qaoa.sampling import control_chunks
+
+
+def check_chunks(chunks,X,chunk_size):
+    """
+    Compare the chunks with the rows of X
+    """
+    chunks = list(chunks)
+    assert( all(len(Y) == chunk_size for Y in chunks[:-1]) and 0 < len(chunks[-1]) <= chunk_size )
+    assert( np.array_equal(np.concatenate(chunks),X) )
+
+def test_control_chunks():
+    nsamples, chunk_size = 23, 5
+    X = np.random.rand(nsamples,4)
+
+    # Functions are called only when their chunk is generated
+    calls = list()
+    def ctrlgen():
+        calls.append(len(calls))
+        return X[calls[-1]]
+    chunks = control_chunks(ctrlgen,nsamples,chunk_size)
+    assert( len(calls) == 0 )
+    first = next(chunks)
+    assert( len(calls) == chunk_size )
+    check_chunks([first,*chunks],X,chunk_size)
+
+    check_chunks(control_chunks(X,None,chunk_size),X,chunk_size)
+    check_chunks(control_chunks(X,10,chunk_size),X[:10],chunk_size)
+    check_chunks(control_chunks(iter(X),None,chunk_size),X,chunk_size)
+    check_chunks(control_chunks((x for x in X),12,chunk_size),X[:12],chunk_size)
+
+    try:
+        next(control_chunks(ctrlgen))
+        assert( False )
+    except ValueError:
+        pass
+
+if __name__ == '__main__':
+    test_control_chunks()
@@ -0,0 +1,81 @@
+import qaoa
+import numpy as np
+import json
+import os
+import tempfile
+from numpy.linalg import norm
+from qaoa.util.shard_writer import merge_ranges
+
+
+def test_objective_sampler():
+    nq, p = 6, 2
+    tol = 1e-12
+    obj = qaoa.circuit.QAOACircuit(p,qaoa.operators.IsingHamiltonian(graph=qaoa.util.graph.load(3,nq)))
+    X = np.random.rand(11,2*p)
+    options = ("Objective Value","Approximation Ratio","Gradient","Gradient Norm","Hessian Eigenvalues")
+
+    with qaoa.sampling.ObjectiveSampler(obj,num_threads=2,chunk_size=3) as sampler:
+        pool = sampler.pool
+        results = sampler.sample(X,*options)
+        # The workers are reused by later calls
+        frame = sampler(5)
+        assert( sampler.pool is pool )
+    assert( sampler.pool is None )
+
+    assert( results["grad"].shape == X.shape and results["heig"].shape == X.shape )
+    for k, x in enumerate(X):
+        value, grad = obj.value_and_gradient(x)
+        assert( np.abs(results["fval"][k]-value) < tol )
+        assert( np.abs(results["APR"][k]-value/obj.true_minimum()) < tol )
+        assert( norm(results["grad"][k]-grad) < tol )
+        assert( np.abs(results["gnorm"][k]-norm(grad)) < tol )
+        assert( norm(results["heig"][k]-np.real(obj.hess_eig(x))) < 1e-10 )
+    assert( list(frame.columns) == ["fval"] and len(frame) == 5 )
+
+def test_resume_sampler():
+    nq, p = 6, 2
+    tol = 1e-12
+    obj = qaoa.circuit.QAOACircuit(p,qaoa.operators.IsingHamiltonian(graph=qaoa.util.graph.load(3,nq)))
+    X = np.random.rand(11,2*p)
+    options = ("Objective Value","Approximation Ratio","Gradient")
+
+    with tempfile.TemporaryDirectory() as path, qaoa.sampling.ObjectiveSampler(obj,num_threads=2,chunk_size=3) as sampler:
+        reference = sampler.sample(X,*options,path=path)
+
+        # Keep only the first two chunks written in the manifest, as if the run had stopped
+        index = qaoa.util.load_shards(path)["index"]
+        chunks = list(dict.fromkeys(index//3))[:2]
+        rows = int(np.isin(index//3,chunks).sum())
+        manifest = qaoa.util.read_manifest(path)
+        manifest["shards"], manifest["completed"] = [[0,rows]], merge_ranges([],chunks)
+        with open(os.path.join(path,"manifest.json"),'w') as f:
+            json.dump(manifest,f)
+
+        results = sampler.sample(X,*options,path=path)
+        columns = qaoa.util.load_shards(path,concatenate=False)
+        assert( [len(index) for index in columns["index"]] == [rows,len(X)-rows] )
+        assert( qaoa.util.read_manifest(path)["completed"] == [[0,4]] )
+        columns = qaoa.util.load_shards(path)
+        order = np.argsort(columns["index"])
+        assert( np.array_equal(columns["index"][order],np.arange(len(X))) )
+        for name in reference:
+            assert( norm(results[name]-reference[name]) < tol )
+            assert( norm(columns[name.lower()][order]-reference[name]) < tol )
+
+        # Other controls are not mistaken for those of the results
+        try:
+            sampler.sample(X[::-1],*options,path=path)
+            assert( False )
+        except ValueError:
+            pass
+
+    # A run that is complete is read back with the same controls
+    with tempfile.TemporaryDirectory() as path, qaoa.sampling.ObjectiveSampler(obj,num_threads=2) as sampler:
+        frame = sampler(5,path=path)
+        np.random.rand(100)
+        assert( frame.equals(sampler(5,path=path)) )
+        assert( len(qaoa.util.load_shards(path,concatenate=False)["index"]) == 1 )
+
+if __name__ == '__main__':
+    test_objective_sampler()
+    test_resume_sampler()
@@ -20,8 +20,8 @@ if __name__ == '__main__':
     args = parser.parse_args()
 
     obj = qaoa.circuit.load_maxcut(degree=args.ndegree,nvert=args.nvert,graph_num=args.ngraph,nlayers=args.nlayers)
-    sampler = qaoa.sampling.ObjectiveSampler(obj)
-    results = sampler(args.nsamples,args.njobs,"Objective Value","Gradient Norm","Hessian Eigenvalues")
+    with qaoa.sampling.ObjectiveSampler(obj,args.njobs) as sampler:
+        results = sampler(args.nsamples,"Objective Value","Gradient Norm","Hessian Eigenvalues")
 
     filename = "uwmc_d{0}_n{1}_g{2}_p{3}.csv".format(ndegree,nvert,ngraph,nlayers)
     cwd = os.getcwd()
@@ -13,8 +13,8 @@ if __name__ == '__main__':
     njobs = mp.cpu_count()
     buffersize = 20
 
-    # Result output file
-    resfile = 'output.csv'
+    # Result output directory
+    resfile = 'output'
 
     # Quantities to evaluate
     quantities = ["Theta", "Value", "Gradient"]
@@ -26,5 +26,9 @@ if __name__ == '__main__':
     C = qaoa.operators.load_max_cut_hamiltonian(ndegree,nvert,ngraph)
     sample_QAOA(resfile,quantities,nsamples,njobs,buffersize,ctrlgen,C)
 
+    # Memory-map the columns of the results
+    results = qaoa.util.load_shards(resfile)
+    print({ name : column.shape for name, column in results.items() })
+
     
   
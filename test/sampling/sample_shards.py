@@ -0,0 +1,77 @@
+import qaoa
+import numpy as np
+import tempfile
+from qaoa.sampling import sample_QAOA
+
+
+def test_sample_shards():
+    nq, p = 6, 2
+    tol = 1e-12
+    C = qaoa.operators.IsingHamiltonian(graph=qaoa.util.graph.load(3,nq))
+    X = np.random.rand(37,2*p)
+    with tempfile.TemporaryDirectory() as path:
+        sample_QAOA(path,["Theta","Value","Gradient"],None,2,16,X,C,chunk_size=5)
+        results = qaoa.util.load_shards(path)
+    assert( C.shared is None )
+    order = np.argsort(results["index"])
+    assert( np.array_equal(results["index"][order],np.arange(len(X))) )
+    assert( np.array_equal(results["theta"][order],X) )
+    obj = qaoa.circuit.QAOACircuit(p,C)
+    for k, x in enumerate(X):
+        value, grad = obj.value_and_gradient(x)
+        assert( np.abs(results["value"][order[k]]-value) < tol )
+        assert( np.linalg.norm(results["gradient"][order[k]]-grad) < tol )
+
+def test_resume_shards():
+    nq, p = 6, 2
+    C = qaoa.operators.IsingHamiltonian(graph=qaoa.util.graph.load(3,nq))
+    X = np.random.rand(37,2*p)
+    with tempfile.TemporaryDirectory() as path:
+        # The first four chunks of X are recorded, so only the last four are evaluated
+        sample_QAOA(path,["Theta","Value"],None,2,16,X[:20],C,chunk_size=5)
+        sample_QAOA(path,["Theta","Value"],None,2,16,X,C,chunk_size=5)
+        assert( [len(index) for index in qaoa.util.load_shards(path,concatenate=False)["index"]] == [20,17] )
+        assert( qaoa.util.read_manifest(path)["completed"] == [[0,8]] )
+        try:
+            sample_QAOA(path,["Theta","Value"],None,2,16,X,C,chunk_size=5,resume=False)
+            assert( False )
+        except ValueError:
+            pass
+
+        # Other controls are not mistaken for those of the results
+        try:
+            sample_QAOA(path,["Theta","Value"],None,2,16,np.random.rand(*X.shape),C,chunk_size=5)
+            assert( False )
+        except ValueError:
+            pass
+        assert( C.shared is None and qaoa.util.read_manifest(path)["completed"] == [[0,8]] )
+        results = qaoa.util.load_shards(path)
+    order = np.argsort(results["index"])
+    assert( np.array_equal(results["index"][order],np.arange(len(X))) )
+    assert( np.array_equal(results["theta"][order],X) )
+
+    # The state of numpy.random is restored, so the same controls are drawn again
+    with tempfile.TemporaryDirectory() as path:
+        np.random.seed(1)
+        sample_QAOA(path,["Theta"],10,2,16,lambda: np.random.rand(2*p),C,chunk_size=5)
+        np.random.rand(100)
+        sample_QAOA(path,["Theta"],20,2,16,lambda: np.random.rand(2*p),C,chunk_size=5)
+        results = qaoa.util.load_shards(path)
+        assert( [len(index) for index in qaoa.util.load_shards(path,concatenate=False)["index"]] == [10,10] )
+    np.random.seed(1)
+    assert( np.array_equal(results["theta"][np.argsort(results["index"])],np.random.rand(20,2*p)) )
+
+    # A function that does not draw from numpy.random cannot be resumed with other controls
+    with tempfile.TemporaryDirectory() as path:
+        for seed in (0,1):
+            rng = np.random.default_rng(seed)
+            try:
+                sample_QAOA(path,["Theta"],10,2,16,lambda: rng.random(2*p),C,chunk_size=5)
+                assert( seed == 0 )
+            except ValueError:
+                assert( seed == 1 )
+        assert( len(qaoa.util.load_shards(path)["index"]) == 10 )
+
+if __name__ == '__main__':
+    test_sample_shards()
+    test_resume_shards()
@@ -0,0 +1,35 @@
+import qaoa
+import numpy as np
+import subprocess
+import sys
+import os
+
+def test_serial_copy():
+    from qaoa.util.math import serial_copy, mpnjit
+    f = lambda x : 2*x
+    g = serial_copy(f)
+    assert( g.__qualname__ == f.__qualname__ + "_serial" and g(3) == f(3) )
+    kernel = mpnjit(cache=False)(f)
+    assert( kernel.parallel.targetoptions['parallel'] and not kernel.serial.targetoptions['parallel'] )
+    assert( kernel(3) == 6 )
+
+def test_warmup():
+    # Compile, or load from the cache, both variants of every kernel for single precision
+    assert( qaoa.warmup(nq=4,dtypes=(np.complex64,)) > 0 )
+
+    # A new interpreter loads the kernels from the cache instead of compiling them
+    script = "\n".join(["import numpy as np, qaoa",
+                        "from numba.core.registry import CPUDispatcher",
+                        "from qaoa.util.math import Kernel",
+                        "qaoa.warmup(nq=4,dtypes=(np.complex64,))",
+                        "kernels = [f for f in vars(qaoa.util.math).values() if isinstance(f,CPUDispatcher)]",
+                        "kernels += [g for f in vars(qaoa.util.math).values() if isinstance(f,Kernel) for g in (f.serial,f.parallel)]",
+                        "print(sum(sum(f.stats.cache_hits.values()) for f in kernels),",
+                        "      sum(sum(f.stats.cache_misses.values()) for f in kernels))"])
+    env = dict(os.environ,PYTHONPATH=os.pathsep.join(sys.path))
+    hits, misses = map(int,subprocess.check_output([sys.executable,"-c",script],env=env).split())
+    assert( hits > 0 and misses == 0 )
+
+if __name__ == '__main__':
+    test_serial_copy()
+    test_warmup()
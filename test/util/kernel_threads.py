@@ -0,0 +1,72 @@
+import qaoa
+import numpy as np
+import numba
+from multiprocessing import get_context
+from qaoa.util import kernel_threads
+
+
+class ThreadsProbe(qaoa.operators.DiagonalOperator):
+    """
+    Diagonal operator that records whether the parallel kernels are selected whenever
+    it is applied
+    """
+    def __init__(self,d):
+        super().__init__(d)
+        self.parallel = set()
+
+    def apply(self,v,Dv):
+        self.parallel.add(kernel_threads.parallel())
+        super().apply(v,Dv)
+
+def worker_parallel(k):
+    return kernel_threads.parallel()
+
+def test_kernel_threads():
+    nq, p = 6, 2
+    tol = 1e-12
+    assert( kernel_threads.threads is None and kernel_threads.parallel() )
+    with kernel_threads(1):
+        assert( not kernel_threads.parallel() )
+        with kernel_threads(2):
+            assert( kernel_threads.parallel() )
+        assert( kernel_threads.threads == 1 )
+    assert( kernel_threads.threads is None )
+
+    # The number of Numba threads is restored, also after a circuit with its own setting
+    num_threads = numba.get_num_threads()
+    with kernel_threads(2):
+        assert( numba.get_num_threads() == min(2,numba.config.NUMBA_NUM_THREADS) )
+    assert( numba.get_num_threads() == num_threads )
+    qaoa.circuit.QAOACircuit(p,qaoa.operators.IsingHamiltonian(graph=qaoa.util.graph.load(3,nq)),threads=2).gradient(np.random.rand(2*p))
+    assert( numba.get_num_threads() == num_threads )
+    kernel_threads.set(2)
+    kernel_threads.set(None)
+    assert( numba.get_num_threads() == numba.config.NUMBA_NUM_THREADS )
+
+    # Serial and parallel kernels agree
+    obj = qaoa.circuit.QAOACircuit(p,qaoa.operators.IsingHamiltonian(graph=qaoa.util.graph.load(3,nq)))
+    theta = np.random.rand(2*p)
+    value, grad = obj.value_and_gradient(theta)
+    with kernel_threads(1):
+        obj.set_control(theta+1)
+        value1, grad1 = obj.value_and_gradient(theta)
+    assert( np.abs(value-value1) < tol and np.linalg.norm(grad-grad1) < tol )
+
+    # The setting of a circuit applies to its evaluations only
+    C = ThreadsProbe(np.random.randn(1<<nq))
+    obj = qaoa.circuit.QAOACircuit(p,C,fuse_layers=False,threads=1)
+    obj.gradient(theta)
+    assert( C.parallel == {False} and kernel_threads.parallel() )
+    obj.threads = None
+    obj.gradient(theta+1)
+    assert( C.parallel == {False,True} )
+
+    # Worker processes are serial unless given more threads. Forking after the parallel
+    # kernels ran is unsafe with the TBB threading layer
+    with get_context("spawn").Pool(2) as pool:
+        assert( not any(pool.map(worker_parallel,range(2))) )
+    with get_context("spawn").Pool(2,initializer=kernel_threads.set,initargs=(2,)) as pool:
+        assert( all(pool.map(worker_parallel,range(2))) )
+
+if __name__ == '__main__':
+    test_kernel_threads()
@@ -0,0 +1,93 @@
+import qaoa
+import numpy as np
+import os
+import tempfile
+import time
+import multiprocessing as mp
+from qaoa.util import ShardWriter, load_shards, read_manifest
+from qaoa.util.shard_writer import npy_header, merge_ranges
+
+
+def put_chunks(q,X,chunk_size,offset=0):
+    """
+    Put the rows of X and their sums in the queue in chunks, numbered from offset//chunk_size
+    """
+    for start in range(0,len(X),chunk_size):
+        Y = X[start:start+chunk_size]
+        q.put(((offset+start)//chunk_size,offset+np.arange(start,start+len(Y)),{ "theta" : Y, "value" : Y.sum(axis=1) }))
+
+def check_columns(columns,X):
+    """
+    Compare the columns with the rows of X and their sums in the order of the index
+    """
+    order = np.argsort(columns["index"])
+    assert( np.array_equal(columns["index"][order],np.arange(len(X))) )
+    assert( np.array_equal(columns["theta"][order],X) )
+    assert( np.array_equal(columns["value"][order],X.sum(axis=1)) )
+
+def test_shard_writer():
+    X = np.random.rand(50,4)
+    context = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as path:
+        # Every row is written on the sentinel, even if the buffer is not full
+        writer = ShardWriter(path,["Theta","Value"],buffersize=1000,total=len(X))
+        q = context.Queue()
+        watcher = context.Process(target=writer.read,args=(q,))
+        watcher.start()
+        put_chunks(q,X[:30],5)
+        q.put(None)
+        watcher.join()
+        check_columns(load_shards(path),X[:30])
+        columns = load_shards(path,concatenate=False)
+        assert( len(columns["theta"]) == 1 and isinstance(columns["theta"][0],np.memmap) )
+        manifest = read_manifest(path)
+        assert( manifest["shards"] == [[0,30]] and manifest["completed"] == [[0,6]] )
+
+        # A second writer appends a new shard in several writes and adds to the manifest
+        writer = ShardWriter(path,["Theta","Value"],buffersize=8,metadata={ "chunk_size" : 5 })
+        assert( writer.shard == 1 and writer.completed() == set(range(6)) )
+        q = context.Queue()
+        put_chunks(q,X[30:45],5,30)
+        q.put(None)
+        writer.read(q)
+        manifest = read_manifest(path)
+        assert( manifest["shards"] == [[0,30],[1,15]] and manifest["completed"] == [[0,9]] )
+        check_columns(load_shards(path),X[:45])
+
+        # Rows that are not recorded in the manifest are skipped
+        with open(os.path.join(path,"index.00001.npy"),'r+b') as f:
+            f.write(npy_header(np.int64,(16,)))
+            f.seek(0,os.SEEK_END)
+            f.write(np.array([45]).tobytes())
+        check_columns(load_shards(path),X[:45])
+
+        # The manifest must match
+        for quantities, metadata in [(["Value"],None),(["Theta","Value"],{ "chunk_size" : 4 })]:
+            try:
+                ShardWriter(path,quantities,metadata=metadata)
+                assert( False )
+            except ValueError:
+                pass
+
+        # Rows are written once they have waited interval seconds, without the sentinel
+        writer = ShardWriter(path,["Theta","Value"],buffersize=1000,interval=0.0,shard=5)
+        q = context.Queue()
+        watcher = context.Process(target=writer.read,args=(q,))
+        watcher.start()
+        put_chunks(q,X[:4],4)
+        filename = os.path.join(path,"theta.00005.npy")
+        for k in range(600):
+            if os.path.exists(filename) and len(np.load(filename,mmap_mode='r')) == 4:
+                break
+            time.sleep(0.1)
+        assert( np.array_equal(np.load(filename),X[:4]) )
+        q.put(None)
+        watcher.join()
+
+def test_merge_ranges():
+    assert( merge_ranges([],[3,1,2,7]) == [[1,4],[7,8]] )
+    assert( merge_ranges([[1,4],[7,8]],[4,6,0]) == [[0,5],[6,8]] )
+
+if __name__ == '__main__':
+    test_merge_ranges()
+    test_shard_writer()